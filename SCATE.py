@@ -15,6 +15,7 @@ import argparse
 import logging
 
 from lib.DynamicLoader import DynamicLoader
+from lib import ResultCache
 
 #
 # Main entry point for the application.
@@ -31,6 +32,8 @@ def main ():
   parser.add_argument ('--weaknesses', type=str, help='Comma-separated list of weaknesses to use')
   parser.add_argument ('--threads', type=int, default=1, help='Number of threads')
   parser.add_argument ('--debug', action='store_true', help='Enable debugging output')
+  parser.add_argument ('--cache', action='store_true', help='Cache the parsed input files')
+  parser.add_argument ('--clear-cache', action='store_true', help='Clear the cache of parsed input files')
 
   cmd_parser = parser.add_subparsers (help='Command-specific help')
 
@@ -49,6 +52,14 @@ def main ():
   if args.debug:
     logging.root.setLevel (logging.DEBUG)
 
+  # The cache is enabled through the environment so worker processes
+  # inherit the setting.
+  if args.cache and not os.environ.get ('SCATE_CACHE_DIR'):
+    os.environ['SCATE_CACHE_DIR'] = ResultCache.DEFAULT_DIRECTORY
+
+  if args.clear_cache:
+    ResultCache.ResultCache (os.environ.get ('SCATE_CACHE_DIR') or ResultCache.DEFAULT_DIRECTORY).clear ()
+
   command = args.command
 
   # Parse the command-line arguments for the command.
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+
+################################################################################
+#
+# file : benchmark_memory.py
+#
+# Memory benchmark for the ResultSet hierarchy. The import and build files
+# are loaded into a single ResultSet, the same way ExportCommand does, and
+# the memory held by the ResultSet is reported. If no files are provided,
+# a synthetic knowledge base and build are generated instead.
+#
+#   ./benchmark_memory.py --importfiles=kb.xml --buildfiles=build1.xml,build2.xml
+#   ./benchmark_memory.py --scale=200
+#
+# The same benchmark can be run against a reference checkout of SCATE, for
+# example the last release checked out with git worktree, to compare both
+# trees. The reference is loaded in a separate process, so the numbers of
+# each tree are not mixed up.
+#
+#   git worktree add /tmp/scate-base <commit>
+#   ./benchmark_memory.py --scale=200 --reference=/tmp/scate-base
+#
+# Figures recorded against the tree right before the __slots__ layouts and
+# string interning, ResultSet memory / peak RSS (tracemalloc included):
+#
+#   --scale=100 (640k records)
+#     reference:  261.4 MB / 807.0 MB
+#     current:    137.1 MB / 414.0 MB  (-48% / -49%)
+#
+#   KB and 3 builds, 83 MB of XML (531k records)
+#     reference:  163.0 MB / 473.4 MB
+#     current:     87.8 MB / 249.8 MB  (-46% / -47%)
+#
+# The export of the same KB and builds peaks at 245 MB RSS, down from 418 MB
+# (-41%), which meets the 40% target for ExportCommand.
+#
+################################################################################
+
+import argparse
+import gc
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+
+#
+# Import the classes of the benchmark from the lib package of the SCATE
+# checkout in \a root.
+#
+def import_lib (root):
+  sys.path.insert (0, root)
+  global ResultSet, FlawType, Bug, XMLManager
+
+  from lib.DataAbstractions import ResultSet, FlawType, Bug
+  from lib.DataManagers.XMLManager import XMLManager
+
+#
+# Generate a synthetic knowledge base and build into the result set. Every
+# string is built on the fly, just like a parser would hand them to us.
+#
+def generate (rs, scale):
+  severities = [FlawType.Flaw, FlawType.Potential, FlawType.Incidental, FlawType.Fix]
+  functions = ['bad', 'goodG2B', 'goodB2G', 'helperBad']
+
+  for w in range (scale):
+    weakness = rs.get_weakness ('CWE%d' % (100 + w))
+
+    for s in range (4):
+      suite = weakness.get_suite ('/testcases/CWE%d/s%02d' % (100 + w, s), 'make', 'all')
+
+      for f in range (50):
+        file = suite.get_file ('CWE%d_test_case_%d_%02d.c' % (100 + w, f, s))
+
+        for name in functions:
+          function = file.get_function ('%s' % name)
+
+          for l in range (4):
+            line = function.get_line (20 + 10 * l)
+            line.add_flaw (severities[l], 'Description of flaw %d' % (l % 2), '%s' % 'JulietCpp-1.2')
+
+            bug = Bug ('%s' % 'TAINTED_STRING', '%s' % 'coverity', 'Message %d' % l)
+            bug.line = line
+            line.add_Bug (bug)
+
+#
+# Load the files, or the synthetic data, and measure the memory held by the
+# result set
+#
+def measure (args):
+  tracemalloc.start ()
+  start = time.time ()
+  rs = ResultSet ()
+
+  if args.importfiles or args.buildfiles:
+    for filename in (args.buildfiles or '').split (',') if args.buildfiles else []:
+      XMLManager (filename).add_results (rs, True)
+
+    for filename in (args.importfiles or '').split (',') if args.importfiles else []:
+      XMLManager (filename).add_results (rs, False)
+  else:
+    generate (rs, args.scale)
+
+  gc.collect ()
+  (current, peak) = tracemalloc.get_traced_memory ()
+  elapsed = time.time () - start
+
+  return {'flaws': sum (1 for x in rs.iterate_Flaws ()),
+          'bugs': sum (1 for x in rs.iterate_Bugs ()),
+          'lines': sum (1 for x in rs.iterate_Lines ()),
+          'current': current,
+          'peak': peak,
+          'rss': resource.getrusage (resource.RUSAGE_SELF).ru_maxrss * 1024,
+          'time': elapsed}
+
+#
+# Run the benchmark against the reference checkout in a new process
+#
+def measure_reference (args):
+  cmd = [sys.executable, os.path.abspath (__file__), '--lib=%s' % os.path.abspath (args.reference), '--json', '--scale=%d' % args.scale]
+
+  if args.importfiles:
+    cmd.append ('--importfiles=%s' % ','.join (os.path.abspath (x) for x in args.importfiles.split (',')))
+
+  if args.buildfiles:
+    cmd.append ('--buildfiles=%s' % ','.join (os.path.abspath (x) for x in args.buildfiles.split (',')))
+
+  # The reference is run from its own directory, since older trees find
+  # their configuration relative to the working directory.
+  output = subprocess.check_output (cmd, cwd=args.reference)
+  return json.loads (output.decode ('UTF-8').splitlines ()[-1])
+
+def report (label, result):
+  print ('%s:' % label)
+  print ('  flaws: %d, bugs: %d, lines: %d' % (result['flaws'], result['bugs'], result['lines']))
+  print ('  resultset memory: %.1f MB (%.0f bytes per record)' % (result['current'] / 2 ** 20, result['current'] / max (1, result['flaws'] + result['bugs'])))
+  print ('  peak traced memory: %.1f MB' % (result['peak'] / 2 ** 20))
+  print ('  peak RSS: %.1f MB' % (result['rss'] / 2 ** 20))
+  print ('  load time: %.2fs (traced)' % result['time'])
+
+def change (name, reference, result):
+  print ('%s: %+.0f%%' % (name, 100.0 * (result - reference) / max (1, reference)))
+
+def main ():
+  parser = argparse.ArgumentParser ()
+  parser.add_argument ('--importfiles', type=str, help='Comma-seperated list of import files')
+  parser.add_argument ('--buildfiles', type=str, help='Comma-seperated list of build files')
+  parser.add_argument ('--scale', type=int, default=100, help='Number of weaknesses to generate')
+  parser.add_argument ('--reference', type=str, help='SCATE checkout to compare against')
+  parser.add_argument ('--lib', type=str, default=os.path.dirname (os.path.abspath (__file__)), help=argparse.SUPPRESS)
+  parser.add_argument ('--json', action='store_true', help=argparse.SUPPRESS)
+  args = parser.parse_args ()
+
+  import_lib (args.lib)
+
+  # The reference runs first, so it does not share the memory of this one.
+  reference = measure_reference (args) if args.reference else None
+  result = measure (args)
+
+  if args.json:
+    print (json.dumps (result))
+    return
+
+  if reference is None:
+    report ('current', result)
+    return
+
+  report ('reference [%s]' % args.reference, reference)
+  report ('current', result)
+
+  if (reference['flaws'], reference['bugs'], reference['lines']) != (result['flaws'], result['bugs'], result['lines']):
+    print ('warning: the trees loaded different results')
+
+  change ('resultset memory', reference['current'], result['current'])
+  change ('peak RSS', reference['rss'], result['rss'])
+  change ('load time', reference['time'], result['time'])
+
+if __name__ == '__main__':
+  main ()
@@ -0,0 +1,19 @@
+import os
+import pytest
+import sys
+
+#
+# Keep the tests away from the result cache in the home directory. Tests
+# of the cache point it to a temporary directory instead.
+#
+@pytest.fixture (autouse = True)
+def no_result_cache (monkeypatch):
+  monkeypatch.setenv ('SCATE_CACHE_DIR', '')
+
+#
+# Tools and exporters are loaded from the directory of the script, so run
+# the tests as SCATE.py
+#
+@pytest.fixture (autouse = True)
+def scate_argv (monkeypatch):
+  monkeypatch.setattr (sys, 'argv', [os.path.join (os.path.dirname (os.path.abspath (__file__)), 'SCATE.py')])
@@ -14,6 +14,8 @@ from ..DataManagers.XMLManager import XMLManager
 from ..DataAbstractions import ResultSet, Weakness, Suite
 from .. import Utilities
 
+from concurrent.futures import ThreadPoolExecutor
+
 import logging
 import os.path
 import sys
@@ -43,6 +45,8 @@ class BuildCommand(Command):
         buildParser.add_argument('--ignore-compile', action='store_true', help='Skip compilation')
         buildParser.add_argument('--ignore-docgen', action='store_true', help='Skip generation of the result file')
         buildParser.add_argument('--clean', action='store_true', help='Clean the directory prior to building')
+        buildParser.add_argument('--jobs', type=int, default=1, help='Number of suites to build concurrently')
+        buildParser.add_argument('--all-locations', action='store_true', help='Add a bug at every location of a finding, instead of only its primary location')
         buildParser.set_defaults(command=self)
 
         toolParser = buildParser.add_subparsers(help='tool specific commands')
@@ -67,6 +71,7 @@ class BuildCommand(Command):
         self.__ignore_compile__ = args.ignore_compile
         self.__ignore_docgen__ = args.ignore_docgen
         self.__clean__ = args.clean
+        self.__jobs__ = max(1, args.jobs)
         self.__tool__ = args.tool
         self.__args__ = args
 
@@ -86,13 +91,17 @@ class BuildCommand(Command):
         # the test implementations
         truth = ResultSet('resultset', 'ground_truth')
         xmlm = XMLManager(self.__importfile__)
-        xmlm.add_results(truth, True)
+        xmlm.add_results(truth, True, self.__weaknesses__)
 
         results = self.__tool__.build_result_set()
         print(self.__args__)
 
         results.args = Utilities.stringify_args(self.__args__)
 
+        # The weaknesses and suites are added up front, so the results keep the
+        # order of the ground truth no matter which suite finishes first.
+        suites = []
+
         for weakness in self.get_weaknesses(truth):
             if not self.__tool__.supports_weakness(weakness):
                 logging.warning('[%s] is not supported by tool [%s]' % (weakness.name, self.__tool__.name()))
@@ -103,21 +112,43 @@ class BuildCommand(Command):
             for suite in weakness.iterate_Suites():
                 res_suite = Suite(results[weakness.name], suite.directory, suite.compiler, suite.args)
                 results[weakness.name][suite.directory] = res_suite
+                suites.append(res_suite)
+
+        # The suites are cleaned and compiled by a pool of workers, while the
+        # results of each suite are generated here in the original order.
+        logging.info('Building %d suites with %d jobs' % (len(suites), self.__jobs__))
+
+        with ThreadPoolExecutor(max_workers=self.__jobs__) as executor:
+            futures = [executor.submit(self.build_suite, suite) for suite in suites]
 
-                if self.__clean__:
-                    self.__tool__.handle_clean(res_suite)
+            try:
+                for (suite, future) in zip(suites, futures):
+                    future.result()
 
-                if not self.__ignore_compile__:
-                    self.__tool__.handle_compile(res_suite)
+                    if not self.__ignore_docgen__:
+                        self.__tool__.handle_docgen(suite)
 
-                if not self.__ignore_docgen__:
-                    self.__tool__.handle_docgen(res_suite)
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
 
         if not self.__ignore_docgen__:
             # Handle writing the results
             xmlm = XMLManager(self.__outfile__)
             xmlm.write(results)
 
+    #
+    # Clean and compile the provided suite. The tools run their commands in
+    # the directory of the suite, so several suites can be built at once.
+    #
+    def build_suite(self, suite):
+        if self.__clean__:
+            self.__tool__.handle_clean(suite)
+
+        if not self.__ignore_compile__:
+            self.__tool__.handle_compile(suite)
+
     #
     # Return the weaknesses to use within the provided result set
     #
@@ -11,7 +11,9 @@
 from ..DynamicLoader import DynamicLoader
 from ..Command import Command
 from ..DataAbstractions import *
-from ..DataManagers.XMLManager import XMLManager
+from ..DataManagers.XMLManager import XMLManager, read_records
+
+from concurrent.futures import ProcessPoolExecutor
 
 import logging
 import os
@@ -75,20 +77,53 @@ class ExportCommand (Command):
     dpset = DataPointSet ()
     rs = ResultSet ()
 
-    for filename in self.__buildfiles__.split (','):
-      # Read build file
-      logging.info ('Loading build file [%s]' % filename)
-      xmlm = XMLManager (filename)
-      xmlm.add_results (rs, True)
-      dpset.builds[rs.source] = rs.args
-
-    for filename in self.__importfiles__.split (','):
-      # Read import file
-      logging.info ('Loading knowledge base [%s]' % filename)
-      xmlm = XMLManager (filename)
-      xmlm.add_results (rs, False)
-      dpset.imports[rs.source] = rs.args
+    buildfiles = self.__buildfiles__.split (',')
+    importfiles = self.__importfiles__.split (',')
+
+    if self.__threads__ and self.__threads__ > 1:
+      self.load_parallel (rs, dpset, buildfiles, importfiles)
+    else:
+      for filename in buildfiles:
+        # Read build file
+        logging.info ('Loading build file [%s]' % filename)
+        xmlm = XMLManager (filename)
+        xmlm.add_results (rs, True, self.__weaknesses__)
+        dpset.builds[rs.source] = rs.args
+
+      for filename in importfiles:
+        # Read import file
+        logging.info ('Loading knowledge base [%s]' % filename)
+        xmlm = XMLManager (filename)
+        xmlm.add_results (rs, False, self.__weaknesses__)
+        dpset.imports[rs.source] = rs.args
+
+    # Merged files also list the other sources of their flaws and bugs
+    for (source, args) in rs.builds.items ():
+      dpset.builds.setdefault (source, args)
+
+    for (source, args) in rs.imports.items ():
+      dpset.imports.setdefault (source, args)
 
     # Let the exporter manage the process from here
     logging.info ('Exporting results using [%s]' % self.__exporter__.name ())
     self.__exporter__.export (rs, dpset, self.__outfile__)
+
+  #
+  # Load the build and import files with a pool of processes. Each file is
+  # parsed into compact records by a worker, and the records are merged
+  # into the result set in the same order as the sequential load.
+  #
+  def load_parallel (self, rs, dpset, buildfiles, importfiles):
+    filenames = buildfiles + importfiles
+    logging.info ('Loading %d files with %d processes' % (len (filenames), self.__threads__))
+
+    with ProcessPoolExecutor (max_workers=min (self.__threads__, len (filenames))) as executor:
+      for (i, records) in enumerate (executor.map (read_records, filenames, [self.__weaknesses__] * len (filenames))):
+        if i < len (buildfiles):
+          logging.info ('Merging build file [%s]' % filenames[i])
+          XMLManager.merge_records (rs, True, records)
+          dpset.builds[rs.source] = rs.args
+        else:
+          logging.info ('Merging knowledge base [%s]' % filenames[i])
+          XMLManager.merge_records (rs, False, records)
+          dpset.imports[rs.source] = rs.args
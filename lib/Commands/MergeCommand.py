@@ -0,0 +1,56 @@
+#!/bin/env python
+
+################################################################################
+#
+# file : MergeCommand.py
+#
+################################################################################
+
+from ..Command import Command
+from ..DataManagers.XMLManager import XMLManager
+
+import logging
+
+#
+# Factory Method for Command
+#
+def __create__ ():
+  return MergeCommand ()
+
+#
+# @class MergeCommand
+#
+# Merges several import or build files (i.e. the shards of a build run on
+# several hosts) into a single file, without loading them into a ResultSet.
+#
+class MergeCommand (Command):
+  #
+  # Default constructor
+  #
+  def __init__ (self):
+    super (MergeCommand, self).__init__ ('merge', 'Merges import or build files')
+
+  #
+  # Initialize the parser
+  #
+  def init_parser (self, parser):
+    subparser = parser.add_parser ('merge', help='Merge import or build files into a single file')
+    subparser.add_argument ('--infiles', type=str, required=True, help='Comma-seperated list of files to merge')
+    subparser.add_argument ('--outfile', type=str, required=True, help='Output file')
+    subparser.set_defaults (command=self)
+
+  #
+  # Initialize the command based on arguments provided
+  #
+  def parse_args (self, args):
+    super (MergeCommand, self).parse_args (args)
+
+    self.__infiles__ = args.infiles.split (',')
+    self.__outfile__ = args.outfile
+
+  #
+  # Executes the command. This method is called after init
+  #
+  def execute (self):
+    logging.info ('Merging [%s]' % ', '.join (self.__infiles__))
+    XMLManager (self.__outfile__).merge (self.__infiles__, self.__weaknesses__)
@@ -2,10 +2,31 @@
 
 import os
 import logging
+import re
 
 from os import path
 
 from enum import Enum
+from functools import lru_cache
+from html import unescape
+from sys import intern
+import weakref
+
+#
+# Descriptions and messages repeat heavily within a document, so cache
+# their unescaped values.
+#
+unescape_cached = lru_cache (maxsize = 65536) (unescape)
+
+#
+# Intern a string that repeats across many nodes (i.e. filenames, function
+# names and sources). Values that are not strings are returned as is.
+#
+def intern_string (value):
+  if type (value) is str:
+    return intern (value)
+
+  return value
 
 def str_to_boolean (s):
   if s == 'True':
@@ -15,6 +36,264 @@ def str_to_boolean (s):
   else:
     raise ValueError;
 
+#
+# @class Node
+#
+# Base class of the nodes of the hierarchy, which provides the flaw and bug
+# counts. Flaws are counted by FlawType and bugs by source, with the totals
+# kept under the Flaw and Bug classes. Only suites keep running counts (see
+# CountedNode). The other nodes sum the counts of their children: a result
+# set or weakness has few suites, and a file, function or line few records.
+#
+# Counts only reach the parent of a node once the node is attached to it.
+# The records of a node that is created with a parent, but attached later
+# with __setitem__, are counted by __setitem__.
+#
+class Node:
+  __slots__ = ()
+
+  #
+  # Get the parent node, or None for the root of the hierarchy
+  #
+  def get_parent (self):
+    return None
+
+  #
+  # Test if this node is one of the children of its parent
+  #
+  def is_attached (self):
+    return self.get_parent () is not None
+
+  def iterate_children (self):
+    return iter (())
+
+  #
+  # Count a new flaw or bug. The \a total is Flaw or Bug, and the \a key
+  # its severity or source.
+  #
+  def count_added (self, total, key):
+    if self.is_attached ():
+      self.get_parent ().count_added (total, key)
+
+  #
+  # Add the counts of a subtree, or remove them with a \a sign of -1
+  #
+  def update_counts (self, counts, sign):
+    if self.is_attached ():
+      self.get_parent ().update_counts (counts, sign)
+
+  #
+  # Replace the child \a old of this node by \a new, either of which can be
+  # None, and update the counts accordingly
+  #
+  def replace_child (self, old, new):
+    if old is new:
+      return
+
+    if old is not None:
+      self.update_counts (old.get_counts (), -1)
+
+    if new is not None:
+      self.update_counts (new.get_counts (), 1)
+
+    if ResultSetIndex.result_sets:
+      index = find_index (self)
+
+      if index is not None:
+        index.clear ()
+
+  def get_counts (self):
+    counts = {}
+
+    for child in self.iterate_children ():
+      for (key, count) in child.get_counts ().items ():
+        counts[key] = counts.get (key, 0) + count
+
+    return counts
+
+  #
+  # Get the number of flaws below this node, optionally only the ones with
+  # the provided severity
+  #
+  def count_Flaws (self, severity = None):
+    return sum (child.count_Flaws (severity) for child in self.iterate_children ())
+
+  #
+  # Get the number of bugs below this node, optionally only the ones from
+  # the provided source
+  #
+  def count_Bugs (self, source = None):
+    return sum (child.count_Bugs (source) for child in self.iterate_children ())
+
+#
+# @class CountedNode
+#
+# Node that keeps running counts of the flaws and bugs below it, so its
+# summary statistics cost O(1). The counts are created with the first flaw
+# or bug, and kept up to date by add_Flaw, add_Bug, __setitem__ and
+# __delitem__. Maintaining counts costs a dictionary update per record and
+# level, so only the suites keep them.
+#
+class CountedNode (Node):
+  __slots__ = ('counts',)
+
+  def __init__ (self):
+    self.counts = None
+
+  def count_added (self, total, key):
+    counts = self.counts
+
+    if counts is None:
+      self.counts = {total: 1, key: 1}
+    else:
+      counts[total] = counts.get (total, 0) + 1
+      counts[key] = counts.get (key, 0) + 1
+
+  def update_counts (self, counts, sign):
+    if not counts:
+      return
+
+    if self.counts is None:
+      self.counts = {}
+
+    for (key, count) in counts.items ():
+      value = self.counts.get (key, 0) + sign * count
+
+      if value:
+        self.counts[key] = value
+      else:
+        self.counts.pop (key, None)
+
+  def get_counts (self):
+    return dict (self.counts or {})
+
+  def count_Flaws (self, severity = None):
+    if self.counts is None:
+      return 0
+
+    return self.counts.get (Flaw if severity is None else severity, 0)
+
+  def count_Bugs (self, source = None):
+    if self.counts is None:
+      return 0
+
+    return self.counts.get (Bug if source is None else source, 0)
+
+#
+# @class ResultSetIndex
+#
+# Opt-in secondary indexes of a ResultSet: bugs by type and by source,
+# flaws by severity, and lines by (filename, line) across suites. Each index
+# is built the first time it is used, with a single pass over the result
+# set, and then kept up to date as flaws, bugs and lines are added. Removing
+# or replacing nodes drops the indexes, which are rebuilt on their next use.
+#
+class ResultSetIndex:
+  # Result sets with an index. Adding flaws, bugs and lines only looks for
+  # an index to update while this is not empty. The result sets are held
+  # weakly, so one that is dropped without drop_index no longer counts.
+  result_sets = weakref.WeakSet ()
+
+  def __init__ (self, result_set):
+    self.result_set = result_set
+    self.clear ()
+
+  #
+  # Drop the indexes that were built
+  #
+  def clear (self):
+    self.bugs_by_type = None
+    self.bugs_by_source = None
+    self.flaws_by_severity = None
+    self.lines_by_location = None
+
+  def build_bugs (self):
+    if self.bugs_by_type is None:
+      self.bugs_by_type = {}
+      self.bugs_by_source = {}
+
+      for bug in self.result_set.iterate_Bugs ():
+        self.bugs_by_type.setdefault (bug.type, []).append (bug)
+        self.bugs_by_source.setdefault (bug.source, []).append (bug)
+
+  def build_flaws (self):
+    if self.flaws_by_severity is None:
+      self.flaws_by_severity = {}
+
+      for flaw in self.result_set.iterate_Flaws ():
+        self.flaws_by_severity.setdefault (flaw.severity, []).append (flaw)
+
+  def build_lines (self):
+    if self.lines_by_location is None:
+      self.lines_by_location = {}
+
+      for file in self.result_set.iterate_Files ():
+        for line in file.iterate_Lines ():
+          self.lines_by_location.setdefault ((file.filename, line.line), []).append (line)
+
+  def iterate_Bugs_of_type (self, type):
+    self.build_bugs ()
+    yield from self.bugs_by_type.get (type, ())
+
+  def get_Bugs_of_type (self, type):
+    return [x for x in self.iterate_Bugs_of_type (type)]
+
+  def iterate_Bugs_of_source (self, source):
+    self.build_bugs ()
+    yield from self.bugs_by_source.get (source, ())
+
+  def get_Bugs_of_source (self, source):
+    return [x for x in self.iterate_Bugs_of_source (source)]
+
+  def iterate_Flaws_of_severity (self, severity):
+    self.build_flaws ()
+    yield from self.flaws_by_severity.get (severity, ())
+
+  def get_Flaws_of_severity (self, severity):
+    return [x for x in self.iterate_Flaws_of_severity (severity)]
+
+  #
+  # Iterate over the lines at the provided (filename, line), in every
+  # weakness, suite and function
+  #
+  def iterate_Lines_at (self, filename, line):
+    self.build_lines ()
+    yield from self.lines_by_location.get ((filename, line), ())
+
+  def get_Lines_at (self, filename, line):
+    return [x for x in self.iterate_Lines_at (filename, line)]
+
+  #
+  # Update the indexes that were built with a new bug, flaw or line
+  #
+  def add_Bug (self, bug):
+    if self.bugs_by_type is not None:
+      self.bugs_by_type.setdefault (bug.type, []).append (bug)
+      self.bugs_by_source.setdefault (bug.source, []).append (bug)
+
+  def add_Flaw (self, flaw):
+    if self.flaws_by_severity is not None:
+      self.flaws_by_severity.setdefault (flaw.severity, []).append (flaw)
+
+  def add_Line (self, line):
+    if self.lines_by_location is not None:
+      self.lines_by_location.setdefault ((line.get_File ().filename, line.line), []).append (line)
+
+#
+# Get the index of the result set a node belongs to, or None if the result
+# set has no index
+#
+def find_index (node):
+  while node is not None:
+    parent = node.get_parent ()
+
+    if parent is None:
+      return getattr (node, 'index', None)
+
+    node = parent
+
+  return None
+
 #
 # @class ResultSet
 #
@@ -27,7 +306,12 @@ def str_to_boolean (s):
 # ---- File
 # ----- Flaw
 #
-class ResultSet:
+# All the nodes of the hierarchy use __slots__ since a merged knowledge
+# base can hold tens of millions of them.
+#
+class ResultSet (Node):
+  __slots__ = ('name', 'source', 'args', 'weaknesses', 'builds', 'imports', 'index', '__weakref__')
+
   #
   # Factory method
   #
@@ -37,11 +321,12 @@ class ResultSet:
 
   def __init__ (self, name = None, source = None, args = ''):
     self.name = name
-    self.source = source
+    self.source = intern_string (source)
     self.args = args
     self.weaknesses = {}
     self.builds = {}
     self.imports = {}
+    self.index = None
 
   #
   # Overloads to support indexing [] operator
@@ -50,10 +335,14 @@ class ResultSet:
     return self.weaknesses[key]
 
   def __setitem__ (self, key, value):
+    self.replace_child (self.weaknesses.get (key), value)
     self.weaknesses[key] = value
 
   def __delitem__ (self, key):
-    del self.weaknesses[key]
+    self.replace_child (self.weaknesses.pop (key), None)
+
+  def iterate_children (self):
+    return iter (self.weaknesses.values ())
 
   def iterate_Weaknesses (self):
     yield from self.weaknesses.values ()
@@ -116,10 +405,62 @@ class ResultSet:
   def get_ResultSet (self):
     return self
 
+  #
+  # Get the secondary indexes of the result set (see ResultSetIndex). The
+  # indexes are maintained from the first call on, until drop_index.
+  #
+  def get_index (self):
+    if self.index is None:
+      self.index = ResultSetIndex (self)
+      ResultSetIndex.result_sets.add (self)
+
+    return self.index
+
+  def drop_index (self):
+    if self.index is not None:
+      self.index = None
+      ResultSetIndex.result_sets.discard (self)
+
+  #
+  # Merge other result sets into this one. Flaws are de-duplicated by the
+  # lines, and bugs keep their source.
+  #
+  def merge (self, *others):
+    for other in others:
+      self.builds.update (other.builds)
+      self.imports.update (other.imports)
+
+      for weakness in other.iterate_Weaknesses ():
+        target_weakness = self.get_weakness (weakness.name)
+
+        for suite in weakness.iterate_Suites ():
+          target_suite = target_weakness.get_suite (suite.directory, suite.compiler, suite.args)
+
+          for file in suite.iterate_Files ():
+            target_file = target_suite.get_file (file.filename)
+
+            for function in file.iterate_Functions ():
+              target_function = target_file.get_function (function.function)
+
+              for line in function.iterate_Lines ():
+                target_line = target_function.get_line (line.line)
+
+                for flaw in line.iterate_Flaws ():
+                  target_line.add_flaw (flaw.severity, flaw.description, flaw.source)
+
+                for bug in line.iterate_Bugs ():
+                  target_bug = Bug (bug.type, bug.source, bug.message, bug.events)
+                  target_bug.line = target_line
+                  target_line.add_Bug (target_bug)
+
+    return self
+
 #
 # Class Weakness contains Implementation
 #
-class Weakness:
+class Weakness (Node):
+  __slots__ = ('name', 'result_set', 'suites')
+
   #
   # Factory method
   #
@@ -128,7 +469,7 @@ class Weakness:
     return Weakness (parent, xml.get ('id'))
 
   def __init__ (self, parent, name):
-    self.name = name
+    self.name = intern_string (name)
     self.result_set = parent
     self.suites = {}
 
@@ -139,10 +480,17 @@ class Weakness:
     return self.suites[key]
 
   def __setitem__ (self, key, value):
+    self.replace_child (self.suites.get (key), value)
     self.suites[key] = value
 
   def __delitem__ (self, key):
-    del self.suites[key]
+    self.replace_child (self.suites.pop (key), None)
+
+  def get_parent (self):
+    return self.result_set
+
+  def iterate_children (self):
+    return iter (self.suites.values ())
 
   def iterate_Suites (self):
     yield from self.suites.values ()
@@ -205,7 +553,9 @@ class Weakness:
 #
 # Collection of \a Flaw elements
 #
-class Suite:
+class Suite (CountedNode):
+  __slots__ = ('weakness', 'directory', 'compiler', 'args', 'files')
+
   #
   # Factory method
   #
@@ -217,6 +567,7 @@ class Suite:
                   xml.get ('args'))
 
   def __init__ (self, weakness, directory, compiler, args):
+    super ().__init__ ()
     self.weakness = weakness
     self.directory = directory
     self.compiler = compiler
@@ -230,10 +581,14 @@ class Suite:
     return self.files[key]
 
   def __setitem__ (self, key, value):
+    self.replace_child (self.files.get (key), value)
     self.files[key] = value
 
   def __delitem__ (self, key):
-    del self.files[key]
+    self.replace_child (self.files.pop (key), None)
+
+  def get_parent (self):
+    return self.weakness
 
   def iterate_Files (self):
     yield from self.files.values ()
@@ -290,7 +645,9 @@ class Suite:
 #
 # @class File
 #
-class File:
+class File (Node):
+  __slots__ = ('suite', 'filename', 'functions')
+
   #
   # Factory method for creating a File object from an xml document
   #
@@ -303,7 +660,7 @@ class File:
 
   def __init__ (self, suite, filename):
     self.suite = suite
-    self.filename = filename
+    self.filename = intern_string (filename)
     self.functions = {}
 
   def computeFullPath (self):
@@ -316,14 +673,24 @@ class File:
     return self.functions[key]
 
   def __setitem__ (self, key, value):
+    self.replace_child (self.functions.get (key), value)
     self.functions[key] = value
 
   def __delitem__ (self, key):
-    del self.functions[key]
+    self.replace_child (self.functions.pop (key), None)
 
   def accept (self, visitor):
     visitor.visit_File (self)
 
+  def get_parent (self):
+    return self.suite
+
+  def is_attached (self):
+    return self.suite is not None and self.suite.files.get (self.filename) is self
+
+  def iterate_children (self):
+    return iter (self.functions.values ())
+
   def iterate_Functions (self):
     yield from self.functions.values ()
 
@@ -375,7 +742,9 @@ class File:
 #
 # @class Function
 #
-class Function:
+class Function (Node):
+  __slots__ = ('file', 'function', 'lines')
+
   #
   # Factory method
   #
@@ -385,7 +754,7 @@ class Function:
 
   def __init__ (self, file, name):
     self.file = file
-    self.function = name
+    self.function = intern_string (name)
     self.lines = {}
 
   #
@@ -395,14 +764,36 @@ class Function:
     return self.lines[key]
 
   def __setitem__ (self, key, value):
+    self.replace_child (self.lines.get (key), value)
     self.lines[key] = value
 
   def __delitem__ (self, key):
-    del self.lines[key]
+    self.replace_child (self.lines.pop (key), None)
 
   def accept (self, visitor):
     visitor.visit_Function (self)
 
+  def get_parent (self):
+    return self.file
+
+  def is_attached (self):
+    return self.file is not None and self.file.functions.get (self.function) is self
+
+  def iterate_children (self):
+    return iter (self.lines.values ())
+
+  #
+  # New flaws and bugs are counted by the suite
+  #
+  def count_added (self, total, key):
+    file = self.file
+
+    if file is not None and file.functions.get (self.function) is self:
+      suite = file.suite
+
+      if suite is not None and suite.files.get (file.filename) is file:
+        suite.count_added (total, key)
+
   def iterate_Lines (self):
     yield from self.lines.values ()
 
@@ -413,6 +804,12 @@ class Function:
     line = Line (self, lineno)
     self.lines[lineno] = line
 
+    if ResultSetIndex.result_sets:
+      index = find_index (self)
+
+      if index is not None:
+        index.add_Line (line)
+
     return line
 
   def get_Lines (self):
@@ -450,7 +847,13 @@ class Function:
 #
 # @class Line
 #
-class Line:
+class Line (Node):
+  __slots__ = ('function', 'line', 'bugs', 'flaws')
+
+  # Number of flaws/bugs kept in a tuple before switching to a larger
+  # (indexed) collection.
+  SMALL_COLLECTION = 8
+
   #
   # Factory method
   #
@@ -461,26 +864,109 @@ class Line:
   def __init__ (self, function, line = 0):
     self.function = function
     self.line = line
-    self.bugs = []
-    self.flaws = []
+
+    # Most lines only have a few flaws (knowledge base) or a few bugs (build).
+    # Both collections are therefore kept as compact tuples, starting with
+    # the shared empty tuple, until they grow past SMALL_COLLECTION.
+    self.bugs = ()
+
+    # Larger flaw collections are indexed by their key so adding a flaw,
+    # and testing if the line has a flaw, stays O(1). The dict also
+    # preserves the insertion order of the flaws.
+    self.flaws = ()
 
   def accept (self, visitor):
     visitor.visit_Line (self)
 
+  #
+  # Add a flaw to the line. Duplicate flaws are suppressed, and the
+  # flaw already on the line is returned instead.
+  #
   def add_Flaw (self, flaw):
-    self.flaws.append (flaw)
+    flaws = self.flaws
+
+    if type (flaws) is dict:
+      existing = flaws.setdefault (flaw, flaw)
+
+      if existing is not flaw:
+        return existing
+    else:
+      for existing in flaws:
+        if existing == flaw:
+          return existing
+
+      if len (flaws) < Line.SMALL_COLLECTION:
+        self.flaws = flaws + (flaw,)
+      else:
+        self.flaws = dict ((x, x) for x in flaws)
+        self.flaws[flaw] = flaw
+
+    function = self.function
+
+    if function is not None and function.lines.get (self.line) is self:
+      function.count_added (Flaw, flaw.severity)
+
+    if ResultSetIndex.result_sets:
+      index = find_index (self)
+
+      if index is not None:
+        index.add_Flaw (flaw)
+
+    return flaw
+
+  def has_Flaw (self, flaw):
+    return flaw in self.flaws
 
   def add_Bug (self, bug):
-    self.bugs.append (bug)
+    if type (self.bugs) is list:
+      self.bugs.append (bug)
+    elif len (self.bugs) < Line.SMALL_COLLECTION:
+      self.bugs = self.bugs + (bug,)
+    else:
+      self.bugs = list (self.bugs)
+      self.bugs.append (bug)
+
+    function = self.function
+
+    if function is not None and function.lines.get (self.line) is self:
+      function.count_added (Bug, bug.source)
+
+    if ResultSetIndex.result_sets:
+      index = find_index (self)
+
+      if index is not None:
+        index.add_Bug (bug)
+
+  def get_counts (self):
+    counts = {}
+
+    for flaw in self.flaws:
+      counts[Flaw] = counts.get (Flaw, 0) + 1
+      counts[flaw.severity] = counts.get (flaw.severity, 0) + 1
+
+    for bug in self.bugs:
+      counts[Bug] = counts.get (Bug, 0) + 1
+      counts[bug.source] = counts.get (bug.source, 0) + 1
+
+    return counts
+
+  def count_Flaws (self, severity = None):
+    if severity is None:
+      return len (self.flaws)
+
+    return sum (1 for x in self.flaws if x.severity is severity)
+
+  def count_Bugs (self, source = None):
+    if source is None:
+      return len (self.bugs)
+
+    return sum (1 for x in self.bugs if x.source == source)
 
   def iterate_Flaws (self):
     yield from self.flaws
 
   def add_flaw (self, severity, description, source):
-    flaw = Flaw (self, severity, description, source)
-    self.flaws.append (flaw)
-
-    return flaw
+    return self.add_Flaw (Flaw (self, severity, description, source))
 
   def get_Flaws (self):
     return [x for x in self.iterate_Flaws ()]
@@ -494,6 +980,12 @@ class Line:
   def get_Line (self):
     return self
 
+  def get_parent (self):
+    return self.function
+
+  def is_attached (self):
+    return self.function is not None and self.function.lines.get (self.line) is self
+
   def get_Function (self):
     return self.function
 
@@ -527,28 +1019,38 @@ class FlawType (Enum) :
 # Wrapper class for the flaw definition.
 #
 class Flaw:
+  __slots__ = ('line', 'severity', 'description', 'source')
+
   #
   # Factory method for creating a Flaw object from a \a xml document.
   #
   @staticmethod
   def from_xml (xml, parent, source) :
-    from html import unescape
-
     return Flaw (parent,
                  FlawType [xml.get ('severity')],
-                 unescape (xml.get ('description')),
+                 unescape_cached (xml.get ('description')),
                  source)
   
   def __init__ (self, line, severity, description, source):
     self.line = line
     self.severity = severity
-    self.description = description
-    self.source = source
+    self.description = intern_string (description)
+    self.source = intern_string (source)
+
+  #
+  # The identity of a flaw, which does not include its location
+  #
+  def key (self):
+    return (self.severity, self.description, self.source)
 
   def __eq__ (self, rhs):
-    return (self.severity == rhs.severity) and \
-           (self.description == rhs.description) and \
-           (self.source == rhs.source)
+    if not isinstance (rhs, Flaw):
+      return NotImplemented
+
+    return self.key () == rhs.key ()
+
+  def __hash__ (self):
+    return hash (self.key ())
 
   def get_Line (self):
     return self.line
@@ -576,23 +1078,71 @@ class Flaw:
 # analysis purposes. Probability_info can be any string necessary for a 
 # \a Tool to identify the result from the Bug.
 #
+# A finding that spans several locations (i.e. the events of a trace) is a
+# single Bug at its primary location. The other locations are kept in \a
+# events, a single 'filename:line|filename:line' string, which is None when
+# the finding has no other location.
+#
 class Bug:
+  __slots__ = ('type', 'source', 'line', 'message', 'events')
+
   #
   # Factory method for creating a Bug object from a \a xml document.
   #
   @staticmethod
   def from_xml (xml, source):
-    from html import unescape
-
     return Bug (xml.get ('type'),
                 source,
-                unescape (xml.get ('message')))
+                unescape_cached (xml.get ('message')),
+                xml.get ('events'))
 
-  def __init__ (self, type, source, message = None):
-    self.type = type
-    self.source = source
+  # Escapes in the filenames of the events of a bug
+  EVENT_ESCAPE = re.compile ('%(25|7C)')
+
+  #
+  # Encode (filename, line) locations as the events of a bug. Returns None
+  # if there are no locations. The events are separated by '|', so a '|' in
+  # a filename is escaped, along with '%'. The line is the text after the
+  # last ':', so a ':' in a filename needs no escape.
+  #
+  @staticmethod
+  def encode_events (locations):
+    return '|'.join (['%s:%d' % (filename.replace ('%', '%25').replace ('|', '%7C'), line) for (filename, line) in locations]) or None
+
+  def __init__ (self, type, source, message = None, events = None):
+    self.type = intern_string (type)
+    self.source = intern_string (source)
     self.line = None
     self.message = message
+    self.events = events
+
+  #
+  # Iterate over the other locations of the bug, as (filename, line) tuples
+  #
+  def iterate_events (self):
+    if self.events:
+      for event in self.events.split ('|'):
+        (filename, line) = event.rsplit (':', 1)
+
+        if '%' in filename:
+          filename = Bug.EVENT_ESCAPE.sub (lambda match: chr (int (match.group (1), 16)), filename)
+
+        yield (filename, int (line))
+
+  #
+  # The identity of a bug, which does not include its location
+  #
+  def key (self):
+    return (self.type, self.source, self.message)
+
+  def __eq__ (self, rhs):
+    if not isinstance (rhs, Bug):
+      return NotImplemented
+
+    return self.key () == rhs.key ()
+
+  def __hash__ (self):
+    return hash (self.key ())
 
   def get_Line (self):
     return self.line
@@ -704,6 +1254,8 @@ class DataPointCriteria:
 # information
 #
 class DataPoint:
+  __slots__ = ('criteria', 'tp', 'fp', 'fn', 'weakness', 'directory', 'filename', 'function', 'line', 'permutation')
+
   @staticmethod
   def from_xml (xml):
     return DataPoint (int (xml.get ('tp')),
@@ -721,12 +1273,12 @@ class DataPoint:
     self.tp = tp
     self.fp = fp
     self.fn = fn
-    self.weakness = weakness
-    self.directory = directory
-    self.filename = filename
-    self.function = function
+    self.weakness = intern_string (weakness)
+    self.directory = intern_string (directory)
+    self.filename = intern_string (filename)
+    self.function = intern_string (function)
     self.line = line
-    self.permutation = permutation
+    self.permutation = intern_string (permutation)
 
   def get_DataPointCriteria (self):
     return self.criteria
@@ -8,18 +8,26 @@
 ##
 ################################################################################
 
+import gc
 import os
+import json
 import logging
 import lxml
 
 from ..DataManager import DataManager
+from ..ResultCache import get_cache
 from ..DataAbstractions import ResultSet, Weakness, Suite, File, Function, Line, Flaw, FlawType, Bug, DataPointSet, \
-    DataPointCriteria, DataPoint
+    DataPointCriteria, DataPoint, unescape_cached
 
 from lxml import etree
 from lxml import objectify
-from lxml import sax
-from xml.sax.handler import ContentHandler
+from html import escape
+from contextlib import contextmanager
+from functools import lru_cache
+from heapq import merge as merge_sorted
+from itertools import groupby
+from sys import intern
+from xml.parsers import expat
 
 
 #
@@ -30,56 +38,483 @@ def __create__ ():
 
 
 #
-# Basic SAX Writer class to write to a file
-# using SAX instead of DOM to reduce memory
-# usage
+# Escape a value for use inside a double-quoted attribute. Filenames,
+# functions, types and line numbers repeat on every flaw and bug, so the
+# result is cached.
 #
-class SAXWriter (ContentHandler):
-    def __init__ (self, outfile, spaces_per_level):
+@lru_cache (maxsize = 65536)
+def escape_attribute (value):
+    return value.replace ('&', '&amp;').replace ('<', '&lt;').replace ('"', '&quot;')
+
+
+#
+# Descriptions and messages are stored HTML-escaped inside the attribute.
+# The same text repeats heavily within a document, so cache the result.
+#
+escape_html = lru_cache (maxsize = 65536) (escape)
+
+
+#
+# @class XMLWriter
+#
+# Streaming XML writer. Each element is written as soon as it is started,
+# so documents are serialized straight from the ResultSet and DataPointSet
+# generators without materializing a tree first. Elements without children
+# are closed with '/>'.
+#
+class XMLWriter:
+    def __init__ (self, ostream, spaces_per_level):
+        self.ostream = ostream
         self.spaces_per_level = spaces_per_level
         self.level = 0
-        self.ostream = open (outfile, 'wb')
-        self.previous_level = 0
 
-    def startDocument (self):
-        pass
+        # The last start tag has not been closed yet since we do not know
+        # if the element has children.
+        self.pending = False
 
-    def startElementNS (self, name, qname, attributes):
-        uri, localname = name
-
-        if self.level > self.previous_level:
-            # End parent element tag
-            self.write ('>\n', True)
+    #
+    # Write the start tag of an element. The attributes are a sequence of
+    # (name, value) pairs, and attributes whose value is None are skipped.
+    #
+    def start (self, tag, attributes = ()):
+        indent = ' ' * (self.spaces_per_level * self.level)
+        attrs = ''.join ([' %s="%s"' % (name, escape_attribute (value)) for name, value in attributes if value is not None])
 
-        if attributes.getLength ():
-            xml = '<%s %s' % (localname, ' '.join (['%s="%s"' % (key[1], value) for key, value in attributes.items ()]))
+        if self.pending:
+            self.ostream.write ('>\n%s<%s%s' % (indent, tag, attrs))
         else:
-            xml = '<%s' % localname
-
-        self.write (xml)
+            self.ostream.write ('%s<%s%s' % (indent, tag, attrs))
 
-        self.previous_level = self.level
         self.level += 1
+        self.pending = True
 
-    def endElementNS (self, name, qname):
+    def end (self, tag):
         self.level -= 1
-        uri, localname = name
 
-        if self.level == self.previous_level:
-            self.write ('/>\n', True)
+        if self.pending:
+            self.ostream.write ('/>\n')
+            self.pending = False
         else:
-            self.write ('</%s>\n' % localname)
+            self.ostream.write ('%s</%s>\n' % (' ' * (self.spaces_per_level * self.level), tag))
 
-    def write (self, text, skip_align = False):
-        fixed_text = self.convert (text)
+    #
+    # Write an element without children
+    #
+    def element (self, tag, attributes = ()):
+        self.start (tag, attributes)
+        self.end (tag)
 
-        if skip_align:
-            self.ostream.write (bytes ('%s' % fixed_text, 'UTF-8'))
-        else:
-            self.ostream.write (bytes ('%s%s' % (' ' * self.spaces_per_level * self.level, fixed_text), 'UTF-8'))
+    #
+    # Get the byte offset of the next element. The pending start tag is
+    # closed, so this must only be called before starting a child element.
+    #
+    def tell (self):
+        if self.pending:
+            self.ostream.write ('>\n')
+            self.pending = False
+
+        return self.ostream.tell ()
+
+
+#
+# Pause the cyclic garbage collector while loading a document. Loading
+# allocates millions of long-lived nodes, which all point back to their
+# parent, and the collector would otherwise scan them over and over.
+#
+@contextmanager
+def paused_gc ():
+    enabled = gc.isenabled ()
+    gc.disable ()
+
+    try:
+        yield
+
+    finally:
+        if enabled:
+            gc.enable ()
+
+
+#
+# Update the result set with the attributes of a <result> element
+#
+def start_result (result_set, is_build, name, source, args):
+    if name:
+        result_set.name = name
+
+    if source:
+        result_set.source = source
+
+    if args:
+        result_set.args = args
+
+    if is_build:
+        result_set.builds[source] = args
+    else:
+        result_set.imports[source] = args
+
+
+#
+# Register another source of the flaws or bugs of a document, from one of
+# its <source> elements (see XMLManager.merge)
+#
+def add_source (result_set, is_build, source, args):
+    if is_build:
+        result_set.builds.setdefault (source, args)
+    else:
+        result_set.imports.setdefault (source, args)
+
+
+#
+# @class ResultSetLoader
+#
+# Parser target that streams an import/build document into a ResultSet in
+# a single pass. The parser hands us each start tag with its attributes,
+# and no element tree is ever built. Memory is therefore bounded by the
+# ResultSet instead of the size of the document.
+#
+class ResultSetLoader:
+    def __init__ (self, result_set, is_build, weaknesses = None):
+        self.result_set = result_set
+        self.is_build = is_build
+        self.weaknesses = weaknesses
+        self.weakness = None
+        self.suite = None
+
+        # Set while inside a weakness that is not in \a weaknesses
+        self.skip = False
+
+        # Records of the same location are grouped together in the document.
+        # We therefore cache the Line of the last record so the File, Function
+        # and Line lookups are only done when the location changes.
+        self.location = None
+        self.line = None
+
+    def start (self, tag, attrib):
+        if self.skip and tag != 'weakness':
+            return
+
+        if tag == 'flaw':
+            key = (attrib.get ('file'), attrib.get ('function'), attrib.get ('line'))
+            line = self.get_line (key)
+            # Duplicate flaws are suppressed by the line.
+            line.add_Flaw (Flaw.from_xml (attrib, line, attrib.get ('source') or self.result_set.source))
+
+        elif tag == 'bug':
+            key = (attrib.get ('filename'), attrib.get ('function'), attrib.get ('line'))
+            line = self.get_line (key)
+            bug = Bug.from_xml (attrib, attrib.get ('source') or self.result_set.source)
+
+            bug.line = line
+            line.add_Bug (bug)
+
+        elif tag == 'suite':
+            self.suite = self.weakness.get_suite (attrib.get ('dir'),
+                                                  attrib.get ('tool'),
+                                                  attrib.get ('args'))
+            self.location = None
+
+        elif tag == 'weakness':
+            self.skip = self.weaknesses is not None and attrib.get ('id') not in self.weaknesses
+
+            if not self.skip:
+                self.weakness = self.result_set.get_weakness (attrib.get ('id'))
+
+        elif tag == 'result':
+            start_result (self.result_set, self.is_build, attrib.get ('name'), attrib.get ('source'), attrib.get ('args'))
+
+        elif tag == 'source':
+            add_source (self.result_set, self.is_build, attrib.get ('name'), attrib.get ('args'))
+
+    #
+    # Get the Line for a (filename, function, line) record location
+    #
+    def get_line (self, key):
+        if key != self.location:
+            self.location = key
+            self.line = self.suite.get_file (key[0]).get_function (key[1]).get_line (int (key[2]))
+
+        return self.line
+
+    def close (self):
+        return self.result_set
+
+
+#
+# @class RecordLoader
+#
+# Parser target that reads an import/build document into compact records
+# instead of a ResultSet. The records are plain tuples, so documents can be
+# parsed in worker processes and the records merged into a single ResultSet
+# by XMLManager.merge_records. Consecutive flaws and bugs of the same
+# location are grouped into a single record:
+#
+#   ('result', name, source, args)
+#   ('source', name, args)
+#   ('weakness', id)
+#   ('suite', dir, tool, args)
+#   ('line', filename, function, line, ((severity, description, source), ...), ((type, message, source, events), ...))
+#
+# The source of a flaw or bug is None, unless it differs from the source of
+# the document (see XMLManager.merge).
+#
+class RecordLoader:
+    def __init__ (self, weaknesses = None):
+        self.weaknesses = weaknesses
+        self.records = []
+        self.location = None
+        self.flaws = None
+        self.bugs = None
+        self.skip = False
+
+    def start (self, tag, attrib):
+        if self.skip and tag != 'weakness':
+            return
+
+        if tag == 'flaw':
+            self.get_line ((attrib.get ('file'), attrib.get ('function'), attrib.get ('line')))
+            self.flaws.append ((attrib.get ('severity'), unescape_cached (attrib.get ('description')), attrib.get ('source')))
+
+        elif tag == 'bug':
+            self.get_line ((attrib.get ('filename'), attrib.get ('function'), attrib.get ('line')))
+            self.bugs.append ((attrib.get ('type'), unescape_cached (attrib.get ('message')), attrib.get ('source'), attrib.get ('events')))
+
+        elif tag == 'suite':
+            self.end_line ()
+            self.records.append (('suite', attrib.get ('dir'), attrib.get ('tool'), attrib.get ('args')))
+
+        elif tag == 'weakness':
+            self.end_line ()
+            self.skip = self.weaknesses is not None and attrib.get ('id') not in self.weaknesses
+
+            if not self.skip:
+                self.records.append (('weakness', attrib.get ('id')))
+
+        elif tag == 'result':
+            self.end_line ()
+            self.records.append (('result', attrib.get ('name'), attrib.get ('source'), attrib.get ('args')))
+
+        elif tag == 'source':
+            self.records.append (('source', attrib.get ('name'), attrib.get ('args')))
+
+    #
+    # Start collecting the flaws and bugs of a (filename, function, line)
+    # location, unless it is the current location.
+    #
+    def get_line (self, key):
+        if key != self.location:
+            self.end_line ()
+            self.location = key
+            self.flaws = []
+            self.bugs = []
+
+    #
+    # Add the record of the current location
+    #
+    def end_line (self):
+        if self.location is not None:
+            (filename, function, line) = self.location
+            self.records.append (('line', intern (filename), intern (function), int (line), tuple (self.flaws), tuple (self.bugs)))
+            self.location = None
+
+    def close (self):
+        self.end_line ()
+        return self.records
+
+
+#
+# Get the name of the weakness index of the provided document
+#
+def get_index_filename (filename):
+    return filename + '.idx'
+
+
+#
+# Load the weakness index of the provided document. The index is only used
+# if the document did not change since the index was written.
+#
+def load_index (filename):
+    try:
+        with open (get_index_filename (filename), 'r', encoding = 'UTF-8') as f:
+            index = json.load (f)
+
+        stat = os.stat (filename)
+
+    except (OSError, ValueError):
+        return None
+
+    if index.get ('version') != XMLManager.INDEX_VERSION or index.get ('size') != stat.st_size or index.get ('mtime') != stat.st_mtime_ns:
+        logging.debug ('Ignoring stale index of [%s]' % filename)
+        return None
+
+    return index
+
+
+#
+# @class IndexScanner
+#
+# Builds the weakness index of a document that does not have an up-to-date
+# one, in the format of XMLManager.write_index. The document is scanned once
+# with expat, which reports the byte offset of each tag. A weakness or suite
+# ends where the next tag of its level, or the end tag of its parent, starts.
+#
+class IndexScanner:
+    def __init__ (self):
+        self.parser = expat.ParserCreate ()
+        self.parser.StartElementHandler = self.start
+        self.parser.EndElementHandler = self.end
+        self.depth = 0
+        self.header = None
+        self.weaknesses = []
+
+        # Ranges that end at the next tag
+        self.pending = []
+
+    def close_pending (self):
+        for entry in self.pending:
+            entry[2] = self.parser.CurrentByteIndex
+
+        self.pending = []
+
+    def start (self, tag, attrib):
+        if self.pending:
+            self.close_pending ()
+
+        self.depth += 1
+
+        if self.depth == 2 and tag == 'weakness':
+            offset = self.parser.CurrentByteIndex
+
+            if self.header is None:
+                self.header = offset
+
+            self.weaknesses.append ([attrib.get ('id'), offset, None, []])
+
+        elif self.depth == 3 and tag == 'suite' and self.weaknesses:
+            self.weaknesses[-1][3].append ([attrib.get ('dir'), self.parser.CurrentByteIndex, None])
+
+    def end (self, tag):
+        if self.pending:
+            self.close_pending ()
+
+        if self.depth == 2 and tag == 'weakness':
+            self.pending.append (self.weaknesses[-1])
+
+        elif self.depth == 3 and tag == 'suite' and self.weaknesses:
+            self.pending.append (self.weaknesses[-1][3][-1])
+
+        self.depth -= 1
 
-    def convert (self, text):
-        return text.replace ('&', '&amp;')
+    def scan (self, filename):
+        with open (filename, 'rb') as f:
+            self.parser.ParseFile (f)
+
+        return {'header': self.header, 'weaknesses': self.weaknesses}
+
+
+#
+# Get the weakness index of the provided document, scanning the document
+# if it has no up-to-date index
+#
+def get_document_index (filename):
+    index = load_index (filename)
+
+    if index is None:
+        logging.debug ('Scanning [%s] for its weaknesses' % filename)
+        index = IndexScanner ().scan (filename)
+
+    return index
+
+
+#
+# Get the (source, args) of the <result> element of the provided document,
+# followed by the (name, args) of its <source> elements. Only the start of
+# the document is parsed. Returns None if the document does not start with
+# a <result> element, i.e., it is not an import or build file.
+#
+def read_result (filename):
+    result = None
+    sources = []
+
+    try:
+        for (event, element) in etree.iterparse (filename, events = ('start',)):
+            if element.tag == 'result' and result is None:
+                result = (element.get ('source'), element.get ('args'))
+            elif element.tag == 'source' and result is not None:
+                sources.append ((element.get ('name'), element.get ('args')))
+            else:
+                break
+
+    except lxml.etree.XMLSyntaxError:
+        logging.error ('Syntax error reading XML [%s]' % filename)
+        return None
+
+    if result is None:
+        logging.error ('[%s] does not start with a <result> element, it is not an import or build file' % filename)
+        return None
+
+    return [result] + sources
+
+
+#
+# Parse the provided document into the parser target. When only some
+# weaknesses are requested, and the document has a weakness index, only
+# the <result> start tag and the byte ranges of the requested weaknesses
+# are read and parsed. Otherwise, the whole document is parsed, and the
+# target skips the weaknesses that were not requested.
+#
+def parse_document (filename, target, weaknesses = None):
+    parser = etree.XMLParser (target = target)
+    index = load_index (filename) if weaknesses is not None else None
+
+    if index is None:
+        return etree.parse (filename, parser)
+
+    logging.debug ('Reading [%d] weaknesses from [%s] using its index' % (len (weaknesses), filename))
+
+    with open (filename, 'rb') as f:
+        parser.feed (f.read (index['header']))
+
+        for (name, start, end, suites) in index['weaknesses']:
+            if name in weaknesses:
+                f.seek (start)
+                parser.feed (f.read (end - start))
+
+    parser.feed (b'</result>')
+    return parser.close ()
+
+
+#
+# Read the records of the provided document. This is the worker function
+# of parallel loads, so syntax errors are reported here, and the records
+# read before the error are returned like add_results does.
+#
+# The records are kept in the result cache, unless the document has errors.
+#
+def read_records (filename, weaknesses = None):
+    cache = get_cache ()
+    variant = 'records' if weaknesses is None else 'records:%s' % ','.join (sorted (set (weaknesses)))
+
+    if cache:
+        with paused_gc ():
+            records = cache.get (filename, variant)
+
+        if records is not None:
+            return records
+
+    loader = RecordLoader (weaknesses)
+
+    try:
+        with paused_gc ():
+            parse_document (filename, loader, weaknesses)
+
+    except lxml.etree.XMLSyntaxError:
+        logging.error ('Syntax error reading XML [%s]' % filename)
+        return loader.close ()
+
+    if cache:
+        cache.put (filename, loader.records, variant)
+
+    return loader.records
 
 
 #
@@ -88,6 +523,9 @@ class SAXWriter (ContentHandler):
 # Concrete class XMLManager derived from DataManager
 #
 class XMLManager (DataManager):
+    # Version of the weakness index written next to each document
+    INDEX_VERSION = 1
+
     #
     # Initialise DataManager based on arguments provided
     #
@@ -104,88 +542,219 @@ class XMLManager (DataManager):
     #
     # Reads the Data returning a Result Set
     #
-    def add_results (self, result_set, is_build):
+    # Only the weaknesses in \a weaknesses are added, if provided. The
+    # document is read through the result cache when it is enabled.
+    #
+    def add_results (self, result_set, is_build, weaknesses = None):
+        if get_cache ():
+            self.merge_records (result_set, is_build, read_records (self.__file_target__, weaknesses))
+            return
+
         try:
-            tree = objectify.parse (self.__file_target__)
-            root = tree.getroot ()
+            with paused_gc ():
+                parse_document (self.__file_target__, ResultSetLoader (result_set, is_build, weaknesses), weaknesses)
 
-            for result in root.iter ('result'):
-                if result.get ('name'):
-                    result_set.name = result.get ('name')
+        except lxml.etree.XMLSyntaxError:
+            logging.error ('Syntax error reading XML [%s]' % self.__file_target__)
+            return
 
-                if result.get ('source'):
-                    result_set.source = result.get ('source')
+    #
+    # Reads the Data as compact records, see RecordLoader
+    #
+    def read_records (self, weaknesses = None):
+        return read_records (self.__file_target__, weaknesses)
 
-                if result.get ('args'):
-                    result_set.args = result.get ('args')
+    #
+    # Merge records from read_records into the result set. The result is the
+    # same as calling add_results on the document the records came from.
+    #
+    @staticmethod
+    def merge_records (result_set, is_build, records):
+        weakness = None
+        suite = None
 
-                if is_build:
-                    result_set.builds[result.get ('source')] = result.get ('args')
-                else:
-                    result_set.imports[result.get ('source')] = result.get ('args')
+        with paused_gc ():
+            for record in records:
+                tag = record[0]
 
-                for weakness in result.iter ('weakness'):
-                    if not weakness.get ('id') in result_set.weaknesses:
-                        weakness_obj = Weakness.from_xml (weakness, result_set)
-                        result_set[weakness_obj.name] = weakness_obj
+                if tag == 'line':
+                    (_, filename, function, line_no, flaws, bugs) = record
+                    line = suite.get_file (filename).get_function (function).get_line (line_no)
+                    source = result_set.source
 
-                    weakness_obj = result_set[weakness.get ('id')]
+                    # Duplicate flaws are suppressed by the line.
+                    for (severity, description, flaw_source) in flaws:
+                        line.add_Flaw (Flaw (line, FlawType[severity], description, flaw_source or source))
 
-                    for suite in weakness.iter ('suite'):
-                        if not suite.get ('dir') in weakness_obj.suites:
-                            suite_obj = Suite.from_xml (suite, weakness_obj)
-                            weakness_obj[suite_obj.directory] = suite_obj
-                        suite_obj = weakness_obj[suite.get ('dir')]
+                    for (type, message, bug_source, events) in bugs:
+                        bug = Bug (type, bug_source or source, message, events)
+                        bug.line = line
+                        line.add_Bug (bug)
 
-                        for flaw in suite.iter ('flaw'):
-                            filename = flaw.get ('file')
-                            function = flaw.get ('function')
-                            line = int (flaw.get ('line'))
+                elif tag == 'suite':
+                    suite = weakness.get_suite (record[1], record[2], record[3])
 
-                            if not filename in suite_obj.files:
-                                file = File.from_xml (flaw, suite_obj)
-                                suite_obj[filename] = file
+                elif tag == 'weakness':
+                    weakness = result_set.get_weakness (record[1])
 
-                            if not function in suite_obj[filename].functions:
-                                function_obj = Function.from_xml (flaw, suite_obj[filename])
-                                suite_obj[filename][function] = function_obj
+                elif tag == 'result':
+                    start_result (result_set, is_build, record[1], record[2], record[3])
 
-                            if not line in suite_obj[filename][function].lines:
-                                line_obj = Line.from_xml (flaw, suite_obj[filename][function])
-                                suite_obj[filename][function][line] = line_obj
+                elif tag == 'source':
+                    add_source (result_set, is_build, record[1], record[2])
 
-                            flaw_obj = Flaw.from_xml (flaw, suite_obj[filename][function][line], result_set.source)
+    #
+    # Merge the provided import or build documents into this document, in
+    # a single pass over each of them. The suites of each document are found
+    # through its weakness index, and visited in (weakness, directory) order
+    # with a k-way merge. Each suite is read from every document that has it,
+    # and written with its lines in (file, function, line) order, so only a
+    # single suite is held in memory at a time. Flaws are de-duplicated, and
+    # bugs keep the source of their document.
+    #
+    # Only the weaknesses in \a weaknesses are merged, if provided.
+    #
+    def merge (self, filenames, weaknesses = None):
+        logging.info ('merging %d documents into [%s]' % (len (filenames), self.__file_target__))
 
-                            if not flaw_obj in suite_obj[filename][function][line].get_Flaws ():
-                                suite_obj[filename][function][line].add_Flaw (flaw_obj)
+        documents = []
+        names = set ()
+        sources = {}
 
-                        for bug in suite.iter ('bug'):
-                            filename = bug.get ('filename')
-                            function = bug.get ('function')
-                            line = int (bug.get ('line'))
+        for filename in filenames:
+            result = read_result (filename)
 
-                            if not filename in suite_obj.files:
-                                file = File.from_xml (bug, filename)
-                                file.suite = suite_obj
-                                suite_obj[filename] = file
+            if result is None:
+                logging.error ('Merge aborted, [%s] was not written' % self.__file_target__)
+                return
 
-                            if not function in suite_obj[filename].functions:
-                                function_obj = Function.from_xml (bug, function)
-                                function_obj.file = suite_obj[filename]
-                                suite_obj[filename][function] = function_obj
+            (source, args) = result[0]
+            suites = {}
 
-                            if not line in suite_obj[filename][function].lines:
-                                line_obj = Line.from_xml (bug, line)
-                                line_obj.function = suite_obj[filename][function]
-                                suite_obj[filename][function][line] = line_obj
+            for (name, name_args) in result:
+                sources.setdefault (name, name_args)
 
-                            bug_obj = Bug.from_xml (bug, result_set.source)
-                            bug_obj.line = suite_obj[filename][function][line]
-                            suite_obj[filename][function][line].add_Bug (bug_obj)
+            for (name, start, end, weakness_suites) in get_document_index (filename)['weaknesses']:
+                if weaknesses is None or name in weaknesses:
+                    names.add (name)
+                    suites.setdefault (name, []).extend ((directory, start, end) for (directory, start, end) in weakness_suites)
 
-        except lxml.etree.XMLSyntaxError:
-            logging.error ('Syntax error reading XML [%s]' % self.__file_target__)
-            return
+            documents.append ((filename, source, args, suites))
+
+        # The merged document takes the source and args of the first document.
+        # The other sources are listed in <source> elements, and the flaws and
+        # bugs of other sources are written with their source.
+        (_, result_source, result_args, _) = documents[0] if documents else (None, None, None, None)
+        sources.pop (result_source, None)
+
+        # The output may also be one of the inputs, so it is replaced once
+        # the merge is done.
+        temp = '%s.%d.tmp' % (self.__file_target__, os.getpid ())
+        inputs = [open (filename, 'rb') for (filename, _, _, _) in documents]
+        index = []
+        header = None
+
+        try:
+            with self.open_output (temp) as ostream:
+                writer = XMLWriter (ostream, 2)
+                writer.start ('result', (('source', result_source), ('args', result_args)))
+
+                for (name, args) in sources.items ():
+                    writer.element ('source', (('name', name), ('args', args)))
+
+                for name in sorted (names):
+                    start = writer.tell ()
+                    suites = []
+
+                    if header is None:
+                        header = start
+
+                    writer.start ('weakness', (('id', name),))
+
+                    # Each document lists its suites in sorted order, and the
+                    # lists are merged into a single sorted sequence.
+                    ranges = [sorted ((directory, i, offset, end) for (directory, offset, end) in document[3].get (name, ()))
+                              for (i, document) in enumerate (documents)]
+
+                    for (directory, group) in groupby (merge_sorted (*ranges), key = lambda x: x[0]):
+                        suite_start = writer.tell ()
+                        self.merge_suite (writer, [(inputs[i], documents[i][1], offset, end) for (_, i, offset, end) in group], result_source)
+                        suites.append ((directory, suite_start, ostream.tell ()))
+
+                    writer.end ('weakness')
+                    index.append ((name, start, ostream.tell (), suites))
+
+                writer.end ('result')
+
+        finally:
+            for f in inputs:
+                f.close ()
+
+        os.replace (temp, self.__file_target__)
+        self.write_index (self.__file_target__, header, index)
+        logging.info ("Merge successful on file: %s" % self.__file_target__)
+
+    #
+    # Merge the byte ranges of a suite in several documents. Each range is a
+    # (file, source, start, end) tuple, where source is the source of the
+    # document the file belongs to.
+    #
+    def merge_suite (self, writer, ranges, result_source):
+        suite = None
+        lines = {}
+
+        for (f, source, start, end) in ranges:
+            f.seek (start)
+            parser = etree.XMLParser (target = RecordLoader ())
+            parser.feed (f.read (end - start))
+
+            for record in parser.close ():
+                if record[0] == 'suite':
+                    if suite is None:
+                        suite = record
+
+                    continue
+
+                (_, filename, function, line_no, flaws, bugs) = record
+                key = (filename, function, line_no)
+                entry = lines.get (key)
+
+                if entry is None:
+                    entry = lines[key] = ({}, [])
+
+                # The flaws are kept in a dict to de-duplicate them, while
+                # keeping their order.
+                for (severity, description, flaw_source) in flaws:
+                    entry[0].setdefault ((severity, description, flaw_source or source))
+
+                for (type, message, bug_source, events) in bugs:
+                    entry[1].append ((type, message, bug_source or source, events))
+
+        writer.start ('suite', (('dir', suite[1]), ('tool', suite[2]), ('args', suite[3])))
+
+        for key in sorted (lines):
+            (filename, function, line_no) = key
+            (flaws, bugs) = lines[key]
+            line_no = str (line_no)
+
+            for (severity, description, source) in flaws:
+                writer.element ('flaw', (('file', filename),
+                                         ('function', function),
+                                         ('line', line_no),
+                                         ('severity', severity),
+                                         ('description', escape_html (description)),
+                                         ('source', None if source == result_source else source)))
+
+            for (type, message, source, events) in bugs:
+                writer.element ('bug', (('filename', filename),
+                                        ('function', function),
+                                        ('line', line_no),
+                                        ('type', type),
+                                        ('message', escape_html (message)),
+                                        ('source', None if source == result_source else source),
+                                        ('events', events)))
+
+        writer.end ('suite')
 
     #
     # Writes the Data
@@ -199,103 +768,210 @@ class XMLManager (DataManager):
         logging.info ('writing %s' % self.type ())
 
         if self.__file_target__ is None:
-            writer = SAXWriter (result_set.source, 2)
+            filename = result_set.source
         else:
-            writer = SAXWriter (self.__file_target__, 2)
+            filename = self.__file_target__
 
         logging.info ('write from source: %s' % result_set.source)
-        resultset_w = etree.Element ('result')
-        resultset_w.set ("source", result_set.source)
-        resultset_w.set ('args', result_set.args)
 
-        from html import escape
+        # The byte range of each weakness, and of its suites, is recorded
+        # in the weakness index. This allows reading only some weaknesses
+        # of the document later.
+        weaknesses = []
+        header = None
 
-        for weakness in result_set.iterate_Weaknesses ():
-            weaknesselement = etree.SubElement (resultset_w, "weakness")
-            weaknesselement.set ("id", weakness.name)
+        with self.open_output (filename) as ostream:
+            writer = XMLWriter (ostream, 2)
+            writer.start ('result', (('source', result_set.source), ('args', result_set.args)))
 
-            for suite in weakness.iterate_Suites ():
-                suiteelement = etree.SubElement (weaknesselement, "suite")
+            for weakness in result_set.iterate_Weaknesses ():
+                start = writer.tell ()
+                suites = []
 
-                suiteelement.set ("dir", suite.directory)
-                suiteelement.set ("tool", suite.compiler)
-                suiteelement.set ("args", suite.args)
+                if header is None:
+                    header = start
 
-                for file in suite.iterate_Files ():
-                    for function in file.iterate_Functions ():
-                        for line in function.iterate_Lines ():
+                writer.start ('weakness', (('id', weakness.name),))
 
-                            for flaw in line.iterate_Flaws ():
+                for suite in weakness.iterate_Suites ():
+                    suite_start = writer.tell ()
+                    writer.start ('suite', (('dir', suite.directory),
+                                            ('tool', suite.compiler),
+                                            ('args', suite.args)))
 
-                                flawelement = etree.SubElement (suiteelement, "flaw")
-                                attrib = flawelement.attrib
+                    self.write_suite (writer, suite, result_set.source)
+                    writer.end ('suite')
+                    suites.append ((suite.directory, suite_start, ostream.tell ()))
 
-                                attrib['file'] = file.filename
-                                attrib['function'] = function.function
-                                attrib['line'] = str (line.line)
-                                attrib['severity'] = str (flaw.severity.name)
-                                attrib['description'] = escape (flaw.description)
+                writer.end ('weakness')
+                weaknesses.append ((weakness.name, start, ostream.tell (), suites))
 
-                            for bug in line.iterate_Bugs ():
-                                bugelement = etree.SubElement (suiteelement, "bug")
-                                attrib = bugelement.attrib
-                                attrib['filename'] = file.filename
-                                attrib['function'] = function.function
-                                attrib['line'] = str (line.line)
-                                attrib['type'] = bug.type
-                                attrib['message'] = escape (bug.message)
+            writer.end ('result')
 
-        sax.saxify (resultset_w, writer)
+        self.write_index (filename, header, weaknesses)
+        logging.info ("Write successful on file: %s" % filename)
 
-        if self.__file_target__ is None:
-            logging.info ("Write successful on file: %s" % (result_set.source))
-        else:
-            logging.info ("Write successful on file: %s" % (self.__file_target__))
+    #
+    # Write the weakness index of a document. Documents without weaknesses
+    # have nothing to index, and any old index is removed.
+    #
+    def write_index (self, filename, header, weaknesses):
+        index_filename = get_index_filename (filename)
+
+        try:
+            if header is None:
+                if os.path.exists (index_filename):
+                    os.remove (index_filename)
+
+                return
+
+            stat = os.stat (filename)
+
+            with open (index_filename, 'w', encoding = 'UTF-8') as f:
+                json.dump ({'version': XMLManager.INDEX_VERSION,
+                            'size': stat.st_size,
+                            'mtime': stat.st_mtime_ns,
+                            'header': header,
+                            'weaknesses': weaknesses}, f)
+
+        except OSError as e:
+            logging.warning ('Unable to write index [%s]: %s' % (index_filename, e))
+
+    #
+    # Write the flaws and bugs of a suite. The source of a flaw or bug is
+    # only written when it differs from the \a source of the document.
+    #
+    def write_suite (self, writer, suite, source = None):
+        for file in suite.iterate_Files ():
+            for function in file.iterate_Functions ():
+                for line in function.iterate_Lines ():
+                    line_no = str (line.line)
+
+                    for flaw in line.iterate_Flaws ():
+                        writer.element ('flaw', (('file', file.filename),
+                                                 ('function', function.function),
+                                                 ('line', line_no),
+                                                 ('severity', flaw.severity.name),
+                                                 ('description', escape_html (flaw.description)),
+                                                 ('source', None if flaw.source == source else flaw.source)))
+
+                    for bug in line.iterate_Bugs ():
+                        writer.element ('bug', (('filename', file.filename),
+                                                ('function', function.function),
+                                                ('line', line_no),
+                                                ('type', bug.type),
+                                                ('message', escape_html (bug.message)),
+                                                ('source', None if bug.source == source else bug.source),
+                                                ('events', bug.events)))
 
     #
     # Writes a Datapoint File
     #
     def write_datapointset (self, datapointset):
         logging.info ('writing %s' % self.type ())
-        writer = SAXWriter (self.__file_target__, 2)
 
-        datapointset_x = etree.Element ('datapointset')
+        with self.open_output (self.__file_target__) as ostream:
+            writer = XMLWriter (ostream, 2)
+            writer.start ('datapointset')
 
-        for (source, args) in datapointset.imports.items ():
-            xml = etree.SubElement (datapointset_x, 'import')
-            xml.set ('source', source)
-            xml.set ('args', args)
+            for (source, args) in datapointset.imports.items ():
+                writer.element ('import', (('source', source), ('args', args)))
 
-        for (source, args) in datapointset.builds.items ():
-            xml = etree.SubElement (datapointset_x, 'build')
-            xml.set ('source', source)
-            xml.set ('args', args)
+            for (source, args) in datapointset.builds.items ():
+                writer.element ('build', (('source', source), ('args', args)))
 
-        for criteria in datapointset.iterate_Criterias ():
-            criteria_x = etree.SubElement (datapointset_x, 'criteria')
+            for criteria in datapointset.iterate_Criterias ():
+                writer.start ('criteria', (('granularity', criteria.granularity.name),
+                                           ('wrong_checker_is_fp', str (criteria.wrong_checker_is_fp)),
+                                           ('minimum', str (criteria.minimum))))
 
-            criteria_x.set ('granularity', criteria.granularity.name)
-            criteria_x.set ('wrong_checker_is_fp', str (criteria.wrong_checker_is_fp))
-            criteria_x.set ('minimum', str (criteria.minimum))
+                for datapoint in criteria.iterate_DataPoints ():
+                    writer.element ('datapoint', (('tp', str (datapoint.tp)),
+                                                  ('fp', str (datapoint.fp)),
+                                                  ('fn', str (datapoint.fn)),
+                                                  ('weakness', datapoint.weakness),
+                                                  ('directory', datapoint.directory),
+                                                  ('filename', datapoint.filename),
+                                                  ('function', datapoint.function),
+                                                  ('line', str (datapoint.line)),
+                                                  ('permutation', datapoint.permutation)))
 
-            for datapoint in criteria.iterate_DataPoints ():
-                xml = etree.SubElement (criteria_x, 'datapoint')
-                xml.set ('tp', str (datapoint.tp))
-                xml.set ('fp', str (datapoint.fp))
-                xml.set ('fn', str (datapoint.fn))
-                xml.set ('weakness', datapoint.weakness)
-                xml.set ('directory', datapoint.directory)
-                xml.set ('filename', datapoint.filename)
-                xml.set ('function', datapoint.function)
-                xml.set ('line', str (datapoint.line))
-                xml.set ('permutation', datapoint.permutation)
+                writer.end ('criteria')
 
-        sax.saxify (datapointset_x, writer)
+            writer.end ('datapointset')
+
+    #
+    # Open a buffered output stream for writing a document
+    #
+    def open_output (self, filename):
+        return open (filename, 'w', encoding = 'UTF-8', newline = '\n', buffering = 1 << 20)
 
     #
     # Reads a DataPoint file
     #
+    # The datapoints are read through the result cache when it is enabled.
+    #
     def read_datapointset (self, datapointset):
+        cache = get_cache ()
+        loaded = cache.get (self.__file_target__, 'datapointset') if cache else None
+
+        if loaded is None:
+            loaded = DataPointSet ()
+
+            with paused_gc ():
+                self.parse_datapointset (loaded)
+
+            if cache:
+                cache.put (self.__file_target__, self.compact_datapointset (loaded), 'datapointset')
+        else:
+            loaded = self.expand_datapointset (loaded)
+
+        datapointset.imports.update (loaded.imports)
+        datapointset.builds.update (loaded.builds)
+
+        for (key, criteria) in loaded.criterias.items ():
+            criteria.datapointset = datapointset
+            datapointset[key] = criteria
+
+    #
+    # Convert a DataPointSet to plain tuples, which pickle much faster than
+    # the DataPoint objects
+    #
+    def compact_datapointset (self, datapointset):
+        criterias = []
+
+        for (key, criteria) in datapointset.criterias.items ():
+            datapoints = [(x.tp, x.fp, x.fn, x.weakness, x.directory, x.filename, x.function, x.line, x.permutation) for x in criteria.datapoints]
+            criterias.append ((key, datapoints))
+
+        return (datapointset.imports, datapointset.builds, criterias)
+
+    #
+    # Convert the tuples from compact_datapointset back to a DataPointSet
+    #
+    def expand_datapointset (self, compact):
+        (imports, builds, criterias) = compact
+        datapointset = DataPointSet ()
+        datapointset.imports = imports
+        datapointset.builds = builds
+
+        with paused_gc ():
+            for (key, datapoints) in criterias:
+                criteria = DataPointCriteria (*key)
+                criteria.datapointset = datapointset
+                datapointset[key] = criteria
+
+                for values in datapoints:
+                    datapoint = DataPoint (*values)
+                    datapoint.criteria = criteria
+                    criteria.datapoints.append (datapoint)
+
+        return datapointset
+
+    #
+    # Parse a DataPoint file
+    #
+    def parse_datapointset (self, datapointset):
         root = objectify.parse (self.__file_target__).getroot ()
 
         for datapointset_x in root.iter ('datapointset'):
@@ -24,25 +24,51 @@ class NIST_Cpp_DPFactory:
     self.permutation_re = re.compile ('.*(\d\d).*')
 
   def generate (self, granularity, wrong_checker_is_fp, minimum):
-    for node in self.iterate_resultset (granularity):
-      (tp, fp, fn) = self.compute_probability (node, wrong_checker_is_fp, minimum)
+    criteria = (granularity, wrong_checker_is_fp, minimum)
 
-      # If we have nothing to report for this datapoint, skip it.
-      if (tp, fp, fn) == (0, 0, 0):
+    for (_, datapoint) in self.generate_all ([criteria]):
+      yield datapoint
+
+  def generate_all (self, criterias):
+    # Group the requested criteria by granularity. Every node is classified
+    # once, and the classification is shared by all criteria that use the
+    # node's granularity.
+    granularities = defaultdict (list)
+
+    for criteria in criterias:
+      granularities[criteria[0]].append (criteria)
+
+    for (node, granularity, summary) in self.iterate_summaries ():
+      if not granularity in granularities:
         continue
 
-      (filename, function, line_no) = self.get_location (node, granularity)
-      permutation = self.find_permutation (node)
+      classification = self.classify (node, summary)
+      location = None
+
+      for criteria in granularities[granularity]:
+        (tp, fp, fn) = self.compute_probability (classification, criteria[1], criteria[2])
 
-      yield DataPoint (tp,
-                       fp,
-                       fn,
-                       node.get_Weakness ().name,
-                       node.get_Suite ().directory,
-                       filename,
-                       function,
-                       line_no,
-                       permutation)
+        # If we have nothing to report for this datapoint, skip it.
+        if (tp, fp, fn) == (0, 0, 0):
+          continue
+
+        if location is None:
+          location = self.get_location (node, granularity)
+          permutation = self.find_permutation (node)
+          weakness = node.get_Weakness ().name
+          directory = node.get_Suite ().directory
+
+        (filename, function, line_no) = location
+
+        yield (criteria, DataPoint (tp,
+                                    fp,
+                                    fn,
+                                    weakness,
+                                    directory,
+                                    filename,
+                                    function,
+                                    line_no,
+                                    permutation))
 
   def iterate_resultset (self, granularity):
     for file in self.resultset.iterate_Files ():
@@ -54,6 +80,96 @@ class NIST_Cpp_DPFactory:
       else:
         yield from file.iterate_Lines ()
 
+  def iterate_summaries (self):
+    # Each bug and flaw is classified once, at line level. The line summaries
+    # are then rolled up to their function, and the function summaries to
+    # their file. Yields (node, granularity, summary) tuples.
+    for file in self.resultset.iterate_Files ():
+      weakness = file.get_Weakness ().name
+      function_summaries = []
+
+      for function in file.iterate_Functions ():
+        line_summaries = []
+
+        for line in function.iterate_Lines ():
+          summary = self.summarize_line (line, weakness)
+          line_summaries.append (summary)
+
+          yield (line, Granularity.Line, summary)
+
+        summary = self.merge_summaries (line_summaries)
+        function_summaries.append (summary)
+
+        yield (function, Granularity.Function, summary)
+
+      yield (file, Granularity.Filename, self.merge_summaries (function_summaries))
+
+  def summarize_line (self, line, weakness):
+    # The summary of a node is a tuple of:
+    #
+    #   * the bugs reported by the right checker, keyed by line number
+    #   * the bugs reported by a wrong checker, as a (bug, count) tuple keyed by
+    #     (source, type), since that is all the incidental check depends on
+    #   * the CWEs of the incidental flaws
+    #   * the number of expected flaws (not a fix or incidental)
+    right_checker = []
+    wrong_checker = {}
+
+    for bug in line.iterate_Bugs ():
+      if self.tools[bug.source].correct_checker (bug, weakness):
+        right_checker.append (bug)
+      else:
+        key = (bug.source, bug.type)
+
+        if key in wrong_checker:
+          wrong_checker[key] = (wrong_checker[key][0], wrong_checker[key][1] + 1)
+        else:
+          wrong_checker[key] = (bug, 1)
+
+    counts = line.get_counts ()
+    incidental = counts.get (FlawType.Incidental, 0)
+    expected = counts.get (Flaw, 0) - counts.get (FlawType.Fix, 0) - incidental
+
+    if right_checker:
+      right_checker = {line.line: right_checker}
+    else:
+      right_checker = {}
+
+    # Incidental flaws are rare, so the flaws are only checked for their
+    # CWEs on the lines that have any
+    if incidental:
+      incidental_cwes = self.identify_incidental_cwes (line)
+    else:
+      incidental_cwes = frozenset ()
+
+    return (right_checker, wrong_checker, incidental_cwes, expected)
+
+  def merge_summaries (self, summaries):
+    # Summaries are never modified once created, so the bug lists can be
+    # shared between levels as long as merging creates new ones.
+    right_checker = {}
+    wrong_checker = {}
+    incidental_cwes = set ()
+    expected = 0
+
+    for summary in summaries:
+      for (line, bugs) in summary[0].items ():
+        if line in right_checker:
+          right_checker[line] = right_checker[line] + bugs
+        else:
+          right_checker[line] = bugs
+
+      for (key, (bug, count)) in summary[1].items ():
+        if key in wrong_checker:
+          wrong_checker[key] = (wrong_checker[key][0], wrong_checker[key][1] + count)
+        else:
+          wrong_checker[key] = (bug, count)
+
+      incidental_cwes.update (summary[2])
+      expected += summary[3]
+
+    return (right_checker, wrong_checker, incidental_cwes, expected)
+
   def get_location (self, node, granularity):
     filename = node.get_File ().filename
 
@@ -69,46 +185,62 @@ class NIST_Cpp_DPFactory:
 
     return (filename, function, line)
 
-  def compute_probability (self, node, wrong_checker_is_fp, minimum):
-    (right_checker_locations, wrong_checker_count) = self.identify_checkers (node)
+  def classify (self, node, summary):
+    (right_checker_locations, wrong_checker, incidental_cwes, node_expected) = summary
+    wrong_checker_count = self.count_wrong_checkers (wrong_checker, incidental_cwes)
 
-    tp = 0
-    fp = 0
-    fn = 0
+    right_checker_fp = 0
+    tp_minimum = 0
+    tp_maximum = 0
     expected = 0
 
-    # Do incorrect checkers count as FPs?
-    if wrong_checker_is_fp:
-      fp += wrong_checker_count
-
     # If we have function information available, TPs in 'good' functions
     # count as FPs
     if (not isinstance (node, File)) and ('good' in node.get_Function ().function):
-      fp += sum ([len (x) for x in right_checker_locations.values ()])
+      right_checker_fp = sum ([len (x) for x in right_checker_locations.values ()])
     else:
       # Otherwise, we are either in a 'bad' function or at the File granularity, so
       # the right checkers are TPs.
 
       # If we have multiple tools, we need to remove duplicate TPs
       if len (self.tools) > 1:
-        self.remove_duplicates (right_checker_locations)
+        right_checker_locations = self.remove_duplicates (right_checker_locations)
 
       # If we need to apply the min/max criteria due to a tool not supporting reporting
       # by line number, do so.  If we are at the line granularity, then there's no need
       # in doing the min/max since all results from the tool that doesn't support line
       # numbers will be FPs (0 expected at line 0).
-      if self.needs_min_max and not isinstance (node, Line) and minimum:
+      if self.needs_min_max and not isinstance (node, Line):
+        tp_per_tool = list (self.tp_per_tool (right_checker_locations))
+
         # Minimum is the smallest number of TPs we can guarantee will be found (maximum overlap)
-        tp += max (self.tp_per_tool (right_checker_locations))
-      elif self.needs_min_max and not isinstance (node, Line) and not minimum:
+        tp_minimum = max (tp_per_tool)
+
         # Maximum is the largest number of TPs we could find (minimum overlap)
-        tp += sum (self.tp_per_tool (right_checker_locations))
+        tp_maximum = sum (tp_per_tool)
       else:
-        tp += sum ([len (x) for x in right_checker_locations.values ()])
+        tp_minimum = tp_maximum = sum ([len (x) for x in right_checker_locations.values ()])
 
       # We also need to calculate the expected number of flaws, which is any flaw at the
       # current location that is not a fix or incidental
-      expected = len ([f for f in node.iterate_Flaws () if not f.severity in [FlawType.Fix, FlawType.Incidental]])
+      expected = node_expected
+
+    return (wrong_checker_count, right_checker_fp, tp_minimum, tp_maximum, expected)
+
+  def compute_probability (self, classification, wrong_checker_is_fp, minimum):
+    (wrong_checker_count, right_checker_fp, tp_minimum, tp_maximum, expected) = classification
+
+    fn = 0
+    fp = right_checker_fp
+
+    # Do incorrect checkers count as FPs?
+    if wrong_checker_is_fp:
+      fp += wrong_checker_count
+
+    if minimum:
+      tp = tp_minimum
+    else:
+      tp = tp_maximum
 
     # If we have more TPs than expected, the extras are FPs
     if tp > expected:
@@ -120,28 +252,15 @@ class NIST_Cpp_DPFactory:
 
     return (tp, fp, fn)
 
-  def identify_checkers (self, node):
-    right_checker = defaultdict (list)
-    wrong_checker = 0
-    incidental_cwes = self.identify_incidental_cwes (node)
+  def count_wrong_checkers (self, wrong_checker, incidental_cwes):
+    wrong_checker_count = 0
 
-    for bug in node.iterate_Bugs ():
-      tool = self.tools[bug.source]
+    for (bug, count) in wrong_checker.values ():
+      # Check if we have the right checker for an incidental flaw
+      if not self.tools[bug.source].correct_checker_any (bug, incidental_cwes):
+        wrong_checker_count += count
 
-      if tool.correct_checker (bug, node.get_Weakness ().name):
-        right_checker[bug.get_Line ().line].append (bug)
-      else:
-        # Check if we have the right checker for an incidental flaw
-        found_incidental = False
-        for cwe in incidental_cwes:
-          if tool.correct_checker (bug, cwe):
-            found_incidental = True
-            break
-
-        if not found_incidental:
-          wrong_checker += 1
-
-    return (right_checker, wrong_checker)
+    return wrong_checker_count
 
   def identify_incidental_cwes (self, node):
     incidental_cwes = set ()
@@ -176,15 +295,18 @@ class NIST_Cpp_DPFactory:
     return results.values ()
 
   def remove_duplicates (self, locations):
+    result = {}
+
     for (line, bugs) in locations.items ():
       if line == 0:
         # We don't remove duplicates for tools that don't report
         # line numbers because we are unsure of their location
-        continue
+        result[line] = bugs
+      else:
+        # We may have multiple TPs on the same line. Drop any extras
+        result[line] = bugs[:1]
 
-      if len (bugs) > 1:
-        # We have multiple TPs on the same line. Remove any extras
-        del bugs[1:]
+    return result
 
   def get_tools (self, merged_rs):
     result = {}
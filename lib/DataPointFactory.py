@@ -26,4 +26,14 @@ class DataPointFactory:
   def generate (self, granularity, wrong_checker_is_fp, minimum):
     pass
 
+  #
+  # Generates DataPoints for several criteria, yielding (criteria, DataPoint)
+  # tuples. Factories that can share work between criteria should override
+  # this to do a single pass over the result set.
+  #
+  def generate_all (self, criterias):
+    for criteria in criterias:
+      for datapoint in self.generate (*criteria):
+        yield (criteria, datapoint)
+
   # @}
@@ -14,9 +14,47 @@ from ..DataPointFactories.NIST_Cpp_DPFactory import NIST_Cpp_DPFactory
 from ..DataManagers.XMLManager import XMLManager
 from .. import Utilities
 
+import argparse
+import logging
+
 def __create__ ():
   return DefaultExporter ()
 
+# Granularities that can be requested with --criteria
+GRANULARITIES = [Granularity.Filename, Granularity.Function, Granularity.Line]
+
+#
+# Parse a comma-separated list of criteria, each of the form
+# granularity[:wrong_checker_is_fp[:minimum]]. Omitted fields match every
+# value. This is the type of the --criteria option, so malformed criteria
+# are reported as usage errors.
+#
+def parse_criteria (value):
+  criteria = []
+
+  for item in value.split (','):
+    fields = item.split (':')
+
+    if len (fields) > 3:
+      raise argparse.ArgumentTypeError ('invalid criteria [%s], expected granularity[:wrong_checker_is_fp[:minimum]]' % item)
+
+    if fields[0] not in [x.name for x in GRANULARITIES]:
+      raise argparse.ArgumentTypeError ('invalid granularity [%s] in criteria [%s], expected one of %s' % (fields[0], item, ', '.join (x.name for x in GRANULARITIES)))
+
+    flags = []
+
+    for field in fields[1:]:
+      try:
+        flags.append (str_to_boolean (field))
+
+      except ValueError:
+        raise argparse.ArgumentTypeError ('invalid flag [%s] in criteria [%s], expected True or False' % (field, item))
+
+    flags += [None] * (2 - len (flags))
+    criteria.append ((Granularity [fields[0]], flags[0], flags[1]))
+
+  return criteria
+
 #
 # @class SCATE_Exporter
 #
@@ -26,11 +64,17 @@ class DefaultExporter (Exporter):
   def __init__ (self):
     super (DefaultExporter, self).__init__ ('scate')
     self.needs_min_max = None
+    self.criteria = None
 
   def init_parser (self, parser):
     subparser = parser.add_parser ('scate', help='default exporter used with report generators')
+    subparser.add_argument ('--criteria', type=parse_criteria, help='Comma-separated list of criteria to export, each in the form granularity[:wrong_checker_is_fp[:minimum]] (e.g. Line,Function:True)')
     subparser.set_defaults (exporter=self)
 
+  def parse_args (self, args):
+    super (DefaultExporter, self).parse_args (args)
+    self.criteria = args.criteria
+
   def export (self, merged_rs, datapointset, filename):
 
     # Find out if we need to apply the minimum/maximum criteria
@@ -39,18 +83,22 @@ class DefaultExporter (Exporter):
     # Use the NIST_Cpp_DPFactory, since that's the only factory we have right now
     factory = NIST_Cpp_DPFactory (merged_rs)
 
-    # Generate datapoints for each permutation available (granularity and wrong checker)
+    # Generate datapoints for every permutation requested (granularity and wrong
+    # checker) in a single pass over the result set
+    criterias = {}
+
     for (granularity, wrong_checker_is_fp, minimum) in self.permutations ():
       logging.debug ('Processing criteria (%s:%s:%s)' % (granularity, wrong_checker_is_fp, minimum))
-      criteria = DataPointCriteria (granularity, wrong_checker_is_fp, minimum)
+      criterias[(granularity, wrong_checker_is_fp, minimum)] = DataPointCriteria (granularity, wrong_checker_is_fp, minimum)
 
-      for datapoint in factory.generate (granularity, wrong_checker_is_fp, minimum):
-        if datapoint.filename in merged_rs.weaknesses[datapoint.weakness].suites[datapoint.directory].files:
-          criteria.datapoints.append(datapoint)
-        else:
-          logging.warning("Disregarding file '%s' in suite '%s': File not defined in KB!" % (datapoint.filename, datapoint.directory))
+    for (key, datapoint) in factory.generate_all (list (criterias.keys ())):
+      if datapoint.filename in merged_rs.weaknesses[datapoint.weakness].suites[datapoint.directory].files:
+        criterias[key].datapoints.append (datapoint)
+      else:
+        logging.warning ("Disregarding file '%s' in suite '%s': File not defined in KB!" % (datapoint.filename, datapoint.directory))
 
-      datapointset[(granularity, wrong_checker_is_fp, minimum)] = criteria
+    for (key, criteria) in criterias.items ():
+      datapointset[key] = criteria
 
     # Write the results
     xmlm = XMLManager (filename)
@@ -58,10 +106,22 @@ class DefaultExporter (Exporter):
 
   def permutations (self):
     # Yield all the permutations we handle
-    for granularity in [Granularity.Filename, Granularity.Function, Granularity.Line]:
+    for granularity in GRANULARITIES:
       for wrong_checker_is_fp in [True, False]:
         if self.needs_min_max:
           for min_max in [True, False]:
-            yield (granularity, wrong_checker_is_fp, min_max)
-        else:
+            if self.is_requested (granularity, wrong_checker_is_fp, min_max):
+              yield (granularity, wrong_checker_is_fp, min_max)
+        elif self.is_requested (granularity, wrong_checker_is_fp, True):
           yield (granularity, wrong_checker_is_fp, True)
+
+  def is_requested (self, granularity, wrong_checker_is_fp, minimum):
+    # No --criteria means every permutation is requested
+    if not self.criteria:
+      return True
+
+    for (g, w, m) in self.criteria:
+      if g == granularity and w in (None, wrong_checker_is_fp) and m in (None, minimum):
+        return True
+
+    return False
@@ -0,0 +1,390 @@
+#!/bin/env python
+
+################################################################################
+#
+# file : FileIndex.py
+#
+################################################################################
+
+from concurrent.futures import ThreadPoolExecutor
+
+import hashlib
+import json
+import logging
+import os
+import time
+
+#
+# Scan a single directory. Returns the (mtime, entries, time) of the
+# directory, where the entries are in the order of the directory listing and
+# the names of subdirectories end with a '/', and the time is when it was
+# listed. The times are taken before the listing, so a change made during
+# the scan invalidates it.
+#
+def scan_directory (path):
+  scan_time = time.time_ns ()
+  mtime = os.stat (path).st_mtime_ns
+  entries = []
+
+  with os.scandir (path) as listing:
+    for entry in listing:
+      if entry.is_dir ():
+        entries.append (entry.name + '/')
+      elif entry.is_file ():
+        entries.append (entry.name)
+
+  return (mtime, entries, scan_time)
+
+#
+# Scan the tree under the provided directory, which is relative to root.
+# Returns a dictionary of relative directory to (mtime, entries, time).
+#
+def scan_tree (root, directory):
+  results = {}
+  pending = [directory]
+
+  while pending:
+    relative = pending.pop ()
+
+    try:
+      results[relative] = scan_directory (os.path.join (root, relative))
+
+    except OSError as e:
+      logging.warning ('Unable to scan directory [%s]: %s' % (os.path.join (root, relative), e))
+      continue
+
+    pending.extend (os.path.join (relative, x[:-1]) for x in results[relative][1] if x.endswith ('/'))
+
+  return results
+
+#
+# @class FileIndex
+#
+# Index of the directories and files under a test suite root. The tree is
+# scanned once, and then answers listings, basename lookups and recursive
+# file listings from memory. Listings check the modification time of their
+# directories, so files added or removed since the scan (i.e., by a build)
+# are seen. The index can be saved to disk, and on the next load only the
+# directories whose modification time changed are scanned.
+#
+class FileIndex:
+  VERSION = 2
+
+  # Directories modified this close to their listing are always listed
+  # again, since a later change may not move their modification time.
+  RACY_WINDOW = 2 * 10 ** 9
+
+  # Number of threads used to scan and validate the tree
+  THREADS = 16
+
+  def __init__ (self, root, filename=None):
+    self.root = os.path.abspath (root)
+    self.filename = filename
+    self.directories = {}
+    self.__names__ = None
+
+  #
+  # Scan the whole tree. Each top-level directory is scanned by its own
+  # thread, since the time is spent waiting on the file system.
+  #
+  def build (self):
+    self.directories = {'': scan_directory (self.root)}
+    self.__names__ = None
+
+    subdirectories = [x[:-1] for x in self.directories[''][1] if x.endswith ('/')]
+
+    with ThreadPoolExecutor (max_workers=FileIndex.THREADS) as executor:
+      for results in executor.map (scan_tree, [self.root] * len (subdirectories), subdirectories):
+        self.directories.update (results)
+
+    logging.debug ('Indexed %d directories under [%s]' % (len (self.directories), self.root))
+
+  #
+  # Load the index from disk. Returns False if there is no usable index.
+  #
+  def load (self):
+    if not self.filename or not os.path.isfile (self.filename):
+      return False
+
+    try:
+      with open (self.filename, 'r', encoding='UTF-8') as f:
+        index = json.load (f)
+
+    except ValueError as e:
+      logging.warning ('Ignoring corrupt file index [%s]: %s' % (self.filename, e))
+      return False
+
+    if index.get ('version') != FileIndex.VERSION or index.get ('root') != self.root:
+      logging.warning ('Ignoring incompatible file index [%s]' % self.filename)
+      return False
+
+    self.directories = {path: tuple (entry) for (path, entry) in index['directories'].items ()}
+    self.__names__ = None
+
+    return True
+
+  #
+  # Write the index to disk. Failing to save the index is not an error,
+  # the tree is simply scanned again next time.
+  #
+  def save (self):
+    if not self.filename:
+      return
+
+    temp = '%s.%d.tmp' % (self.filename, os.getpid ())
+
+    try:
+      os.makedirs (os.path.dirname (self.filename), exist_ok=True)
+
+      with open (temp, 'w', encoding='UTF-8') as f:
+        json.dump ({'version': FileIndex.VERSION,
+                    'root': self.root,
+                    'directories': self.directories}, f)
+
+      os.replace (temp, self.filename)
+
+    except OSError as e:
+      logging.warning ('Unable to save file index [%s]: %s' % (self.filename, e))
+
+  #
+  # Bring a loaded index up to date. Every directory is checked with a single
+  # stat, and only the directories that changed are listed again. Returns the
+  # number of directories that were scanned.
+  #
+  def validate (self):
+    paths = list (self.directories)
+
+    def get_mtime (path):
+      try:
+        return os.stat (os.path.join (self.root, path)).st_mtime_ns
+      except OSError:
+        return None
+
+    with ThreadPoolExecutor (max_workers=FileIndex.THREADS) as executor:
+      mtimes = list (executor.map (get_mtime, paths))
+
+    changed = []
+
+    for (path, mtime) in zip (paths, mtimes):
+      if mtime is None:
+        del self.directories[path]
+      elif self.is_stale (self.directories[path], mtime):
+        changed.append (path)
+
+    # Rescan the changed directories, along with any subdirectory that is
+    # not in the index yet.
+    for path in changed:
+      try:
+        self.directories[path] = scan_directory (os.path.join (self.root, path))
+
+      except OSError:
+        del self.directories[path]
+        continue
+
+      for name in self.directories[path][1]:
+        subdirectory = os.path.join (path, name[:-1])
+
+        if name.endswith ('/') and subdirectory not in self.directories:
+          self.directories.update (scan_tree (self.root, subdirectory))
+
+    # Drop the directories that are no longer reachable from the root.
+    reachable = {}
+    pending = [''] if '' in self.directories else []
+
+    while pending:
+      path = pending.pop ()
+      reachable[path] = self.directories[path]
+
+      for name in self.directories[path][1]:
+        subdirectory = os.path.join (path, name[:-1])
+
+        if name.endswith ('/') and subdirectory in self.directories:
+          pending.append (subdirectory)
+
+    self.directories = reachable
+    self.__names__ = None
+
+    return len (changed)
+
+  #
+  # Load, validate and save the index, or build it if there is none
+  #
+  def refresh (self):
+    if self.load ():
+      changed = self.validate ()
+      logging.debug ('Rescanned %d directories under [%s]' % (changed, self.root))
+
+      if '' not in self.directories:
+        raise FileNotFoundError ('%s is not a directory' % self.root)
+    else:
+      self.build ()
+
+    self.save ()
+
+  #
+  # Test if the (mtime, entries, time) of a directory must be listed again,
+  # given its current mtime. Directories changed shortly before they were
+  # listed are always listed again, since they may have changed once more
+  # within the resolution of their mtime. Listing them again moves their
+  # time past the window.
+  #
+  def is_stale (self, entry, mtime):
+    return mtime != entry[0] or mtime >= entry[2] - FileIndex.RACY_WINDOW
+
+  #
+  # Get the (mtime, entries, time) of the provided directory, relative to the root.
+  # The directory is listed again if it changed since it was indexed, along
+  # with any new subdirectory. Returns None if it is not in the index.
+  #
+  def get_directory (self, relative):
+    entry = self.directories.get (relative)
+
+    if entry is None:
+      return None
+
+    path = os.path.join (self.root, relative)
+
+    try:
+      if not self.is_stale (entry, os.stat (path).st_mtime_ns):
+        return entry
+
+      entry = scan_directory (path)
+
+    except OSError:
+      self.directories.pop (relative, None)
+      return None
+
+    self.directories[relative] = entry
+    self.__names__ = None
+
+    for name in entry[1]:
+      subdirectory = os.path.join (relative, name[:-1])
+
+      if name.endswith ('/') and subdirectory not in self.directories:
+        self.directories.update (scan_tree (self.root, subdirectory))
+
+    return entry
+
+  #
+  # Get the path of the provided directory relative to the root
+  #
+  def relative_path (self, directory):
+    path = os.path.relpath (os.path.abspath (directory), self.root)
+    return '' if path == '.' else path
+
+  #
+  # Get the entries of the provided directory, in the order of the listing.
+  # The names of subdirectories end with a '/'.
+  #
+  def entries (self, directory):
+    entry = self.get_directory (self.relative_path (directory))
+
+    if entry is None:
+      raise FileNotFoundError ('%s is not in the file index of %s' % (directory, self.root))
+
+    return entry[1]
+
+  #
+  # Get the names of the files in the provided directory
+  #
+  def files (self, directory):
+    return [x for x in self.entries (directory) if not x.endswith ('/')]
+
+  #
+  # Get the names of the subdirectories of the provided directory
+  #
+  def subdirectories (self, directory):
+    return [x[:-1] for x in self.entries (directory) if x.endswith ('/')]
+
+  #
+  # Iterate over the files under the provided directory, and its
+  # subdirectories. The paths are relative to the directory, and come in the
+  # same order as a recursive walk of the directory listings.
+  #
+  def iterate_files (self, directory):
+    relative = self.relative_path (directory)
+    pending = [(relative, '', iter (self.entries (directory)))]
+
+    while pending:
+      (path, prefix, entries) = pending[-1]
+      name = next (entries, None)
+
+      if name is None:
+        pending.pop ()
+      elif name.endswith ('/'):
+        subdirectory = os.path.join (path, name[:-1])
+        entry = self.get_directory (subdirectory)
+
+        if entry is not None:
+          pending.append ((subdirectory, os.path.join (prefix, name[:-1]), iter (entry[1])))
+      else:
+        yield os.path.join (prefix, name)
+
+  #
+  # Find the files with the provided basename. The paths are relative to
+  # the root, in the order of iterate_files.
+  #
+  def find (self, name):
+    names = self.__names__
+
+    if names is None:
+      names = {}
+
+      for path in self.iterate_files (self.root):
+        names.setdefault (os.path.basename (path), []).append (path)
+
+      self.__names__ = names
+
+    return names.get (name, [])
+
+  #
+  # Test if the provided file is in the index. Files outside of the root
+  # are checked on disk instead.
+  #
+  def contains (self, path):
+    relative = self.relative_path (path)
+
+    if relative == '..' or relative.startswith (os.path.join ('..', '')):
+      return os.path.isfile (path)
+
+    (directory, name) = os.path.split (relative)
+    entry = self.get_directory (directory)
+
+    return entry is not None and name in entry[1]
+
+# Indexes already loaded by this process
+__indexes__ = {}
+
+#
+# Get the name of the file the index of the provided root is saved to. The
+# indexes are only saved if $SCATE_INDEX_DIR is set, under that directory.
+#
+def get_index_filename (root):
+  directory = os.environ.get ('SCATE_INDEX_DIR')
+
+  if not directory:
+    return None
+
+  digest = hashlib.sha1 (root.encode ('UTF-8', 'surrogateescape')).hexdigest ()
+  return os.path.join (directory, 'index-%s.json' % digest)
+
+#
+# Get the file index of the provided root. The index is loaded, or built,
+# the first time it is requested, and then shared by the whole process.
+# It is validated again whenever the root changed since then.
+#
+def get_index (root):
+  root = os.path.abspath (root)
+  index = __indexes__.get (root)
+
+  if index is None:
+    index = FileIndex (root, get_index_filename (root))
+    index.refresh ()
+    __indexes__[root] = index
+
+  elif '' not in index.directories or index.is_stale (index.directories[''], os.stat (root).st_mtime_ns):
+    logging.debug ('Validating the file index of [%s]' % root)
+    index.validate ()
+    index.save ()
+
+  return index
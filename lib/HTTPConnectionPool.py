@@ -0,0 +1,108 @@
+#!/bin/env python
+
+################################################################################
+#
+# file : HTTPConnectionPool.py
+#
+################################################################################
+
+from contextlib import contextmanager
+
+import http.client
+import io
+import logging
+import queue
+import urllib.error
+
+#
+# @class HTTPConnectionPool
+#
+# Bounded pool of keep-alive HTTP connections to a single server. Requests
+# borrow a connection from the pool, so at most \a size requests run at the
+# same time, and connections are reused across requests instead of opening
+# a new one every time (i.e., urllib.request.urlopen).
+#
+class HTTPConnectionPool:
+  # Errors raised when the server has closed an idle connection
+  STALE_ERRORS = (http.client.RemoteDisconnected, http.client.BadStatusLine, ConnectionResetError, BrokenPipeError)
+
+  def __init__ (self, server, size = 4, timeout = None):
+    self.server = server
+    self.size = size
+    self.timeout = timeout
+
+    # The pool starts with a placeholder for each connection, which are
+    # only opened once they are needed.
+    self.connections = queue.LifoQueue ()
+
+    for i in range (size):
+      self.connections.put (None)
+
+  #
+  # Send a request, and return its response. A connection that the server
+  # has closed since its last request is opened again, and the request is
+  # sent once more.
+  #
+  def send (self, connection, method, path, body, headers):
+    try:
+      connection.request (method, path, body, headers)
+      return connection.getresponse ()
+
+    except HTTPConnectionPool.STALE_ERRORS:
+      logging.debug ('Reconnecting to [%s]' % self.server)
+      connection.close ()
+      connection.request (method, path, body, headers)
+      return connection.getresponse ()
+
+  #
+  # Open the provided path on the server. The response is a file object,
+  # so the body can be parsed as it arrives. The connection goes back to
+  # the pool when the response is closed, once any unread part of the body
+  # has been drained. Error statuses raise urllib.error.HTTPError, just like
+  # urllib.request.urlopen.
+  #
+  @contextmanager
+  def open (self, path, method = 'GET', body = None, headers = {}):
+    connection = self.connections.get ()
+    reusable = False
+
+    try:
+      if connection is None:
+        connection = http.client.HTTPConnection (self.server, timeout = self.timeout)
+
+      response = self.send (connection, method, path, body, headers)
+
+      # The body of an error is read up front, since the connection is
+      # gone by the time the error is handled.
+      if response.status >= 400:
+        raise urllib.error.HTTPError ('http://%s%s' % (self.server, path), response.status, response.reason, response.headers, io.BytesIO (response.read ()))
+
+      yield response
+
+      response.read ()
+      reusable = not response.will_close
+
+    finally:
+      if not reusable and connection is not None:
+        connection.close ()
+
+      self.connections.put (connection if reusable else None)
+
+  #
+  # Close every idle connection
+  #
+  def close (self):
+    connections = []
+
+    while True:
+      try:
+        connections.append (self.connections.get_nowait ())
+
+      except queue.Empty:
+        break
+
+    for connection in connections:
+      if connection is not None:
+        connection.close ()
+
+      self.connections.put (None)
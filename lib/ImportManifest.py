@@ -0,0 +1,127 @@
+#!/bin/env python
+
+################################################################################
+#
+# file : ImportManifest.py
+#
+################################################################################
+
+from .DataAbstractions import FlawType
+
+import hashlib
+import json
+import logging
+import os
+
+#
+# Compute the content hash of the provided file
+#
+def hash_file (path):
+  digest = hashlib.sha1 ()
+
+  with open (path, 'rb') as f:
+    for block in iter (lambda: f.read (1 << 20), b''):
+      digest.update (block)
+
+  return digest.hexdigest ()
+
+#
+# @class ImportManifest
+#
+# Per-file manifest of an import, stored next to the knowledge base. Each
+# test case file is mapped to its size, modification time, content hash and
+# the (function, line, severity, description) flaw records it produced. This
+# allows a re-import to only parse the files that changed. The records are
+# only reused by imports of the same source with the same parser.
+#
+class ImportManifest:
+  VERSION = 2
+
+  def __init__ (self, filename, source, parser):
+    self.filename = filename
+    self.source = source
+    self.parser = parser
+    self.entries = {}
+
+  #
+  # Load the manifest from disk. A missing or incompatible manifest is
+  # treated as empty, which causes every file to be parsed.
+  #
+  def load (self):
+    if not os.path.isfile (self.filename):
+      return
+
+    try:
+      with open (self.filename, 'r', encoding='UTF-8') as f:
+        manifest = json.load (f)
+
+    except ValueError as e:
+      logging.warning ('Ignoring corrupt manifest [%s]: %s' % (self.filename, e))
+      return
+
+    if manifest.get ('version') != ImportManifest.VERSION or manifest.get ('source') != self.source:
+      logging.warning ('Ignoring incompatible manifest [%s]' % self.filename)
+      return
+
+    if manifest.get ('parser') != self.parser:
+      logging.info ('Ignoring manifest [%s] of parser [%s]' % (self.filename, manifest.get ('parser')))
+      return
+
+    for (path, (size, mtime, digest, records)) in manifest['files'].items ():
+      records = [(function, line, FlawType[severity], description) for (function, line, severity, description) in records]
+      self.entries[path] = (size, mtime, digest, records)
+
+    logging.info ('Loaded manifest [%s] with %d file(s)' % (self.filename, len (self.entries)))
+
+  #
+  # Write the manifest to disk. The manifest is replaced atomically so an
+  # interrupted import never leaves a truncated manifest behind.
+  #
+  def save (self):
+    files = {}
+
+    for (path, (size, mtime, digest, records)) in self.entries.items ():
+      records = [(function, line, severity.name, description) for (function, line, severity, description) in records]
+      files[path] = (size, mtime, digest, records)
+
+    temp = self.filename + '.tmp'
+
+    with open (temp, 'w', encoding='UTF-8') as f:
+      json.dump ({'version': ImportManifest.VERSION, 'source': self.source, 'parser': self.parser, 'files': files}, f)
+
+    os.replace (temp, self.filename)
+
+  #
+  # Remove, and return, the entries of the files under the provided
+  # directory. Files that are no longer in the directory are not added
+  # back, which drops them from the manifest.
+  #
+  def pop_directory (self, directory):
+    prefix = os.path.join (directory, '')
+    result = {}
+
+    for path in [x for x in self.entries if x.startswith (prefix)]:
+      result[path] = self.entries.pop (path)
+
+    return result
+
+  #
+  # Get the entry for the provided path
+  #
+  def get (self, path):
+    return self.entries.get (path)
+
+  #
+  # Set the entry for the provided path. Files that failed to parse must
+  # not be added, so they are parsed again by the next import.
+  #
+  def update (self, path, stat, digest, records):
+    self.entries[path] = (stat.st_size, stat.st_mtime_ns, digest, records)
+
+  #
+  # Test if the provided entry is still valid for a file with the provided
+  # stat. The hash is only checked when the size or time does not match.
+  #
+  @staticmethod
+  def is_current (entry, stat):
+    return entry is not None and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns
@@ -286,12 +286,7 @@ class WordGenerator (ReportGenerator):
         right_checker += 1
       else:
         # Check for true positives on incidental flaws
-        found_incidental = False
-        for cwe in incidental_cwes:
-          if self.tool.correct_checker (bug, cwe):
-            found_incidental = True
-
-        if not found_incidental:
+        if not self.tool.correct_checker_any (bug, incidental_cwes):
           wrong_checker += 1
 
     # Compute the TP/FP/FN probability matrix
@@ -0,0 +1,191 @@
+#!/bin/env python
+
+################################################################################
+#
+# file : ResultCache.py
+#
+################################################################################
+
+from .ImportManifest import hash_file
+
+import hashlib
+import logging
+import os
+import pickle
+
+#
+# @class ResultCache
+#
+# On-disk cache of the parsed contents of import, build and export files.
+# Each entry is keyed by the path of the file and a variant (i.e. the
+# weaknesses that were read), and is only used while the size and time, or
+# else the content hash, of the file match the ones it was created from.
+# Entries are pickled, and the least recently used entries are evicted once
+# the cache grows past its maximum size.
+#
+class ResultCache:
+  VERSION = 3
+
+  # Default maximum size of the cache, in MB
+  MAX_SIZE = 2048
+
+  def __init__ (self, directory, max_size=MAX_SIZE):
+    self.directory = directory
+    self.max_size = max_size << 20
+
+  #
+  # Get the name of the entry for the provided file and variant
+  #
+  def get_entry_filename (self, filename, variant):
+    key = '%s\n%s' % (os.path.abspath (filename), variant)
+    digest = hashlib.sha1 (key.encode ('UTF-8', 'surrogateescape')).hexdigest ()
+    return os.path.join (self.directory, '%s.pickle' % digest)
+
+  #
+  # Get the cached value for the provided file and variant, or None if
+  # there is no valid entry
+  #
+  def get (self, filename, variant=None):
+    entry_filename = self.get_entry_filename (filename, variant)
+
+    try:
+      stat = os.stat (filename)
+
+      with open (entry_filename, 'rb') as f:
+        header = pickle.load (f)
+
+        if header['version'] != ResultCache.VERSION or header['path'] != os.path.abspath (filename) or header['variant'] != variant:
+          return None
+
+        if header['size'] != stat.st_size or header['mtime'] != stat.st_mtime_ns:
+          # The file was touched, or replaced by one of the same size. Its
+          # content hash tells if the entry is still valid.
+          if header['size'] != stat.st_size or header['digest'] != hash_file (filename):
+            return None
+
+          self.update_header (entry_filename, f, header, stat)
+
+        value = pickle.load (f)
+
+      # The time of the entry is used to evict the least recently used entries.
+      os.utime (entry_filename)
+
+    except FileNotFoundError:
+      return None
+
+    except (OSError, pickle.UnpicklingError, EOFError, KeyError, AttributeError) as e:
+      logging.warning ('Ignoring cache entry [%s] of [%s]: %s' % (entry_filename, filename, e))
+      return None
+
+    logging.debug ('Using cache entry [%s] for [%s]' % (entry_filename, filename))
+    return value
+
+  #
+  # Rewrite the entry with the new size and time of its file, keeping the
+  # value as is
+  #
+  def update_header (self, entry_filename, f, header, stat):
+    header = dict (header, size=stat.st_size, mtime=stat.st_mtime_ns)
+    position = f.tell ()
+    temp = '%s.%d.tmp' % (entry_filename, os.getpid ())
+
+    with open (temp, 'wb') as out:
+      pickle.dump (header, out, protocol=pickle.HIGHEST_PROTOCOL)
+
+      for block in iter (lambda: f.read (1 << 20), b''):
+        out.write (block)
+
+    os.replace (temp, entry_filename)
+    f.seek (position)
+
+  #
+  # Store the value for the provided file and variant. The header is pickled
+  # ahead of the value, so invalid entries are detected without loading
+  # their value.
+  #
+  def put (self, filename, value, variant=None):
+    entry_filename = self.get_entry_filename (filename, variant)
+    temp = '%s.%d.tmp' % (entry_filename, os.getpid ())
+
+    try:
+      stat = os.stat (filename)
+      header = {'version': ResultCache.VERSION,
+                'path': os.path.abspath (filename),
+                'variant': variant,
+                'size': stat.st_size,
+                'mtime': stat.st_mtime_ns,
+                'digest': hash_file (filename)}
+
+      os.makedirs (self.directory, exist_ok=True)
+
+      with open (temp, 'wb') as f:
+        pickle.dump (header, f, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump (value, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+      os.replace (temp, entry_filename)
+
+    except OSError as e:
+      logging.warning ('Unable to cache [%s]: %s' % (filename, e))
+      return
+
+    self.evict ()
+
+  #
+  # Remove the least recently used entries until the cache fits in its
+  # maximum size
+  #
+  def evict (self):
+    entries = []
+
+    with os.scandir (self.directory) as listing:
+      for entry in listing:
+        if entry.name.endswith ('.pickle'):
+          stat = entry.stat ()
+          entries.append ((stat.st_mtime_ns, stat.st_size, entry.path))
+
+    total = sum (size for (_, size, _) in entries)
+
+    for (_, size, path) in sorted (entries):
+      if total <= self.max_size:
+        break
+
+      try:
+        os.remove (path)
+        total -= size
+        logging.debug ('Evicted cache entry [%s]' % path)
+
+      except FileNotFoundError:
+        pass
+
+  #
+  # Remove all the entries
+  #
+  def clear (self):
+    if not os.path.isdir (self.directory):
+      return
+
+    count = 0
+
+    with os.scandir (self.directory) as listing:
+      for entry in listing:
+        if entry.name.endswith ('.pickle') or entry.name.endswith ('.tmp'):
+          os.remove (entry.path)
+          count += 1
+
+    logging.info ('Cleared %d cache entries from [%s]' % (count, self.directory))
+
+# Directory of the cache enabled by --cache, unless SCATE_CACHE_DIR is set
+DEFAULT_DIRECTORY = os.path.join (os.path.expanduser ('~'), '.cache', 'scate', 'results')
+
+#
+# Get the result cache of this process. The cache is only used when
+# $SCATE_CACHE_DIR is set (see --cache), and holds up to $SCATE_CACHE_SIZE
+# MB. Returns None when the cache is not used.
+#
+def get_cache ():
+  directory = os.environ.get ('SCATE_CACHE_DIR')
+
+  if not directory:
+    return None
+
+  return ResultCache (directory, int (os.environ.get ('SCATE_CACHE_SIZE', ResultCache.MAX_SIZE)))
@@ -11,10 +11,27 @@
 from .DataAbstractions import ResultSet, Weakness, Suite, Flaw, FlawType, Bug
 from . import Utilities
 
+from functools import lru_cache
+
 import logging
 import os
 import re
 
+#
+# Normalize the weakness name to its CWE. Some test suites add more than the
+# CWE to the weakness name (i.e., CWE121_Stack_Based_Buffer_Overflow), which
+# is stripped at the first '_'. The results are memoized since there are only
+# a handful of distinct weakness names.
+#
+@lru_cache (maxsize=None)
+def normalize_weakness (weakness):
+  index = weakness.find ('_')
+
+  if index == -1:
+    return weakness
+  else:
+    return weakness[:index]
+
 #
 # Base class for Tools - To build and analyse
 #
@@ -30,6 +47,16 @@ class Tool:
     self.__weakness_map__ = mapping
     self.__cwe_matcher__ = re.compile ('(?P<cwe>CWE[0-9]*)')
 
+    # Compile the mapping into a reverse index from checker to the frozenset
+    # of CWEs it is classified under, so checking a bug is a hash lookup.
+    checker_cwes = {}
+
+    for (cwe, checkers) in mapping.items ():
+      for checker in checkers:
+        checker_cwes.setdefault (checker, set ()).add (cwe)
+
+    self.__checker_cwes__ = dict ((checker, frozenset (cwes)) for (checker, cwes) in checker_cwes.items ())
+
   #
   # Get the name of the tool
   #
@@ -47,14 +74,20 @@ class Tool:
   # that the bug type must be classified under the correct weakness.
   #
   def correct_checker (self, bug, weakness):
-    index = weakness.find ('_');
+    return normalize_weakness (weakness) in self.checker_cwes (bug.type)
 
-    if index == -1:
-      cwe = weakness
-    else:
-      cwe = weakness[:index]
+  #
+  # Test if the bug was identified by the correct checker for any of the
+  # provided weaknesses (i.e., the incidental CWEs of a location).
+  #
+  def correct_checker_any (self, bug, weaknesses):
+    return not self.checker_cwes (bug.type).isdisjoint (map (normalize_weakness, weaknesses))
 
-    return (cwe in self.__weakness_map__) and (bug.type in self.__weakness_map__[cwe])
+  #
+  # Get the frozenset of CWEs the provided checker is classified under
+  #
+  def checker_cwes (self, checker):
+    return self.__checker_cwes__.get (checker, frozenset ())
 
   # {@ Report hooks
 
@@ -94,6 +127,7 @@ class Tool:
   #
   def parse_args (self, args):
     self.__threads__ = args.threads
+    self.__all_locations__ = args.all_locations
     self.__SCATE_root__ = os.path.realpath (os.path.join (os.path.dirname (__file__), '../../'))
 
     if args.weaknesses:
@@ -127,4 +161,33 @@ class Tool:
   def handle_docgen (self, suite):
     pass
 
+  #
+  # Add a finding of the tool to the provided suite. The finding has one or
+  # more (filename, line) locations in the provided function, one of which
+  # is its primary location. By default the finding is a single Bug at its
+  # primary location, with the other locations as its events. With
+  # --all-locations, a Bug is added at every location instead.
+  #
+  def add_finding (self, suite, function, type, message, locations, primary = 0):
+    if not locations:
+      return
+
+    if self.__all_locations__:
+      for (filename, line) in locations:
+        self.add_bug (suite, filename, function, line, Bug (type, self.name (), message))
+
+      return
+
+    (filename, line) = locations[primary]
+    events = [x for x in dict.fromkeys (locations) if x != locations[primary]]
+    self.add_bug (suite, filename, function, line, Bug (type, self.name (), message, Bug.encode_events (events)))
+
+  #
+  # Add a bug to the suite at the provided location
+  #
+  def add_bug (self, suite, filename, function, line, bug):
+    line = suite.get_file (filename).get_function (function).get_line (line)
+    bug.line = line
+    line.add_Bug (bug)
+
   # @}
@@ -10,11 +10,15 @@
 
 
 from lib.Tool import Tool
-from lib.DataAbstractions import File, Function, Line, Bug
+from lib.DataAbstractions import Bug
 from lib import Utilities
+from lib.FileIndex import get_index
+from lib.HTTPConnectionPool import HTTPConnectionPool
 
+from concurrent.futures import ThreadPoolExecutor
+
+import codecs
 import logging
-import urllib.request
 
 import os
 import csv
@@ -143,6 +147,8 @@ class Codesonar(Tool):
         codesonar_parser.set_defaults(tool=self)
         codesonar_parser.add_argument('--server', type=str, required=True,
                                       help='location of CodeSonar server (server:port)')
+        codesonar_parser.add_argument('--connections', type=int, default=4,
+                                      help='number of concurrent downloads from the CodeSonar server')
 
     #
     # Parse the command-line arguments.
@@ -152,6 +158,11 @@ class Codesonar(Tool):
 
         self.__facts__ = []
         self.__server__ = args.server
+        self.__connections__ = max(1, args.connections)
+        self.__pool__ = HTTPConnectionPool(args.server, self.__connections__)
+
+        # Index of the server, see get_project_info
+        self.__project_info__ = {}
 
     # {@ Build hooks
 
@@ -161,25 +172,21 @@ class Codesonar(Tool):
     def handle_clean(self, suite):
         logging.info('Cleaning suite [%s]' % suite.directory)
         suite_dir = os.path.abspath(os.path.join(self.__SCATE_root__, suite.directory))
-        os.chdir(suite_dir)
 
         # Run 'make clean' in directories with a Makefile
         if suite.compiler == 'make':
             for root, subdirectories, files in os.walk(suite_dir):
                 if "Makefile" in files:
-                    os.chdir(root)
-                    Utilities.run_cmd([suite.compiler, 'clean'])
+                    Utilities.run_cmd([suite.compiler, 'clean'], cwd=root)
 
         # Delete the analysis directory
         project_name = self.get_project_name(suite)
-        analysis_dir = os.path.join(project_name, '.prj_files')
+        analysis_dir = os.path.join(suite_dir, project_name, '.prj_files')
         if os.path.isdir(analysis_dir):
             import shutil
             logging.info('Deleting analysis directory [%s]', analysis_dir)
             shutil.rmtree(analysis_dir)
 
-        os.chdir(self.__SCATE_root__)
-
     #
     # Compile the weakness using CodeSonar Tool
     #
@@ -190,9 +197,7 @@ class Codesonar(Tool):
 
         self.run_build_in_tree(suite_dir, suite.compiler, suite.args)
 
-        os.chdir(self.__SCATE_root__)
-
-    def run_build_in_tree(self, directory_path, compiler, extra_args, recursive=True):
+    def run_build_in_tree(self, directory_path, compiler, extra_args, recursive=True, index=None):
         """
         Walk the tree under 'directory', run 'build_command' where 'Makefile' exists.
 
@@ -233,20 +238,21 @@ class Codesonar(Tool):
         :param compiler: The compiler to use (callable from shell)
         :param extra_args: Extra arguments to add to CodeSonar command.
         :param recursive: Run recursively in subdirectories found under `directory_path`
+        :param index: File index to list the directories with, the index of `directory_path` by default
         """
         result = 0
-        current_dir = os.curdir
 
         if os.path.isdir(directory_path):
             logging.debug("Discovered directory: %s" % directory_path)
         else:
             raise RuntimeError("%s is not a directory, cannot discover Makefile here" % directory_path)
 
+        if index is None:
+            index = get_index(directory_path)
+
         if recursive:
             # Find subdirectories under `directory_path`
-            subdirs = filter(os.path.isdir,
-                             [os.path.join(directory_path, file_obj) for file_obj in os.listdir(directory_path)]
-                             )
+            subdirs = [os.path.join(directory_path, name) for name in index.subdirectories(directory_path)]
 
             for subdir in subdirs:
                 if 'prj_files' not in directory_path:
@@ -258,18 +264,16 @@ class Codesonar(Tool):
                     result += self.run_build_in_tree(os.path.join(directory_path, subdir),
                                                      compiler,
                                                      extra_args,
-                                                     recursive)
+                                                     recursive,
+                                                     index)
                 else:
                     logging.debug("Skipping CodeSonar build directory: %s " % directory_path)
 
         # TODO: Rework for for different compilers
-        file_path = os.path.join(directory_path, 'Makefile')
-        if os.path.exists(file_path):
+        files = index.files(directory_path)
+        if 'Makefile' in files:
             logging.debug("Found Makefile in directory: %s" % directory_path)
 
-            logging.debug("Changing to directory: %s" % directory_path)
-            os.chdir(directory_path)
-
             project_name = self.get_project_name(directory_path)
             logging.debug('Using project name [%s]' % project_name)
             self.projects[project_name] = directory_path
@@ -279,23 +283,17 @@ class Codesonar(Tool):
             if compiler == 'make' and self.__threads__ > 1:
                 build_command.extend(['-j', '%s' % self.__threads__])
 
-            logging.debug("Running %s in directory '%s'..." % (" ".join(build_command), os.curdir))
-            Utilities.run_cmd(build_command)
+            logging.debug("Running %s in directory '%s'..." % (" ".join(build_command), directory_path))
+            Utilities.run_cmd(build_command, cwd=directory_path)
             result += 1
         else:
             if not 'prj_files' in directory_path:
-                file_count = len(
-                    [name for name in os.listdir(directory_path) if os.path.isfile(os.path.join(directory_path, name))])
-                if file_count > 0:
+                if len(files) > 0:
                     logging.warning(
                         "NOTICE: Files in %s are not supported by CodeSonar (no Makefile found)" % directory_path)
             else:
                 logging.debug("Skipping CodeSonar build directory: %s " % directory_path)
 
-        if not current_dir == os.curdir:
-            logging.debug("Changing directory back to %s..." % current_dir)
-            os.chdir(current_dir)
-
         return result
 
     #
@@ -310,51 +308,96 @@ class Codesonar(Tool):
     def handle_docgen(self, suite):
         # Get build numbers and project name from the index
         logging.info('Generating build results for suite [%s]' % suite.directory)
-        project_info = self.get_projects_from_server()
+        projects = self.get_suite_projects(suite)
+        project_info = self.get_project_info([name for (name, directory) in projects])
 
-        for project_name in self.projects.keys():
+        # Only the projects up to the first one without results are read
+        for (i, (project_name, project_dir)) in enumerate(projects):
             if not project_name in project_info.keys():
                 logging.error('ERROR: Unable to find project %s on server' % project_name)
-                return
+                del projects[i:]
+                break
 
             if project_info[project_name]['status'] != 'Finished':
                 logging.error('ERROR: Analysis incomplete for project [%s], skipping' % project_name)
-                return
+                del projects[i:]
+                break
 
-            # Get the analysis results
-            analysis = self.get_from_server('http://%s%s' % (self.__server__, project_info[project_name]['url']))
-            reader = csv.reader(analysis[1:])
+        if not projects:
+            logging.info('Found [0] bugs for suite [%s]' % suite.directory)
+            return
 
-            for row in reader:
-                # Example fields: ['score', 'id', 'class', 'rank', 'file', 'line number', 'procedure', 'priority', 'state', 'finding', 'owner', 'url']
-                # Example values: ['70', '63.2844', 'Return Pointer to Local', 'Security', 'CWE562_Return_of_Stack_Variable_Address__return_buf_01.c', '17', 'helperBad', 'None', 'None', 'None', '', '/warninginstance/2844.txt?filter=3']
+        # The files are checked against the file index of the suite, instead
+        # of once per row on disk.
+        index = get_index(os.path.abspath(os.path.join(self.__SCATE_root__, suite.directory)))
 
-                prob_info = row[2]  # class of warning
+        # Get the analysis results. They are downloaded concurrently, and
+        # added to the suite in the order of the projects.
+        with ThreadPoolExecutor(max_workers=self.__connections__) as executor:
+            analyses = executor.map(self.read_analysis, [project_info[name]['url'] for (name, directory) in projects])
 
-                filename = os.path.join(self.projects[project_name], row[4])
+            for ((project_name, project_dir), rows) in zip(projects, analyses):
+                for (prob_info, filename, line, procedure) in rows:
+                    filename = os.path.join(project_dir, filename)
 
-                if not os.path.exists(filename):
-                    logging.info("File %s not found, skipping row in CodeSonar project analysis results" % filename)
-                    continue
+                    if not index.contains(filename):
+                        logging.info("File %s not found, skipping row in CodeSonar project analysis results" % filename)
+                        continue
+
+                    if '::' in procedure:
+                        procedure = procedure.split('::')[-1]
 
-                line = row[5]
-                procedure = row[6]
+                    self.add_bug(suite, filename, procedure, int(line), Bug(prob_info, self.name(), prob_info))
 
-                if '::' in procedure:
-                    procedure = procedure.split('::')[-1]
+        logging.info('Found [%s] bugs for suite [%s]' % (suite.count_Bugs(), suite.directory))
 
-                if filename not in suite.files:
-                    suite[filename] = File(suite, filename)
+    #
+    # Read the analysis results at the provided url of the server. The rows
+    # are parsed as they are downloaded, and only the (class, file, line
+    # number, procedure) of each warning is kept.
+    #
+    def read_analysis(self, url):
+        # Example fields: ['score', 'id', 'class', 'rank', 'file', 'line number', 'procedure', 'priority', 'state', 'finding', 'owner', 'url']
+        # Example values: ['70', '63.2844', 'Return Pointer to Local', 'Security', 'CWE562_Return_of_Stack_Variable_Address__return_buf_01.c', '17', 'helperBad', 'None', 'None', 'None', '', '/warninginstance/2844.txt?filter=3']
+        logging.debug('Getting url from server: [%s]' % url)
+        results = []
 
-                if procedure not in suite[filename].functions:
-                    suite[filename][procedure] = Function(filename, procedure)
+        with self.__pool__.open(url) as response:
+            reader = csv.reader(codecs.iterdecode(response, 'utf-8'))
 
-                if line not in suite[filename][procedure].lines:
-                    suite[filename][procedure][line] = Line(procedure, line)
+            # Skip header
+            next(reader, None)
 
-                suite[filename][procedure][line].add_Bug(Bug(prob_info, filename + ":" + line, prob_info))
+            for row in reader:
+                if len(row) > 6:
+                    results.append((row[2], row[4], row[5], row[6]))
 
-        logging.info('Found [%s] bugs for suite [%s]' % (len(suite.get_Bugs()), suite.directory))
+        return results
+
+    #
+    # Get the status and url of the provided projects. The index of the
+    # server is kept for the whole run, and only downloaded again when one
+    # of the projects is missing from it, or was not finished yet.
+    #
+    def get_project_info(self, project_names):
+        for name in project_names:
+            if self.__project_info__.get(name, {}).get('status') != 'Finished':
+                self.__project_info__ = self.get_projects_from_server()
+                break
+
+        return self.__project_info__
+
+    #
+    # Get the (name, directory) of the projects that were built under the
+    # provided suite. Suites may be compiled concurrently, so the projects
+    # are copied before they are filtered.
+    #
+    def get_suite_projects(self, suite):
+        suite_dir = os.path.abspath(os.path.join(self.__SCATE_root__, suite.directory))
+        prefix = os.path.join(suite_dir, '')
+
+        return [(name, directory) for (name, directory) in list(self.projects.items())
+                if directory == suite_dir or directory.startswith(prefix)]
 
     #
     # Build a dict with project names and build numbers
@@ -362,32 +405,23 @@ class Codesonar(Tool):
     def get_projects_from_server(self):
         # example: CWE843,Finished,Thu Mar 13 15:18:54 2014,24577,/analysis/436.csv?filter=2
         results = {}
-        index = self.get_from_server('http://%s/index.csv' % self.__server__)
-        reader = csv.reader(index)
+        logging.debug('Getting url from server: [%s]' % '/index.csv')
 
-        for row in reader:
-            # Skip header
-            if row[0] == 'name':
-                continue
+        with self.__pool__.open('/index.csv') as response:
+            for row in csv.reader(codecs.iterdecode(response, 'utf-8')):
+                # Skip header
+                if not row or row[0] == 'name':
+                    continue
 
-            project = row[0]
-            status = row[1]
-            # Drop query arguments from url
-            url = row[4][:row[4].find('?')]
+                project = row[0]
+                status = row[1]
+                # Drop query arguments from url
+                url = row[4][:row[4].find('?')]
 
-            results[project] = {'status': status, 'url': url}
+                results[project] = {'status': status, 'url': url}
 
         return results
 
-    #
-    # Get file from server
-    #
-    def get_from_server(self, url):
-        # Requests return bytes instead of strings.  Splitting results in an extra
-        # blank line at the end.
-        logging.debug('Getting url from server: [%s]' % url)
-        return urllib.request.urlopen(url).read().decode('utf-8').split('\n')[:-1]
-
     # @}
 
     #
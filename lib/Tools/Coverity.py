@@ -10,15 +10,19 @@
 
 
 from ..Tool import Tool
-from ..DataAbstractions import ResultSet, Weakness, Suite, File, Function, Line, Flaw, Bug
+from ..DataAbstractions import ResultSet, Weakness, Suite, Flaw
 from ..DataManagers.XMLManager import XMLManager
 from ..DataManagers.CSVManager import CSVManager
 from .. import Utilities
 
+from concurrent.futures import ThreadPoolExecutor
+
 import logging
 import os
+import queue
 import subprocess
 import suds
+import time
 from suds.client import Client
 from suds.wsse import *
 import docx
@@ -36,6 +40,12 @@ def __create__ ():
 # Implementation of the Coverity tool for integration with SCATE.
 #
 class Coverity (Tool):
+  # Number of times a failed call to the defect service is sent again, and
+  # the delay before the first retry, in seconds. SOAP faults are not
+  # retried, since the server would answer the same.
+  RETRIES = 3
+  RETRY_DELAY = 1.0
+
   #
   # Default constructor
   #
@@ -125,6 +135,9 @@ class Coverity (Tool):
     coverity_parser.add_argument ('--server', type=str, required=True, help='location of Coverity server (server:port)')
     coverity_parser.add_argument ('--username', type=str, required=True, help='username to access the Coverity WebService')
     coverity_parser.add_argument ('--password', type=str, required=True, help='password to access the Coverity WebService')
+    coverity_parser.add_argument ('--page-size', type=int, default=1000, help='number of defects to get per request')
+    coverity_parser.add_argument ('--batch-size', type=int, default=200, help='number of defects to get the instances of per request')
+    coverity_parser.add_argument ('--clients', type=int, default=4, help='number of concurrent requests to the Coverity WebService')
     coverity_parser.set_defaults (tool=self)
 
   #
@@ -145,6 +158,19 @@ class Coverity (Tool):
     self.__defect_svc__ = suds.client.Client ('http://%s/ws/v7/defectservice?wsdl' % args.server)
     self.__config_svc__.set_options (wsse=security)
     self.__defect_svc__.set_options (wsse=security)
+    self.__security__ = security
+
+    # A suds client cannot be shared by threads, so each concurrent request
+    # borrows a client of the defect service from a pool. The pool starts
+    # with a placeholder for each client, which are only created once a
+    # request needs them (see call_defect_service).
+    self.__page_size__ = max (1, args.page_size)
+    self.__batch_size__ = max (1, args.batch_size)
+    self.__clients__ = max (1, args.clients)
+    self.__defect_clients__ = queue.LifoQueue ()
+
+    for i in range (self.__clients__):
+      self.__defect_clients__.put (None)
 
 
   # {@ Build hooks
@@ -155,8 +181,7 @@ class Coverity (Tool):
   def handle_clean (self, suite):
     logging.info ('Cleaning suite [%s]' % suite.directory)
     suite_dir = os.path.abspath (os.path.join (self.__SCATE_root__, suite.directory))
-    os.chdir (suite_dir)
-    Utilities.run_cmd ([suite.compiler, 'clean'])
+    Utilities.run_cmd ([suite.compiler, 'clean'], cwd=suite_dir)
 
     # Delete the remote project
     project_name = self.get_project_name (suite)
@@ -164,12 +189,12 @@ class Coverity (Tool):
     Utilities.run_cmd (['cov-manage-im', '--mode', 'streams', '--delete', '--name', project_name, '--host', self.__server__, '--user', self.__username__, '--password', self.__password__])
 
     # Delete the analysis directory
-    if (os.path.isdir ('emit')):
+    emit_dir = os.path.join (suite_dir, 'emit')
+
+    if (os.path.isdir (emit_dir)):
       import shutil
       logging.info ('Deleting analysis directory [%s]', os.path.join (suite.directory, 'emit'))
-      shutil.rmtree ('emit')
-
-    os.chdir (self.__SCATE_root__)
+      shutil.rmtree (emit_dir)
 
   #
   # Get a unique project name for the provided suite
@@ -184,10 +209,8 @@ class Coverity (Tool):
   def handle_compile (self, suite):
     logging.info ('Compiling suite [%s] with tool [%s]' % (suite.directory, self.name ()))
 
-    # Get into the correct directory
+    # Every command runs in the suite directory
     suite_dir = os.path.abspath (os.path.join (self.__SCATE_root__, suite.directory))
-    logging.debug ('Changing directory to [%s]' % suite_dir)
-    os.chdir (suite_dir)
 
     project_name = self.get_project_name (suite)
 
@@ -199,7 +222,7 @@ class Coverity (Tool):
       language = 'java'
       analyze = 'cov-analyze-java'
       configure_cmd = ['cov-configure', '--compiler', '/usr/bin/java']
-      Utilities.run_cmd (configure_cmd)
+      Utilities.run_cmd (configure_cmd, cwd=suite_dir)
 
     # Create our project and stream
     stream_cmd = ['cov-manage-im', '--mode', 'streams', '--add', '--set', 'name:%s' % project_name,
@@ -211,8 +234,8 @@ class Coverity (Tool):
                    '--host', self.__server__, '--user', self.__username__,
                    '--password', self.__password__]
 
-    Utilities.run_cmd (stream_cmd)
-    Utilities.run_cmd (project_cmd)
+    Utilities.run_cmd (stream_cmd, cwd=suite_dir)
+    Utilities.run_cmd (project_cmd, cwd=suite_dir)
 
     # Build the code
     build_cmd = ['cov-build', '--dir', suite_dir , suite.compiler, suite.args]
@@ -221,20 +244,17 @@ class Coverity (Tool):
     if language == 'cpp' and self.__threads__ > 1:
       build_cmd.extend (['-j', '%s' % self.__threads__])
 
-    Utilities.run_cmd (build_cmd)
+    Utilities.run_cmd (build_cmd, cwd=suite_dir)
 
     # Get the results
     results_cmd = [analyze, '--dir', suite_dir, '-all', '-j', str (self.__threads__)]
-    Utilities.run_cmd (results_cmd)
+    Utilities.run_cmd (results_cmd, cwd=suite_dir)
 
     # Upload results to the server
     upload_cmd = ['cov-commit-defects', '--dir', suite_dir, '--host', self.__server__,
                   '--stream', project_name, '--user', self.__username__,
                   '--password', self.__password__]
-    Utilities.run_cmd (upload_cmd)
-
-    # Get back to SCATE root
-    os.chdir (self.__SCATE_root__)
+    Utilities.run_cmd (upload_cmd, cwd=suite_dir)
 
   #
   # Get the results from coverity server and writes
@@ -255,55 +275,130 @@ class Coverity (Tool):
     stream_id_list.name = self.get_project_name (suite)
     filter_spec.streamIdList = [stream_id_list]
 
+    # Get the instances of the defects in batches of CIDs, several batches at
+    # a time. The stream defects are grouped by CID, so the bugs are added in
+    # the order of the defects no matter how the server orders them.
+    cids = [x.cid for x in defects]
+    batches = [cids[i:i + self.__batch_size__] for i in range (0, len (cids), self.__batch_size__)]
+    stream_defects = {}
+
+    with ThreadPoolExecutor (max_workers=self.__clients__) as executor:
+      for result in executor.map (lambda batch: self.call_defect_service ('getStreamDefects', batch, [filter_spec]), batches):
+        for stream_defect in result:
+          stream_defects.setdefault (stream_defect.cid, []).append (stream_defect)
+
     for proj_defect in defects:
       checker = proj_defect.checkerName
-      try:
-        function = proj_defect.functionDisplayName
-      except:
-        function = ''
+      function = getattr (proj_defect, 'functionDisplayName', '')
 
-      stream_defects = self.__defect_svc__.service.getStreamDefects ([proj_defect.cid], [filter_spec])
-      for stream_defect in stream_defects:
+      # Each instance is a finding, whose primary location is its main
+      # event, or else its last event.
+      for stream_defect in stream_defects.get (proj_defect.cid, []):
         for instance in stream_defect.defectInstances:
-          for event in instance.events:
-            filename = os.path.split (event.fileId.filePathname)[-1]
-            line = event.lineNumber
-
-            if not filename in suite.files:
-              suite[filename] = File (filename)
+          events = getattr (instance, 'events', [])
+          locations = [(os.path.split (event.fileId.filePathname)[-1], event.lineNumber) for event in events]
+          primary = next ((i for (i, event) in enumerate (events) if getattr (event, 'main', False)), len (events) - 1)
 
-            if not function in suite[filename].functions:
-              suite[filename][function] = Function (function)
+          self.add_finding (suite, function, checker, None, locations, primary)
 
-            if not line in suite[filename][function].lines:
-              suite[filename][function][line] = Line (line)
-
-            suite[filename][function][line].add_Bug (Bug (checker))
-
-    logging.info ('Found [%s] bugs for suite [%s]' % (len (suite.get_Bugs ()), suite.directory))
+    logging.info ('Found [%s] bugs for suite [%s]' % (suite.count_Bugs (), suite.directory))
 
   #
-  # Get project results from Coverity
-  # 
+  # Get project results from Coverity. The first page gives the number of
+  # defects, and the remaining pages are then fetched concurrently.
+  #
   def get_project_defects (self, suite):
-    results = []
     project_name = self.get_project_name (suite)
 
     # Get all the defects in a project
     project_id = self.__defect_svc__.factory.create ('projectIdDataObj')
     project_id.name = project_name
 
-    page_spec = self.__defect_svc__.factory.create ('pageSpecDataObj')
-    page_spec.startIndex = 0
-    page_spec.pageSize = 1 # Maximum elements per page
+    defects = self.call_defect_service ('getMergedDefectsForProject', project_id, None, self.create_page_spec (0))
+    results = list (getattr (defects, 'mergedDefects', []))
+    total = defects.totalNumberOfRecords
+
+    # The server may return smaller pages than requested, so the other pages
+    # are requested with the size of the first one. The page specs are
+    # created up front, since the factory of the defect service belongs to
+    # this thread.
+    page_size = len (results) or self.__page_size__
+    starts = range (page_size, total, page_size)
+    page_specs = [self.create_page_spec (x, page_size) for x in starts]
+
+    with ThreadPoolExecutor (max_workers=self.__clients__) as executor:
+      pages = executor.map (lambda page_spec: self.call_defect_service ('getMergedDefectsForProject', project_id, None, page_spec), page_specs)
+
+      for (start, defects) in zip (starts, pages):
+        page = list (getattr (defects, 'mergedDefects', []))
+        end = min (start + page_size, total)
+
+        # A page the server cut even shorter is completed here, one page
+        # after the other.
+        while page and start + len (page) < end:
+          defects = self.call_defect_service ('getMergedDefectsForProject', project_id, None, self.create_page_spec (start + len (page), end - start - len (page)))
+          rest = getattr (defects, 'mergedDefects', [])
+
+          if not rest:
+            break
 
-    defects = self.__defect_svc__.service.getMergedDefectsForProject (project_id, None ,page_spec)
+          page.extend (rest)
 
-    while (len (results) != defects.totalNumberOfRecords):
-      defects = self.__defect_svc__.service.getMergedDefectsForProject (project_id, None ,page_spec)
-      results.extend (defects.mergedDefects)
-      page_spec.startIndex += len (defects.mergedDefects)
+        results.extend (page)
+
+    if len (results) != total:
+      logging.warning ('Got %d of the %d defects of project [%s]' % (len (results), total, project_name))
 
     return results
 
+  #
+  # Create the spec of the page of defects that begins at the provided index.
+  # The page has the size of --page-size, unless another one is provided.
+  #
+  def create_page_spec (self, start, page_size = None):
+    page_spec = self.__defect_svc__.factory.create ('pageSpecDataObj')
+    page_spec.startIndex = start
+    page_spec.pageSize = page_size or self.__page_size__ # Maximum elements per page
+
+    return page_spec
+
+  #
+  # Create a client of the defect service
+  #
+  def create_defect_client (self):
+    client = suds.client.Client ('http://%s/ws/v7/defectservice?wsdl' % self.__server_port__)
+    client.set_options (wsse=self.__security__)
+
+    return client
+
+  #
+  # Call the provided method of the defect service with a client from the
+  # pool, and return the client to the pool once the call is done. A call
+  # that fails, other than with a SOAP fault, is sent again up to RETRIES
+  # times.
+  #
+  def call_defect_service (self, method, *args):
+    client = self.__defect_clients__.get ()
+
+    try:
+      if client is None:
+        client = self.create_defect_client ()
+
+      for retry in range (Coverity.RETRIES + 1):
+        try:
+          return getattr (client.service, method) (*args)
+
+        except suds.WebFault:
+          raise
+
+        except Exception as e:
+          if retry == Coverity.RETRIES:
+            raise
+
+          logging.warning ('Retrying [%s] on the Coverity WebService: %s' % (method, e))
+          time.sleep (Coverity.RETRY_DELAY * (retry + 1))
+
+    finally:
+      self.__defect_clients__.put (client)
+
   # @}
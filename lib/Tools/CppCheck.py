@@ -7,7 +7,6 @@
 ################################################################################
 
 from ..Tool import Tool
-from ..DataAbstractions import File, Function, Line, Bug
 from .. import Utilities
 
 import os
@@ -88,7 +87,7 @@ class CppCheck (Tool):
   def handle_compile (self, suite):
     logging.info ('Compiling suite [%s] with tool [%s]' % (suite.directory, self.name ()))
 
-    # Get into the correct directory
+    # Directory of the suite, which cppcheck runs in
     suite_abspath = os.path.abspath (os.path.join (self.__SCATE_root__, suite.directory))
     logging.info ('Running CppCheck (may take some time) ...')
 
@@ -99,39 +98,33 @@ class CppCheck (Tool):
            '4',
            suite_abspath]
 
-    with open ('errors.xml', 'w') as outfile:
-      Utilities.run_cmd (cmd, stderr=outfile)
+    with open (self.get_errors_filename (suite), 'w') as outfile:
+      Utilities.run_cmd (cmd, stderr=outfile, cwd=suite_abspath)
+
+  #
+  # Get the file the results of the provided suite are written to. Each
+  # suite keeps its own file, so suites can be compiled concurrently.
+  #
+  def get_errors_filename (self, suite):
+    return os.path.join (self.__SCATE_root__, suite.directory, 'errors.xml')
 
   #
   # Generate the result set for the output produced during the compile
   # phase of the build process.
   #
   def handle_docgen (self, suite):
-    results = objectify.parse ('errors.xml')
+    results = objectify.parse (self.get_errors_filename (suite))
     root = results.getroot ()
 
     from os.path import basename
 
+    # Each error is a finding, whose first location is its primary location
     for errors in root.iter ('errors'):
       for error in errors.iter ('error'):
-        message = error.get ('msg')
-
-        for location in error.iter ('location'):
-          filename = location.get ('file')
-          lineno = location.get ('line')
-
-          function = ''
-
-          if not filename in suite.files:
-            suite[filename] = File(suite, os.path.relpath(filename, start=suite.directory))
-
-          if not function in suite[filename].functions:
-            suite[filename][function] = Function(os.path.relpath(filename, start=suite.directory), function)
-
-          if not lineno in suite[filename][function].lines:
-              suite [filename] [function] [lineno] = Line (function, lineno)
+        locations = [(os.path.relpath (location.get ('file'), start=suite.directory), int (location.get ('line')))
+                     for location in error.iter ('location')]
 
-          suite[filename][function][lineno].add_Bug (Bug (error.get ('id'), self.name (), message))
+        self.add_finding (suite, '', error.get ('id'), error.get ('msg'), locations)
 
-    logging.info ('Found [%s] bugs for suite [%s]' % (len (suite.get_Bugs ()), suite.directory))
+    logging.info ('Found [%s] bugs for suite [%s]' % (suite.count_Bugs (), suite.directory))
 
@@ -10,13 +10,18 @@
 
 
 from ..Tool import Tool
-from ..DataAbstractions import ResultSet, Weakness, Suite, File, Function, Line, Flaw, FlawType, Bug, Granularity
+from ..DataAbstractions import ResultSet, Weakness, Suite, Flaw, FlawType, Bug, Granularity
 from ..DataManagers.XMLManager import XMLManager
 from ..DataManagers.CSVManager import CSVManager
 from .. import Utilities
+from ..HTTPConnectionPool import HTTPConnectionPool
 from lxml import objectify
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 import os
+import queue
 import subprocess
+import threading
 import urllib.request, urllib.parse, urllib.error, urllib.request, urllib.error, urllib.parse, json, sys, getpass
 
 import logging
@@ -33,6 +38,9 @@ def __create__ ():
 # @param in:host:hostid,port:portnumber,user:user
 # @returns token for the user to Login
 #
+# The token file is only read once per run.
+#
+@lru_cache (maxsize=None)
 def getToken (host, port, user) :
   ltoken = os.path.normpath(os.path.expanduser("~/.klocwork/ltoken"))
   ltokenFile = open (ltoken, 'r')
@@ -43,54 +51,18 @@ def getToken (host, port, user) :
       return rd[3]
   ltokenFile.close ()
 
-#
-# @paramin:jsonobject
-# @returns: returns object of type issue
-# which has all information about flaw
-#
-def from_json (json_object) :
-  if 'id' in json_object:
-    return Issue (json_object)
-  return json_object
-
-#
-# Issue Class: contain all the attribs returned by
-# Klocwork server
-#
-class Issue (object) :
-  #
-  # Intialises member variables with of class
-  # with attributess returned by the server
-  #
-  def __init__ (self, attrs) :
-    self.id = attrs["id"]
-    self.message = attrs["message"]
-    self.file = attrs["file"]
-    self.method = attrs["method"]
-    self.code = attrs["code"]
-    self.severity = attrs["severity"]
-    self.severityCode = attrs["severityCode"]
-    self.state = attrs["state"]
-    self.status = attrs["status"]
-    self.taxonomyName = attrs["taxonomyName"]
-    self.url = attrs["url"]
-
-  #
-  # Cutomised print method for Issue class
-  # whenever print () is called on this class object
-  # this is returned
-  #
-  def __str__ (self) :
-    return "[%d] %s\n\t%s | %s\n\tChecker Code: %s | Severity: %s(%d) | State: %s | Status: %s | Taxonomy: %s\n\t%s" % (
-    self.id, self.message, self.file, self.method, self.code, self.severity, self.severityCode, self.state,
-    self.status, self.taxonomyName, self.url)
-
 #
 # @class Klocwork
 #
 # Concrete class for Tools -Klocwork- To build and analyse
 #
 class Klocwork (Tool):
+  # Severities of the issues that are searched
+  SEVERITIES = [1, 2, 3]
+
+  # Number of issues of a search that are read ahead of the consumer
+  BUFFER_SIZE = 1000
+
   #
   # Default constructor.
   #
@@ -190,6 +162,8 @@ class Klocwork (Tool):
 
     self.__server__ = args.server
     self.__server_url__ = 'http://%s' % self.__server__
+    self.__connections__ = max (1, args.connections)
+    self.__pool__ = HTTPConnectionPool (self.__server__, self.__connections__)
 
   #
   # Initialize the parser
@@ -197,6 +171,7 @@ class Klocwork (Tool):
   def init_parser (self, parser):
     klocwork_parser = parser.add_parser ('klocwork', help='use Klocwork as the build tool')
     klocwork_parser.add_argument ('--server', type=str, required=True, help='Klocwork server address and port [server:port]')
+    klocwork_parser.add_argument ('--connections', type=int, default=3, help='number of concurrent searches on the Klocwork server')
     klocwork_parser.set_defaults (tool=self)
 
   #
@@ -208,8 +183,7 @@ class Klocwork (Tool):
 
     # Clean the compiled code
     suite_dir = os.path.abspath (os.path.join (self.__SCATE_root__, suite.directory ))
-    os.chdir (suite_dir)
-    Utilities.run_cmd ([suite.compiler, 'clean'])
+    Utilities.run_cmd ([suite.compiler, 'clean'], cwd=suite_dir)
    
     # Delete the remote project
     project_name = self.get_project_name (suite)
@@ -217,12 +191,12 @@ class Klocwork (Tool):
     Utilities.run_cmd (del_cmd)
 
     # Delete the analysis directory
-    if (os.path.isdir ('my_tables')):
+    tables_dir = os.path.join (suite_dir, 'my_tables')
+
+    if (os.path.isdir (tables_dir)):
       import shutil
       logging.info ('Deleting analysis directory [%s]', os.path.join (suite.directory, 'my_tables'))
-      shutil.rmtree ('my_tables')
-
-    os.chdir (self.__SCATE_root__)
+      shutil.rmtree (tables_dir)
 
   #
   # Compile the suite using Klocwork
@@ -230,16 +204,14 @@ class Klocwork (Tool):
   def handle_compile (self, suite):
     logging.info ('Compiling suite [%s] with tool [%s]' % (suite.directory, self.name ()))
 
-    # Get into the correct directory
+    # Every command runs in the suite directory
     suite_dir = os.path.abspath (os.path.join (self.__SCATE_root__, suite.directory))
-    logging.debug ('Changing directory to [%s]' % suite_dir)
-    os.chdir (suite_dir)
 
     project_name = self.get_project_name (suite)
 
     # Create our project
     create_cmd = ['kwadmin', '--url', self.__server_url__, 'create-project', project_name]
-    Utilities.run_cmd (create_cmd)
+    Utilities.run_cmd (create_cmd, cwd=suite_dir)
 
     # Identify the correct wrapper and build
     if suite.compiler == 'ant':
@@ -252,18 +224,15 @@ class Klocwork (Tool):
     if wrapper == 'kwinject' and self.__threads__ > 1:
       build_cmd.extend (['-j', '%s' % self.__threads__])
 
-    Utilities.run_cmd (build_cmd) 
+    Utilities.run_cmd (build_cmd, cwd=suite_dir)
 
     # Get the results
     results_cmd = ['kwbuildproject', '--url', '%s/%s' % (self.__server_url__, project_name), '-o', 'my_tables', '%s.out' % wrapper]
-    Utilities.run_cmd (results_cmd)
+    Utilities.run_cmd (results_cmd, cwd=suite_dir)
 
     # Upload results to the server
     upload_cmd = ['kwadmin', '--url', self.__server_url__, 'load', project_name, 'my_tables']
-    Utilities.run_cmd (upload_cmd)
-
-    # Get back to SCATE root
-    os.chdir (self.__SCATE_root__)
+    Utilities.run_cmd (upload_cmd, cwd=suite_dir)
 
   #
   # Get a unique project name for the provided suite
@@ -300,46 +269,94 @@ class Klocwork (Tool):
   def handle_docgen (self, suite):
     logging.info ('Generating build results for suite [%s]' % suite.directory)
 
-    url = '%s/review/api' % self.__server_url__
-    host, port = self.__server__.split (':')
-    loginToken = getToken (host, port, getpass.getuser ())
-    query = {'user': getpass.getuser (), 'action': 'search', 'ltoken': loginToken}
-
-    # Build the query
+    # Each severity is searched separately, so the searches can run at the
+    # same time. Together they are the same as the 'severity:1-3' query.
     project_name = self.get_project_name (suite)
-    query['project'] = project_name
-    query['query'] = 'severity:1-3'
-    data = urllib.parse.urlencode (query)
-    request = urllib.request.Request (url, data.encode ('utf-8'))
+    queries = ['severity:%d' % x for x in Klocwork.SEVERITIES]
 
-    # Execute the query
     try:
-      response = urllib.request.urlopen (request)
+      for (filename, function, checker) in self.iterate_searches (project_name, queries):
+        filename = os.path.split (filename)[-1]
+        line = 0 # We don't get line numbers from the Klocwork API
+
+        self.add_bug (suite, filename, function, line, Bug (checker, self.name ()))
+
     except urllib.error.HTTPError as error:
       logging.error ('ERROR: %s' % error.read ().decode ('UTF-8'))
       sys.exit (1)
 
-    data = response.add_results ().decode ('UTF-8').split ('\n')[:-1]
+    logging.info ('Found [%s] bugs for suite [%s]' % (suite.count_Bugs (), suite.directory))
+
+  #
+  # Search the issues of a project. The response has an issue per line,
+  # which are parsed as they arrive, and yielded as (file, method, code)
+  # tuples.
+  #
+  def search (self, project_name, query):
+    host, port = self.__server__.split (':')
+    user = getpass.getuser ()
+
+    data = urllib.parse.urlencode ({'user': user,
+                                    'action': 'search',
+                                    'ltoken': getToken (host, port, user),
+                                    'project': project_name,
+                                    'query': query})
+
+    headers = {'Content-Type': 'application/x-www-form-urlencoded'}
 
-    for record in data:
-      json_obj = json.loads (record, object_hook=from_json)
-      filename = os.path.split (json_obj.file)[-1]
-      function = json_obj.method
-      line = 0 # We don't get line numbers from the Klocwork API
-      checker = json_obj.code
+    with self.__pool__.open ('/review/api', 'POST', data.encode ('utf-8'), headers) as response:
+      for record in response:
+        if record.strip ():
+          issue = json.loads (record)
+          yield (issue['file'], issue['method'], issue['code'])
 
-      if not filename in suite.files:
-        suite[filename] = File (filename)
+  #
+  # Iterate over the issues of several searches of a project, in the order
+  # of the searches. Each search is read by its own worker into a bounded
+  # buffer while the earlier searches are consumed, so only a few issues
+  # are held in memory at any time.
+  #
+  def iterate_searches (self, project_name, queries):
+    stop = threading.Event ()
+    buffers = [queue.Queue (Klocwork.BUFFER_SIZE) for query in queries]
 
-      if not function in suite[filename].functions:
-        suite[filename][function] = Function (function)
+    with ThreadPoolExecutor (max_workers=self.__connections__) as executor:
+      futures = [executor.submit (self.fill_buffer, project_name, query, buffer, stop) for (query, buffer) in zip (queries, buffers)]
 
-      if not line in suite[filename][function].lines:
-        suite[filename][function][line] = Line (line)
+      try:
+        for (buffer, future) in zip (buffers, futures):
+          for issue in iter (buffer.get, None):
+            yield issue
 
-      suite[filename][function][line].add_Bug (Bug (checker))
+          # Raise any error of the search
+          future.result ()
+
+      finally:
+        stop.set ()
+
+  #
+  # Read a search into the provided buffer, which is closed with a None.
+  # Gives up once the consumer has stopped.
+  #
+  def fill_buffer (self, project_name, query, buffer, stop):
+    def put (item):
+      while not stop.is_set ():
+        try:
+          buffer.put (item, timeout=0.1)
+          return True
+
+        except queue.Full:
+          pass
+
+      return False
+
+    try:
+      for issue in self.search (project_name, query):
+        if not put (issue):
+          return
 
-    logging.info ('Found [%s] bugs for suite [%s]' % (len (suite.get_Bugs ()), suite.directory))
+    finally:
+      put (None)
 
   # @}
 
@@ -349,7 +366,7 @@ class Klocwork (Tool):
   # Supports granularity
   #
   def supports_granularity (self, granularity):
-    if granularity == Granularity.LINE:
+    if granularity == Granularity.Line:
       return False
     return True
 
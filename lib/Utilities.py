@@ -13,6 +13,8 @@ import sys
 import os
 from lib.DataAbstractions import ResultSet, Granularity
 from lib.DataManagers.XMLManager import XMLManager
+from lib.DynamicLoader import DynamicLoader
+from lib.FileIndex import get_index
 import logging
 import inspect
 import subprocess
@@ -78,11 +80,12 @@ def get_datapointfactories():
 
 
 #
-# Execute the provided command
+# Execute the provided command. The command runs in the cwd directory when
+# one is provided, which leaves the working directory of SCATE untouched.
 #
-def run_cmd(cmd, stdin=None, stdout=None, stderr=None):
-    logging.debug("Executing shell command: '%s'" % " ".join(cmd))
-    subprocess.call(cmd, stdin=stdin, stdout=stdout, stderr=stderr)
+def run_cmd(cmd, stdin=None, stdout=None, stderr=None, cwd=None):
+    logging.debug("Executing shell command: '%s' in [%s]" % (" ".join(cmd), cwd or os.getcwd()))
+    subprocess.call(cmd, stdin=stdin, stdout=stdout, stderr=stderr, cwd=cwd)
 
 
 #
@@ -161,6 +164,16 @@ def get_reportgenerators():
     return import_objects(script_path, 'lib/ReportGenerators', '__create__')
 
 
+#
+# Uses the DynamicLoader and returns all Tool objects
+#
+def get_tools():
+    script_path = os.path.dirname(os.path.abspath(sys.argv[0]))
+    loader = DynamicLoader(script_path, 'lib/Tools')
+    loader.loadClasses()
+    return loader.getClasses()
+
+
 #
 # Determines if the provided resultset needs to use the min/max criteria
 #
@@ -170,7 +183,7 @@ def needs_min_max(rs):
 
     for tool in get_tools():
         if tool.name() in rs.builds:
-            if not tool().supports_granularity(Granularity.LINE):
+            if not tool.supports_granularity(Granularity.Line):
                 return True
     return False
 
@@ -206,34 +219,10 @@ def resolve_relative_path(filename, base_directory, skip_folders: set = set()):
     :return:
     """
 
-    def find_absolute_path_to_file(search_directory):
-        logging.debug("Checking %s for file with name '%s'" % (search_directory, filename))
-        if not os.path.isabs(search_directory):
-            search_directory = os.path.abspath(search_directory)
-
-        listings = os.listdir(search_directory)
-
-        for listing in listings:
-            path = os.path.join(search_directory, listing)
-
-            # Search files at this level
-            if os.path.isfile(path):
-                if listing == filename:
-                    return path
-
-            # Recurse into each folder
-            if os.path.isdir(path):
-                if listing not in skip_folders:
-                    result = find_absolute_path_to_file(path)
-
-                    if result:
-                        return result
-
-        return None
-
-    absolute_path = find_absolute_path_to_file(base_directory)
-
-    if not absolute_path:
-        raise FileNotFoundError("%s not found in %s" % (filename, base_directory))
+    # The files come from the file index of base_directory, in the same order
+    # as a depth-first search of the directory listings.
+    for path in get_index(base_directory).find(filename):
+        if skip_folders.isdisjoint(path.split(os.sep)[:-1]):
+            return path
 
-    return os.path.relpath(absolute_path, base_directory)
\ No newline at end of file
+    raise FileNotFoundError("%s not found in %s" % (filename, base_directory))
@@ -1,9 +1,16 @@
 import logging
 import os
+import re
+import traceback
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
 
 from pyparsing import *
 
 from ..DataAbstractions import FlawType
+from ..FileIndex import get_index
+from ..ImportManifest import ImportManifest, hash_file
 from ..ImportSuite import ImportSuite
 
 
@@ -23,27 +30,48 @@ class Parser:
         self.__last_flaws__ = []
         self.__source__ = source
 
-    def parse(self, file):
+    #
+    # Parse the flaws in the provided file. The flaws are returned as compact
+    # (function, line, severity, description) records, in the order they appear
+    # in the file, instead of being added to the knowledge base. This allows
+    # the parsing to happen in a worker, and the records to be merged later.
+    #
+    # @param[in]        filename      Name of the file in its suite
+    # @param[in]        path          Full path of the file
+    #
+    def parse(self, filename, path):
+        records = []
+
+        # The state does not carry over from previously parsed files.
+        self.__current_function__ = None
+        self.__last_flaws__ = []
+
         #
         # Action for handling a C-style comment in the source file. This method
         # is attached to the C comment parser in pyparse via the setParseAction ().
         #
         def create_flaw_definition(flawString, flawLoc, flawResults):
+            severity = FlawType.Unknown
+
             # noinspection PyUnusedLocal
             def set_flaw_severity(st, loc, result):
-                result.severity = FlawType.Flaw
+                nonlocal severity
+                severity = FlawType.Flaw
 
             # noinspection PyUnusedLocal,PyUnusedLocal
             def set_potential_flaw_severity(st, loc, result):
-                result.severity = FlawType.Potential
+                nonlocal severity
+                severity = FlawType.Potential
 
             # noinspection PyUnusedLocal,PyUnusedLocal
             def set_incidental_flaw_severity(st, loc, result):
-                result.severity = FlawType.Incidental
+                nonlocal severity
+                severity = FlawType.Incidental
 
             # noinspection PyUnusedLocal,PyUnusedLocal
             def set_fix_severity_level(st, loc, result):
-                result.severity = FlawType.Fix
+                nonlocal severity
+                severity = FlawType.Fix
 
             # noinspection PyUnusedLocal,PyUnusedLocal
             def create_flaw_from_string(st, loc, result):
@@ -52,13 +80,11 @@ class Parser:
 
                 if not self.__current_function__:
                     self.__current_function__ = ''
-                    logging.warning('Missing function for %s:%d' % (file.filename, lineNumber))
-
-                function = file.get_function(self.__current_function__)
-                line = function.get_line(lineNumber)
-                flaw = line.add_flaw(result.severity, description, self.__source__)
+                    logging.warning('Missing function for %s:%d' % (filename, lineNumber))
 
-                return flaw
+                record = [self.__current_function__, lineNumber, severity, description]
+                records.append(record)
+                self.__last_flaws__.append(record)
 
             # Extract the text from the C-style comment.
             comment = flawResults[0][2:-2]
@@ -91,17 +117,14 @@ class Parser:
             flawDefinition.setParseAction(create_flaw_from_string)
 
             try:
-                # Currently getting a list of flaw objects.  Since we don't get function and line with them
-                # anymore, we need to refactor this
-                flaws = flawDefinition.parseString(comment)
-                self.__last_flaws__.extend(flaws)
-
-                return flaws
+                flawDefinition.parseString(comment)
 
             except ParseException:
-                # Change the result to an empty string. Otherwise, the original
-                # tokens will be added to the result set.
-                return []
+                pass
+
+            # Change the result to an empty list. Otherwise, the original
+            # tokens will be added to the parse results.
+            return []
 
         #
         # The purpose of this function to check if the token is a function,
@@ -113,8 +136,8 @@ class Parser:
             # is a comment. The real flaw therefore occurs on the line of the next
             # statement.
             if self.__last_flaws__:
-                for flaw in self.__last_flaws__:
-                    flaw.line.line = lineno(loc, st)
+                for record in self.__last_flaws__:
+                    record[1] = lineno(loc, st)
 
                 self.__last_flaws__[:] = []
 
@@ -136,18 +159,215 @@ class Parser:
             if token.startswith('good') or token.startswith('bad') or token.startswith('CWE'):
                 self.__current_function__ = token
 
-        # Define the grammar/parser for a file that contains flaws.
-        cStyleComment.setParseAction(create_flaw_definition)
+        # Define the grammar/parser for a file that contains flaws. The comment
+        # parser is copied since pyparsing shares cStyleComment between all
+        # parsers, including the ones running in other threads.
+        comment = cStyleComment.copy()
+        comment.setParseAction(create_flaw_definition)
 
         token = Word(printables)
         token.setParseAction(cache_token_if_function_name)
-        fileDefinition = ZeroOrMore(token.suppress() ^ cStyleComment)
+        fileDefinition = ZeroOrMore(token.suppress() ^ comment)
+
+        fileDefinition.parseFile(path)
+
+        return [tuple(record) for record in records]
+
+
+#
+# @class Scanner
+#
+# Regular expression based scanner for the Juliet C++ test cases. It finds the
+# same flaws, functions and line numbers as the pyparsing Parser, without
+# running a parse action for every token in the file.
+#
+# The file is a sequence of whitespace separated tokens (runs of printable
+# characters). A C-style comment is only recognized where a token starts, and
+# only if it is longer than that token. Scanning stops at the first character
+# that is neither whitespace nor printable, outside of a comment.
+#
+class Scanner:
+    # A token, and any whitespace before it.
+    TOKEN = re.compile(r'[ \t\n\r]*([!-~]*)')
+
+    # The next position where a token that may matter starts, or where the
+    # scan must stop. These are the tokens that may be a function of interest
+    # or a comment.
+    INTERESTING = re.compile(r'(?<![!-~])(?:good|bad|CWE|/\*)|[^ \t\n\r!-~]')
+
+    # The parts of a flaw definition in a comment.
+    FLAW_TYPE = re.compile(r'[ \t\n\r]*(?:(FLAW)|(POTENTIAL)[ \t\n\r]*FLAW|(INCIDENTAL)|(FIX))')
+    FLAW_COLON = re.compile(r'[ \t\n\r]*:')
+    FLAW_DESCRIPTION = re.compile(r'(?:[ \t\n\r]*[!-~]+)+')
+    FLAW_SEVERITIES = (FlawType.Flaw, FlawType.Potential, FlawType.Incidental, FlawType.Fix)
+
+    #
+    # Initializing constructor
+    #
+    # @param[in]        source        Source of the flaws
+    #
+    def __init__(self, source):
+        self.__source__ = source
+
+    #
+    # Parse the flaws in the provided file. The flaws are returned as the same
+    # (function, line, severity, description) records as Parser.parse ().
+    #
+    # @param[in]        filename      Name of the file in its suite
+    # @param[in]        path          Full path of the file
+    #
+    def parse(self, filename, path):
+        with open(path, 'r') as f:
+            text = f.read()
+
+        records = []
+        last_flaws = []
+        current_function = None
+        newlines = None
 
-        # Parse the file. Print the number flaws, and information about each flaw.
+        pos = 0
+        end = len(text)
+        after_comment = False
 
-        fullPath = file.computeFullPath()
+        while pos < end:
+            # Jump to the next token that may matter, unless we have flaws
+            # waiting for the line of the next token, or a token may start
+            # right after a comment.
+            if not last_flaws and not after_comment:
+                match = self.INTERESTING.search(text, pos)
 
-        return fileDefinition.parseFile(fullPath)
+                if not match or match.group() not in ('good', 'bad', 'CWE', '/*'):
+                    break
+
+                pos = match.start()
+
+            match = self.TOKEN.match(text, pos)
+            start = match.start(1)
+            pos = match.end(1)
+            after_comment = False
+
+            if start == pos:
+                # We are either at the end of the file, or at a character that
+                # is neither whitespace nor printable.
+                break
+
+            if text.startswith('/*', start):
+                close = text.find('*/', start + 2)
+
+                if close != -1 and close + 2 > pos:
+                    pos = close + 2
+                    after_comment = True
+                    flaw = self.parse_flaw(text, start + 2, close)
+
+                    if flaw:
+                        if newlines is None:
+                            newlines = self.index_lines(text)
+
+                        line = bisect_left(newlines, start) + 1
+
+                        if not current_function:
+                            current_function = ''
+                            logging.warning('Missing function for %s:%d' % (filename, line))
+
+                        record = [current_function, line, flaw[0], flaw[1]]
+                        records.append(record)
+                        last_flaws.append(record)
+
+                    continue
+
+            # If we have seen any flaws since the last token, they are on the
+            # line of this token.
+            if last_flaws:
+                if newlines is None:
+                    newlines = self.index_lines(text)
+
+                line = bisect_left(newlines, start) + 1
+
+                for record in last_flaws:
+                    record[1] = line
+
+                last_flaws = []
+
+            if text.startswith(('good', 'bad', 'CWE'), start):
+                index = text.find('(', start, pos)
+
+                if index > -1:
+                    current_function = text[start:index]
+                else:
+                    current_function = text[start:pos]
+
+        return [tuple(record) for record in records]
+
+    #
+    # Parse the flaw definition in text[start:end], which is the text of a
+    # comment. Returns a (severity, description) tuple, or None if the comment
+    # does not define a flaw.
+    #
+    def parse_flaw(self, text, start, end):
+        match = self.FLAW_TYPE.match(text, start, end)
+
+        if not match:
+            return None
+
+        severity = self.FLAW_SEVERITIES[match.lastindex - 1]
+        pos = match.end()
+
+        match = self.FLAW_COLON.match(text, pos, end)
+
+        if match:
+            pos = match.end()
+
+        match = self.FLAW_DESCRIPTION.match(text, pos, end)
+
+        if not match:
+            return None
+
+        return (severity, ' '.join(match.group().split()))
+
+    #
+    # Get the offsets of the newlines in the text. The line of an offset is
+    # then the number of newlines before it, plus one.
+    #
+    def index_lines(self, text):
+        return [match.start() for match in re.finditer('\n', text)]
+
+
+#
+# Parse a single test case file, and return a (records, error) tuple. This is
+# the unit of work handed to the import workers, so it must be a module-level
+# function for the process pool to pickle it. Failures are returned as an
+# error message instead of being logged, since the log of a worker process
+# does not reach the caller.
+#
+def parse_testcase(parser, source, filename, path):
+    # noinspection PyBroadException
+    try:
+        records = parser(source).parse(filename, path)
+        return (records, None)
+
+    except Exception:
+        return ([], 'Failed to parse %s\n%s' % (path, traceback.format_exc()))
+
+
+#
+# Parse a single test case file if its content does not match the provided
+# hash from the previous import. Returns a (hash, records, error) tuple, where
+# the records are None if the content did not change. The hash is None if the
+# file could not be read or parsed, so the file is not added to the manifest.
+#
+def parse_changed_testcase(parser, source, filename, path, digest):
+    # noinspection PyBroadException
+    try:
+        current = hash_file(path)
+
+    except Exception:
+        return (None, [], 'Failed to read %s\n%s' % (path, traceback.format_exc()))
+
+    if current == digest:
+        return (current, None, None)
+
+    (records, error) = parse_testcase(parser, source, filename, path)
+    return (None if error else current, records, error)
 
 
 #
@@ -166,6 +386,9 @@ class JulietCpp(ImportSuite):
         self.__targets__ = []
         self.__juliet_version__ = version
         self.__testcase_dir__ = None
+        self.__processes__ = None
+        self.__parser__ = Scanner
+        self.__manifest__ = None
 
     #
     # Initialize the parser
@@ -174,6 +397,9 @@ class JulietCpp(ImportSuite):
         super(JulietCpp, self).init_parser(parser)
 
         julietParser = parser.add_parser(self.getSource(), help='use %s test suite' % self.getSource())
+        julietParser.add_argument('--processes', type=int, help='number of worker processes to parse test cases with (default: use threads)')
+        julietParser.add_argument('--parser', choices=['scanner', 'pyparsing'], default='scanner', help='engine used to find the flaws in the test cases (default: scanner)')
+        julietParser.add_argument('--incremental', action='store_true', help='only parse the files that changed since the previous import, using a manifest next to the outfile')
         julietParser.set_defaults(suite=self)
 
     #
@@ -184,6 +410,13 @@ class JulietCpp(ImportSuite):
         super(JulietCpp, self).parse_args(args)
 
         self.__testcase_dir__ = os.path.realpath(self.__basepath__)
+        self.__processes__ = args.processes
+
+        if args.parser == 'pyparsing':
+            self.__parser__ = Parser
+
+        if args.incremental:
+            self.__manifest__ = args.outfile + '.manifest'
 
         if self.__weaknesses__ is None:
             logging.info('No weaknesses provided, using all weaknesses in test suite')
@@ -194,86 +427,23 @@ class JulietCpp(ImportSuite):
     # populating the result set.
     #
     def import_testcases(self, kb):
-        import threading
-        from queue import Queue
-
-        # The queue shared between the main thread, and the ParserThread
-        # worker threads below.
-        q = Queue()
-
-        #
-        # @class ParserThread
-        #
-        # Active object that parses files as they are added to a queue.
-        #
-        class ParserThread(threading.Thread):
-            def __init__(self, name, source):
-                super(ParserThread, self).__init__()
+        files = []
+        manifest = None
+        previous = {}
 
-                self.__name__ = name
-                self.__parser__ = Parser(source)
-                self.__flaws__ = []
-
-            #
-            # Main entry point for the thread. This function blocks on getting
-            # elements from the queue. When it gets an element from the queue,
-            # it parses it and stores the flaws locally.
-            #
-            # noinspection PyUnusedLocal
-            def run(self):
-                logger = logging.getLogger(self.name())
-
-                while True:
-                    # Get the next item in the queue
-                    file = q.get()
-
-                    # noinspection PyBroadException
-                    try:
-                        # Parse the file, and extend our list with the flaws.
-                        flaws = self.__parser__.parse(file)
-                        logger.debug('Found %s flaw(s) in %s' % (len(flaws), file.filename))
-
-                        self.__flaws__.append((file, flaws))
-
-                    except Exception as e:
-                        import traceback
-                        traceback.print_exc()
-
-                    finally:
-                        # Notify the queue we are done with this task. This is so the client
-                        # can return from its join.
-                        q.task_done()
-
-            def name(self):
-                return self.__name__
-
-            def flaws(self):
-                return self.__flaws__
-
-        # Create N parser threads. The threads will read <CWE,files> tuples
-        # from the queue. It will the push <CWE, Flaw> only its local listing
-        # After parsing each file, we will then combine each threads list to
-        # create the final result set.
-        logging.info('Processing data set with %d threads' % self.__threads__)
-        threads = []
-
-        for i in range(self.__threads__):
-            thr = ParserThread('ParserThread-%d' % i, self.__source__)
-            thr.daemon = True
-            threads.append(thr)
-
-            thr.start()
+        if self.__manifest__:
+            manifest = ImportManifest(self.__manifest__, self.__source__, self.__parser__.__name__)
+            manifest.load()
 
         # Iterate over each of the weaknesses we are to import. For each weakness,
-        # locate all its files and add them to the queue. This will cause the threads
-        # we created above to process each file and append it to its local result set.
-
+        # locate all its files. The files are parsed by the workers below, and
+        # their flaws merged into the result set in this order.
         for weakness_name in self.__weaknesses__:
 
             # If the weakness is already in the result set, delete it
             if weakness_name in kb.weaknesses:
                 logging.info('Found weakness [%s] in result set, deleting old results' % weakness_name)
-                del kb.weaknesses[weakness_name]
+                del kb[weakness_name]
 
             # Get the weakness from the suite.
             weakness = kb.get_weakness(weakness_name)
@@ -286,17 +456,19 @@ class JulietCpp(ImportSuite):
 
             suite = weakness.get_suite(directory, 'make', 'all')
 
-            for filename in self.get_files(directory):
-                file = suite.get_file(filename)
-                q.put(file)
+            # Files that are no longer in the directory are dropped from the
+            # manifest along with the rest of its old entries.
+            if manifest:
+                previous.update(manifest.pop_directory(directory))
 
-        # We are going to wait until all items in the queue are processed.
-        q.join()
+            for filename in self.get_files(directory):
+                files.append(suite.get_file(filename))
 
-        # Gather all the flaws into a single result set.
-        total_flaws = 0
-        for thr in threads:
-            total_flaws += len(thr.flaws())
+        if manifest:
+            total_flaws = self.import_changed_testcases(files, manifest, previous)
+            manifest.save()
+        else:
+            total_flaws = self.import_all_testcases(files)
 
         logging.info("Imported total of %s flaws in path %s" % (
             total_flaws,
@@ -305,6 +477,108 @@ class JulietCpp(ImportSuite):
 
         return kb
 
+    #
+    # Parse all the provided files, and merge their flaws into the result set.
+    #
+    def import_all_testcases(self, files):
+        # Parse the files with N workers. The workers only return flaw records,
+        # and never touch the result set. Executor.map () returns the records in
+        # the order the files were submitted, so the result set is the same no
+        # matter how many workers there are.
+        filenames = [file.filename for file in files]
+        paths = [file.computeFullPath() for file in files]
+        total_flaws = 0
+
+        with self.create_executor() as executor:
+            results = executor.map(partial(parse_testcase, self.__parser__, self.__source__), filenames, paths, chunksize=16)
+
+            for (file, (records, error)) in zip(files, results):
+                if error:
+                    logging.error(error)
+
+                total_flaws += self.merge_records(file, records)
+
+        return total_flaws
+
+    #
+    # Parse only the provided files that changed since the previous import, and
+    # merge the flaws of all the files into the result set. The flaws of the
+    # unchanged files are taken from the manifest, which is updated in place.
+    #
+    def import_changed_testcases(self, files, manifest, previous):
+        stats = []
+        filenames = []
+        paths = []
+        digests = []
+
+        # A file is unchanged if its size and modification time match the
+        # manifest. Otherwise, its content hash is checked by the worker
+        # before parsing it again.
+        for file in files:
+            path = file.computeFullPath()
+            stat = os.stat(path)
+            entry = previous.get(path)
+            stats.append((path, stat))
+
+            if not ImportManifest.is_current(entry, stat):
+                filenames.append(file.filename)
+                paths.append(path)
+                digests.append(entry[2] if entry else None)
+
+        logging.info('Parsing %d changed file(s) of %d' % (len(paths), len(files)))
+        total_flaws = 0
+
+        with self.create_executor() as executor:
+            results = executor.map(partial(parse_changed_testcase, self.__parser__, self.__source__), filenames, paths, digests, chunksize=16)
+
+            for (file, (path, stat)) in zip(files, stats):
+                entry = previous.get(path)
+
+                if ImportManifest.is_current(entry, stat):
+                    (_, _, digest, records) = entry
+                else:
+                    (digest, records, error) = next(results)
+
+                    if error:
+                        logging.error(error)
+
+                    # The content did not change, only the modification time.
+                    if records is None:
+                        records = entry[3]
+
+                # Files that failed to parse are left out of the manifest, so
+                # they are parsed again by the next import.
+                if digest is not None:
+                    manifest.update(path, stat, digest, records)
+
+                total_flaws += self.merge_records(file, records)
+
+        return total_flaws
+
+    #
+    # Create the executor for parsing the test cases. Worker processes are
+    # used if requested, since pyparsing does not release the GIL. Otherwise,
+    # worker threads are used.
+    #
+    def create_executor(self):
+        if self.__processes__:
+            logging.info('Processing data set with %d processes' % self.__processes__)
+            return ProcessPoolExecutor(max_workers=self.__processes__)
+
+        logging.info('Processing data set with %d threads' % self.__threads__)
+        return ThreadPoolExecutor(max_workers=self.__threads__)
+
+    #
+    # Merge the flaw records of a file into the result set
+    #
+    def merge_records(self, file, records):
+        logging.debug('Found %s flaw(s) in %s' % (len(records), file.filename))
+
+        for (function, line, severity, description) in records:
+            file.get_function(function).get_line(line).add_flaw(severity, description, self.__source__)
+
+        return len(records)
+
     #
     # Default elements passed when ParseAction is called are st,locn,toks
     #
@@ -325,15 +599,13 @@ class JulietCpp(ImportSuite):
         results = []
 
         # Get the files from the specified directories. We only care about
-        # files that end with .c or .cpp, excluding main.
+        # files that end with .c or .cpp, excluding main. The listings come
+        # from the file index of the test suite.
 
-        for path in os.listdir(directory):
-            if os.path.isdir(os.path.join(directory, path)):
-                sub_results = self.get_files(os.path.join(directory, path))
-                for sub_path in sub_results:
-                    results.append(os.path.join(path, sub_path))
+        for path in get_index(self.__testcase_dir__).iterate_files(directory):
+            name = os.path.basename(path)
 
-            if path.endswith(".c") or path.endswith(".cpp") and not path.startswith('main'):
+            if name.endswith(".c") or name.endswith(".cpp") and not name.startswith('main'):
                 results.append(path)
 
         return results
@@ -8,12 +8,14 @@
 #
 ################################################################################
 
-from ..DataAbstractions import ResultSet, Weakness, Suite, Flaw
 from ..ImportSuite import ImportSuite
-from .. import Utilities
+from ..FileIndex import get_index
+from .JulietCpp import Scanner
 
-from pyparsing import *
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
 import os
+import re
 import logging
 
 #
@@ -23,250 +25,178 @@ def __create__():
   return JulietJavaParser()
 
 #
-# Worker function for multithreaded imports
+# Worker function for multiprocess imports. The flaws are returned as compact
+# (function, line, severity, description) records, which are cheap to send
+# back to the parent.
 #
 def run_worker (directory, filename):
-  parser = JulietJavaParser ()
-  return parser.parse (directory, filename)
+  try:
+    return JavaScanner ().parse (os.path.join (directory, filename))
+
+  except Exception:
+    logging.exception ('Failed to parse %s' % os.path.join (directory, filename))
+    return []
 
 #
-#concrete class - NistSuite
+# @class JavaScanner
 #
-class JulietJavaParser (ImportSuite):
-
-  #
-  # Constructor
-  #
-  def __init__(self):
-    super (JulietJavaParser, self).__init__ ('JulietJava')
-
-    self.targets_ = []
-    self.__current_suite__ = None
-
-  #
-  # Initialize the parser
-  #
-  def init_parser (self, parser):
-    juliet_java_parser = parser.add_parser (self.getSource (), help='Use the NIST Juliet Java Suite')
-    juliet_java_parser.set_defaults (suite=self)
+# Single pass scanner for the Juliet Java test cases. One sweep over the file
+# finds the comments, string literals, method declarations and braces. Comments
+# that define a FLAW, POTENTIAL FLAW, INCIDENTAL or FIX are classified with the
+# same rules as the Juliet C/C++ test cases, and the flaw is placed in the
+# innermost enclosing method, on the line of the next statement. Flaws outside
+# of any method have no function.
+#
+class JavaScanner:
+  # The elements of the file that matter. String and character literals are
+  # matched so comment markers inside of them are skipped. The modifiers of
+  # a method are optional, like in the original grammar, so package-private
+  # methods are found. A constructor's modifier is taken as its return type.
+  # Statements that look like a declaration (i.e., else if (x) {, or new T ()
+  # { of an anonymous class) are excluded by their keywords.
+  ELEMENTS = re.compile (r"""
+      (?P<comment>/\*.*?\*/)
+    | //[^\n]*
+    | "(?:\\.|[^"\\\n])*"
+    | '(?:\\.|[^'\\\n])*'
+    | (?<![\w$.<>\[\],?])
+      (?:(?:public|protected|private|static|final|synchronized|abstract|native)\s+)*
+      (?!(?:new|else|return|throw|case)\b)[\w$.<>\[\],?]+\s+
+      (?!(?:if|for|while|switch|catch|synchronized)\b)(?P<method>[\w$]+)\s*\([^(){};]*\)\s*(?:throws\s+[\w$.,\s]+?)?\s*\{
+    | (?P<open>\{)
+    | (?P<close>\})
+    """, re.S | re.X)
+
+  # Whitespace and comments between a flaw and the next statement
+  SKIP = re.compile (r'(?:\s+|/\*.*?\*/|//[^\n]*)*', re.S)
+
+  def __init__ (self):
+    self.__scanner__ = Scanner (None)
 
   #
-  # Initalize the suite
+  # Parse the flaws in the provided file
   #
-  def parse_args (self, args):
-    # Call the base class (Command) init
-    super (JulietJavaParser, self).parse_args (args)
+  def parse (self, path):
+    with open (path, 'r') as f:
+      text = f.read ()
 
-    # @TODO: Remove hardcoded paths
-    self.__SCATE_root__ = os.path.realpath (os.path.join (os.path.dirname (__file__), '../../'))
-    self.__NIST_root__ = os.path.realpath (os.path.join (self.__SCATE_root__, 'test-cases/NIST_Java/'))
-    self.__testcase_dir__ = os.path.realpath (os.path.join (self.__NIST_root__, 'src/testcases'))
+    records = []
+    newlines = None
 
-    #
-    # Defining Grammar which detects function having flaw in their body
-    #
-    # 'Alphanums' are both Alphabets and Numbers
-    # 'Literals' searches for only particular strings, or words or letters
-    # '+' is defined as or inside braces -> refer to function_name  and 'and' outside braces -> refer to function decl
-    #
+    # The (name, depth) of the methods that enclose the current position,
+    # where depth is the brace depth of the method's body.
+    methods = []
+    depth = 0
 
-    # Detects int,float etc and whcar_t return types
-    returntype = Word(alphas+'_')
-    accessmodifiers = Word(alphas)
-    function_name= Word(alphanums+'_')
-    method_name= Word(alphanums+'_')
-    args= Word(alphanums+'_'+'*'+'&'+'<'+'>'+'['+']'+',')
-    function_open = Literal("{")
-    function_close = Literal("}")
-    exception = Literal("throws Throwable")
-    ioexception = Literal("throws IOException")
-    comment_open=Literal("/*")
-    comment_close = Literal("*/")
-    comments=comment_open+OneOrMore(Word(alphas+'*'+':'+','+'.'))
-    self._name_space=Literal("namespace")+Word(alphanums+'_')
+    for match in self.ELEMENTS.finditer (text):
+      if match.group ('open'):
+        depth += 1
+        continue
 
-    # Searches flaw in function body and then skips to comment_close which is defined above
-    # This searches only for FLAW's not POTENTIAL FLAW
-    #self._function_body_with_flaw=Literal("/* FLAW:")+SkipTo(comment_close)+comment_close+(Optional(OneOrMore(comments+SkipTo(comment_close))))+Optional(comment_close)+Optional(Word(alphanums+';'+'('+')'+'<'+'>'+'!'))
+      if match.group ('close'):
+        depth -= 1
 
-    self._function_body_with_flaw= Literal("/* FLAW:")+SkipTo(comment_close)+comment_close+(Optional(OneOrMore(comments+SkipTo(comment_close)+comment_close)))
+        if methods and methods[-1][1] > depth:
+          methods.pop ()
 
-    # This searches only for POTENTIAL FLAW's
-    self._function_body_with_potential_flaw=Literal("/* POTENTIAL FLAW:")+SkipTo(comment_close)+comment_close+(Optional(OneOrMore(comments+SkipTo(comment_close))))+Optional(comment_close)+Optional(Word(alphanums+';'+'('+')'+'<'+'>'+'!'))
+        continue
 
-    # This searches only for INCIDENTAL FLAW's
-    self._function_body_with_incidental_flaw=Literal("/* INCIDENTAL:")+SkipTo(comment_close)+comment_close+(Optional(OneOrMore(comments+SkipTo(comment_close))))+Optional(comment_close)+Optional(Word(alphanums+';'+'('+')'+'<'+'>'+'!'))
+      if match.group ('method'):
+        depth += 1
+        methods.append ((match.group ('method'), depth))
+        continue
 
-    # This searches only for FIX's
-    self._function_body_with_fix=Literal("FIX:")+SkipTo(comment_close)+comment_close+(Optional(OneOrMore(comments+SkipTo(comment_close))))+Optional(comment_close)+Optional(Word(alphanums+';'+'('+')'+'<'+'>'+'!'))
+      if not match.group ('comment'):
+        continue
 
-    # Matches the function declaration both C and CPP in namespaces
-    self.function_decl=Optional(accessmodifiers)+Optional("static")+Optional("const")+returntype+Optional("*")+Optional(OneOrMore(function_name)+'::')+function_name.setResultsName("function")+"("+Optional(OneOrMore(args))+")"+Optional(exception)+Optional(ioexception)+Optional("const")
+      flaw = self.__scanner__.parse_flaw (text, match.start () + 2, match.end () - 2)
 
-    #function_decl = Optional(accessmodifiers)+Optional(namespace.setResultsName("name_space"))+Optional("static")+Optional("const")+returntype+Optional("*")+function_name.setResultsName("cfunction")+Optional(javafunctionname).setResultsName("javafunc")+Optional("::")+Optional(method_name).setResultsName("cppmethod")+"("+Optional(OneOrMore(args))+")"+Optional(exception)+Optional("const")
+      if not flaw:
+        continue
 
-    # Matches the outer braces of a function
-    detectflawbody = MatchFirst(nestedExpr ('{', '}'))
+      if newlines is None:
+        newlines = [x.start () for x in re.finditer ('\n', text)]
 
-    # funcloc contains position of where the function declaration ends
-    self._funloc=0
+      # The flaw is on the line of the next statement, if there is one
+      start = self.SKIP.match (text, match.end ()).end ()
 
+      if start == len (text):
+        start = match.start ()
 
-    # Combining grammar for function declaration and to detect flawbody
-    self._grammar_with_flaw = Optional(self._function_body_with_flaw.setResultsName("flaw_before_function"))+self.function_decl.setResultsName("funcdec")+Optional(originalTextFor(detectflawbody).setResultsName("body"))
+      function = methods[-1][0] if methods else ''
+      records.append ((function, bisect_left (newlines, start) + 1, flaw[0], flaw[1]))
 
-    self._grammar_with_potential_flaw = Optional(self._function_body_with_potential_flaw.setResultsName("poten_flaw_before_function"))+self.function_decl.setResultsName("funcdec")+originalTextFor(detectflawbody).setResultsName("body")
+    return records
 
-    self._grammar_with_incidental_flaw = Optional(self._function_body_with_incidental_flaw.setResultsName("inci_flaw_before_function"))+self.function_decl.setResultsName("funcdec")+originalTextFor(detectflawbody).setResultsName("body")
+#
+# @class JulietJavaParser
+#
+# Import suite for the NIST Juliet Java test cases.
+#
+class JulietJavaParser (ImportSuite):
 
-    self._grammar_with_fix = Optional(self._function_body_with_fix.setResultsName("keyword_before_fix"))+self.function_decl.setResultsName("funcdec")+originalTextFor(detectflawbody).setResultsName("body")
+  #
+  # Constructor
+  #
+  def __init__(self):
+    super (JulietJavaParser, self).__init__ ('JulietJava')
 
-    #calling printloc function to get funloc
-    detectflawbody.setParseAction(self.printloc)
+    self.__testcase_dir__ = None
 
   #
-  # Default elements passed when ParseAction is called are st,locn,toks
+  # Initialize the parser
   #
-  def printloc (self,st,locn,toks):
-    self._funloc =  locn
-    #print "printloc: %d" % (funloc)#, repr(st), repr(toks))
+  def init_parser (self, parser):
+    juliet_java_parser = parser.add_parser (self.getSource (), help='Use the NIST Juliet Java Suite')
+    juliet_java_parser.set_defaults (suite=self)
 
   #
-  # Parses the file and handles the weakness obj accordingly
-  # Contains the parse logic which uses grammar in __init__
+  # Initalize the suite
   #
-  def parse (self, directory, filename):
-    logging.info ('Importing file [%s]' % filename)
-    results = []
-
-    full_path = os.path.join (directory, filename)
-    fileptr = open (full_path, 'r')
-    filestring = fileptr.read()
-    fileptr.close ()
-
-    # Reads each file into filestring and passes in to scanString() which parses it with 'grammar'
-    # Get FLAWs
-    for token,start,end in self._grammar_with_flaw.scanString(filestring):
-          #print "Flaw before error: %s"%(token.flaw_before_function)
-          #print "funcdec: %s"%(token.funcdec)
-      if(token.flaw_before_function):
-            #print "Flaw Before Function.........................."
-            #for flawtoken,flawstart,flawend in self._function_body_with_flaw.scanString(token.body):
-        if 'function' in token.funcdec:
-          #print token.funcdec.function
-          results.append (Flaw(filename,token.funcdec.function,lineno(self._funloc,filestring),'3'))
-      elif(token.funcdec):
-        #print "Flaw in function"
-        #print token.body
-        for flawtoken,flawstart,flawend in self._function_body_with_flaw.scanString(token.body):
-          #print flawtoken,flawstart,flawend
-          if 'function' in token.funcdec:
-            #print "Insideeeeeeeeeeeeeeeeee %s"%(token.funcdec.function)
-            results.append (Flaw(filename,token.funcdec.function,str(lineno(self._funloc+flawend,filestring)),'3'))
-      elif(token.name_space_):
-        for flawtoken,flawstart,flawend in self._function_body_with_flaw.scanString(token.body):
-          if 'function' in token.funcdec:
-            results.append (Flaw(filename,token.funcdec.function,lineno(self._funloc+flawend,filestring),'3'))
-          else:
-            results.append (Flaw(filename,'',lineno(self._funloc+flawend,filestring),'3'))
-
-    # Get POTENTIAL_FLAWs
-    for token,start,end in self._grammar_with_potential_flaw.scanString(filestring):
-      if(token.poten_flaw_before_function):
-        if 'function' in token.funcdec:
-          results.append (Flaw(filename,token.funcdec.function,lineno(self._funloc,filestring),'2'))
-      elif(token.funcdec):
-        for flawtoken,flawstart,flawend in self._function_body_with_potential_flaw.scanString(token.body):
-          if 'function' in token.funcdec:
-            results.append (Flaw(filename,token.funcdec.function,str(lineno(self._funloc+flawend,filestring)),'2'))
-      elif(token.name_space_):
-        for flawtoken,flawstart,flawend in self._function_body_with_potential_flaw.scanString(token.body):
-          if 'function' in token.funcdec:
-            results.append (Flaw(filename,token.funcdec.function,lineno(self._funloc+flawend,filestring),'2'))
-          else:
-            results.append (Flaw(filename,'',lineno(self._funloc+flawend,filestring),'2'))
-
-    # Get INCIDENTAL_FLAWs
-    for token,start,end in self._grammar_with_incidental_flaw.scanString(filestring):
-      if(token.inci_flaw_before_function):
-        if 'function' in token.funcdec:
-          results.append (Flaw(filename,token.funcdec.function,lineno(self._funloc,filestring),'1'))
-      elif(token.funcdec):
-        for flawtoken,flawstart,flawend in self._function_body_with_incidental_flaw.scanString(token.body):
-          if 'function' in token.funcdec:
-            results.append (Flaw(filename,token.funcdec.function,str(lineno(self._funloc+flawend,filestring)),'1'))
-      elif(token.name_space_):
-        for flawtoken,flawstart,flawend in self._function_body_with_incidental_flaw.scanString(token.body):
-          if 'function' in token.funcdec:
-            results.append (Flaw(filename,token.funcdec.function,lineno(self._funloc+flawend,filestring),'1'))
-          else:
-            results.append (Flaw(filename,'',lineno(self._funloc+flawend,filestring),'1'))
-
-    # Get FIXes
-    for token,start,end in self._grammar_with_fix.scanString(filestring):
-      if(token.keyword_before_fix):
-        if 'function' in token.funcdec:
-          results.append (Flaw(filename,token.funcdec.function,lineno(self._funloc,filestring),'0'))
-      elif(token.funcdec):
-        for flawtoken,flawstart,flawend in self._function_body_with_fix.scanString(token.body):
-          if 'function' in token.funcdec:
-            results.append (Flaw(filename,token.funcdec.function,str(lineno(self._funloc+flawend,filestring)),'0'))
-      elif(token.name_space_):
-        for flawtoken,flawstart,flawend in self._function_body_with_fix.scanString(token.body):
-          if 'function' in token.funcdec:
-            results.append (Flaw(filename,token.funcdec.function,lineno(self._funloc+flawend,filestring),'0'))
-          else:
-            results.append (Flaw(filename,'',lineno(self._funloc+flawend,filestring),'0'))
+  def parse_args (self, args):
+    # Call the base class (Command) init
+    super (JulietJavaParser, self).parse_args (args)
 
-    return results
+    self.__testcase_dir__ = os.path.realpath (self.__basepath__)
 
   def HandleJavaResultSet (self, result_set):
     logging.debug ('Java testcase root is [%s]' % self.__testcase_dir__)
+    files = []
 
     for weakness_name in self.__weaknesses__:
       # If the weakness is already in the result set, delete it
-      if (result_set.ContainsWeakness (weakness_name)):
+      if weakness_name in result_set.weaknesses:
         logging.info ('Found weakness [%s] in result set, deleting old results' % weakness_name)
-        result_set.removeweakness (weakness_name)
+        del result_set[weakness_name]
 
-      # Create the weakness and suite
-      weakness = Weakness (weakness_name)
-      flaw_count = 0
+      weakness = result_set.get_weakness (weakness_name)
 
       # NIST Java can have subdirectories for weaknesses, create a suite for each of them
       for directory in self.get_suite_directories (weakness_name):
         logging.debug ('Found suite directory [%s]' % directory)
-        self.__current_suite__ = Suite (os.path.relpath (directory, self.__SCATE_root__), 'ant', 'compile')
-
-        # Multiprocessing pools cannot be reopened after closing,
-        # so a pool must be created for each suite
-        multithreaded = False
-        if self.__threads__ > 1:
-          from multiprocessing import Pool
-          logging.debug ('Multithreading enabled, allocting pool with [%s] workers' % self.__threads__)
-          pool = Pool (self.__threads__)
-          multithreaded = True
+        suite = weakness.get_suite (directory, 'ant', 'compile')
 
         for filename in self.get_files (directory):
-          # Dispatch parsing the file
-          if multithreaded:
-            # @TODO: Pretty lazy implementation of breaking up the work, could be optimized
-            pool.apply_async (run_worker, args=(directory, filename), callback=self.handle_flaws)
-          else:
-            self.handle_flaws (self.parse (directory, filename))
-
-        if multithreaded:
-          # Close the pool and execute the work
-          pool.close ()
-          pool.join ()
-
-        # Attach the suite to the weakness
-        flaw_count += self.__current_suite__.GetCount ()
-        weakness.add (self.__current_suite__)
-
-      # All suites are attached, now attach the weakness to the result set
-      logging.debug ('Imported [%d] flaws into weakness [%s]' % (flaw_count, weakness_name))
-      result_set.add (weakness)
+          files.append ((suite.get_file (filename), directory, filename))
+
+    # Parse the files of all the suites with a single pool of workers. The
+    # records come back in the order the files were submitted, so they are
+    # merged into the result set the same way for any number of workers.
+    directories = [x[1] for x in files]
+    filenames = [x[2] for x in files]
+    flaw_count = 0
+
+    if self.__threads__ > 1:
+      logging.debug ('Multithreading enabled, allocating pool with [%s] workers' % self.__threads__)
+
+      with ProcessPoolExecutor (max_workers=self.__threads__) as executor:
+        for ((file, _, _), records) in zip (files, executor.map (run_worker, directories, filenames, chunksize=16)):
+          flaw_count += self.handle_flaws (file, records)
+    else:
+      for ((file, _, _), records) in zip (files, map (run_worker, directories, filenames)):
+        flaw_count += self.handle_flaws (file, records)
+
+    logging.info ('Imported [%d] flaws from [%s]' % (flaw_count, self.__testcase_dir__))
 
   #
   # Identify suite directories for the provided weakness
@@ -275,36 +205,41 @@ class JulietJavaParser (ImportSuite):
     # Directory structures:
     # CWE[#]_[NAME]/
     # CWE[#]_[NAME]/s[#]
-    for weakness in os.listdir (self.__testcase_dir__):
-      if weakness.startswith (weakness_name):
-        files = os.listdir (os.path.join (self.__testcase_dir__, weakness))
+    index = get_index (self.__testcase_dir__)
+
+    for weakness in sorted (index.subdirectories (self.__testcase_dir__)):
+      if weakness == weakness_name or weakness.startswith (weakness_name + '_'):
+        path = os.path.join (self.__testcase_dir__, weakness)
 
         # single directory, CWE[#]_[NAME]/
-        if 'build.xml' in files:
-          return [os.path.join (self.__testcase_dir__, weakness)]
+        if 'build.xml' in index.files (path):
+          return [path]
 
         # multiple directories, CWE[#]_[NAME]/s[#]
-        return [os.path.join (self.__testcase_dir__, weakness, subdir) for subdir in files]
+        return [os.path.join (path, subdir) for subdir in sorted (index.subdirectories (path))]
 
     logging.error ('Error: Suite directories not found for [%s]' % weakness_name)
+    return []
 
   #
   # Get the files to parse in the provided directory
   #
   def get_files (self, directory):
     results = []
-    for filename in os.listdir (directory):
+    for filename in sorted (get_index (self.__testcase_dir__).files (directory)):
       if filename.endswith ('.java') and 'Main' not in filename:
         results.append (filename)
 
     return results
 
   #
-  # Append the provided list of flaws to the current suite
+  # Add the provided flaw records of a file to the result set
   #
-  def handle_flaws (self, flaws):
-    for flaw in flaws:
-      self.__current_suite__.add (flaw)
+  def handle_flaws (self, file, records):
+    for (function, line, severity, description) in records:
+      file.get_function (function).get_line (line).add_flaw (severity, description, self.__source__)
+
+    return len (records)
 
   #
   # Main entry point for import commands.  This should result in
@@ -324,6 +259,8 @@ class JulietJavaParser (ImportSuite):
   def get_all_weaknesses(self):
     # Directory structure: CWE[#]_[NAME].  Directory also has extra 'common'
     results = []
-    for directory in os.listdir (self.__testcase_dir__):
-      if directory.startswith ('CWE'):
+    for directory in sorted (get_index (self.__testcase_dir__).subdirectories (self.__testcase_dir__)):
+      if directory.startswith ('CWE') and directory.split ('_')[0] not in results:
         results.append (directory.split ('_')[0])
+
+    return results
@@ -3,10 +3,15 @@
 from ..ImportSuite import ImportSuite
 from ..DataAbstractions import *
 
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
 import os
 import logging
+import re
 
-from lxml import objectify
+from lxml import etree
+from xml.parsers import expat
 
 #
 # Factory method that creates the CppCheck tool
@@ -14,10 +19,246 @@ from lxml import objectify
 def __create__ ():
   return SARD ()
 
+#
+# Stream the <testcase> elements of a manifest. Each element is cleared, and
+# removed from its parent, once the caller is done with it. This keeps the
+# memory flat no matter how large the manifest is.
+#
+def iterate_testcases (source):
+  for (_, testcase) in etree.iterparse (source, events=('end',), tag='testcase'):
+    yield testcase
+
+    testcase.clear ()
+
+    while testcase.getprevious () is not None:
+      del testcase.getparent ()[0]
+
+#
+# Extract the flaws of a <testcase> element as compact (cwe, path, line,
+# description) records.
+#
+def testcase_records (testcase):
+  records = []
+
+  for file_element in testcase.iter ('file'):
+    path = file_element.get ('path')
+
+    for flaw_element in file_element.iter ('flaw'):
+      name_element = flaw_element.get ('name')
+      line_element = flaw_element.get ('line')
+
+      # Extract the CWE from the name of the flaw.
+      name_and_description = name_element.split (':')
+      name_tokens = name_and_description[0].split ('-')
+      cwe = ''.join (name_tokens)
+
+      description = name_and_description[1].strip ()
+
+      records.append ((cwe, path, int (line_element), description))
+
+  return records
+
+# The start of a <testcase> element, and the number of bytes it spans
+TESTCASE_TAG = re.compile (br'<testcase[\s/>]')
+TESTCASE_TAG_SIZE = 10
+
+# The markers that start and end the CDATA sections and comments
+TEXT_OPENERS = (b'<![CDATA[', b'<!--')
+TEXT_MARKERS = TEXT_OPENERS + (b']]>', b'-->')
+TEXT_MARKER_SIZE = 9
+
+#
+# Raised by the expat handlers of read_manifest_layout to stop parsing
+#
+class PrologRead (Exception):
+  pass
+
+#
+# Get the layout of a manifest, for parsing it in ranges. The layout is a
+# (header, footer, start, end) tuple, where header is everything up to and
+# including the start tag of the root element (i.e., the XML declaration,
+# with its encoding, and the DTD), footer is the end tag of the root, and
+# [start, end) is the byte range of the content of the root. Only the
+# prolog and the last block of the manifest are read.
+#
+# The ranges are cut by searching the bytes of the manifest, so None is
+# returned unless its encoding is a superset of ASCII.
+#
+def read_manifest_layout (filename):
+  # Only the byte offsets matter here, so the manifest is read as Latin-1,
+  # which any byte sequence is valid in.
+  parser = expat.ParserCreate (encoding='ISO-8859-1')
+  offsets = []
+
+  # The root starts at the first start tag, and its content at the next
+  # event of any kind.
+  def mark ():
+    offsets.append (parser.CurrentByteIndex)
+
+    if len (offsets) == 2:
+      raise PrologRead ()
+
+  def start_element (name, attrs):
+    mark ()
+
+  def event (*args):
+    if offsets:
+      mark ()
+
+  parser.StartElementHandler = start_element
+  parser.EndElementHandler = event
+  parser.CharacterDataHandler = event
+  parser.CommentHandler = event
+  parser.ProcessingInstructionHandler = event
+
+  with open (filename, 'rb') as f:
+    if f.read (2) in (b'\xff\xfe', b'\xfe\xff'):
+      return None
+
+    f.seek (0)
+
+    try:
+      for block in iter (lambda: f.read (1 << 16), b''):
+        parser.Parse (block, False)
+
+      parser.Parse (b'', True)
+
+    except PrologRead:
+      pass
+
+    except expat.ExpatError as e:
+      logging.warning ('Unable to read the prolog of [%s]: %s' % (filename, e))
+      return None
+
+    if len (offsets) < 2:
+      return None
+
+    (root, start) = offsets
+    f.seek (0)
+    header = f.read (start)
+    name = re.match (br'<([^\s/>]+)', header[root:]).group (1)
+
+    # The end tag of the root is the last one of the document
+    size = f.seek (0, os.SEEK_END)
+    f.seek (max (start, size - (1 << 16)))
+    tail = f.read ()
+    end = tail.rfind (b'</' + name)
+
+    if end == -1:
+      return None
+
+  return (header, b'</' + name + b'>', start, size - len (tail) + end)
+
+#
+# Search the bytes of the manifest for the first <testcase> start tag at or
+# after \a offset, and before \a limit. Returns \a limit if there is none.
+#
+def search_testcase (f, offset, limit):
+  f.seek (offset)
+  data = b''
+
+  while offset + len (data) < limit:
+    block = f.read (min (1 << 16, limit - offset - len (data)))
+
+    if not block:
+      break
+
+    data += block
+    match = TESTCASE_TAG.search (data)
+
+    if match:
+      return offset + match.start ()
+
+    # Keep the end of the data, since a tag may start there
+    keep = min (len (data), TESTCASE_TAG_SIZE - 1)
+    offset += len (data) - keep
+    data = data[len (data) - keep:]
+
+  return limit
+
+#
+# Test if the text at \a position is markup, and not the text of a CDATA
+# section or comment. A '<' can only appear unescaped in markup, CDATA
+# sections, comments and processing instructions, so the nearest of the
+# markers that start or end a CDATA section or comment tells which one it
+# is. The search goes back to \a start at most.
+#
+def is_markup (f, position, start):
+  end = position
+
+  while end > start:
+    begin = max (start, end - (1 << 16))
+    f.seek (begin)
+
+    # The blocks overlap, since a marker may span two of them
+    data = f.read (min (end + TEXT_MARKER_SIZE, position) - begin)
+    (index, marker) = max ((data.rfind (x), x) for x in TEXT_MARKERS)
+
+    if index != -1:
+      return marker not in TEXT_OPENERS
+
+    end = begin
+
+  return True
+
+#
+# Find the first <testcase> element at or after \a offset, and before
+# \a limit, where the content of the manifest starts at \a start. Returns
+# \a limit if there is none.
+#
+def find_testcase (f, offset, start, limit):
+  while True:
+    position = search_testcase (f, offset, limit)
+
+    if position == limit or is_markup (f, position, start):
+      return position
+
+    offset = position + 1
+
+#
+# Worker function for parallel imports. Parses the <testcase> elements that
+# start in the byte range [start, end) of the content of the manifest, and
+# returns their flaw records. The ranges are cut at arbitrary offsets, so
+# each worker moves both ends of its range to the next <testcase> start tag.
+# The neighbouring workers find the same tag, so every testcase is parsed
+# exactly once. The range is parsed along with the header and footer of
+# the manifest, so it keeps the encoding and the DTD of the manifest.
+#
+def read_manifest_range (filename, layout, start, end):
+  (header, footer, content_start, content_end) = layout
+
+  with open (filename, 'rb') as f:
+    if start != content_start:
+      start = find_testcase (f, start, content_start, content_end)
+
+    if end != content_end:
+      end = find_testcase (f, end, content_start, content_end)
+
+    if start >= end:
+      return []
+
+    f.seek (start)
+    data = f.read (end - start)
+
+  records = []
+
+  try:
+    for testcase in iterate_testcases (BytesIO (header + data + footer)):
+      records.extend (testcase_records (testcase))
+
+  except etree.XMLSyntaxError as e:
+    # The lxml errors cannot be sent back to the parent process.
+    raise ValueError ('%s [%d:%d]: %s' % (filename, start, end, e))
+
+  return records
+
 #
 # @class SARD
 #
 class SARD (ImportSuite):
+  # Size of the manifest ranges handed to each worker
+  CHUNK_SIZE = 16 << 20
+
   #
   # Initializing constructor.
   #
@@ -51,40 +292,52 @@ class SARD (ImportSuite):
       logging.error ('directory does not contain manifest')
     elif length == 1:
       filename = os.path.join (self.__basepath__, manifest[0])
-      root = objectify.parse (filename).getroot ();
+      functions = {}
 
-      for testcase in root.iter ('testcase'):
-        id = testcase.get ('id')
+      layout = read_manifest_layout (filename) if self.__threads__ > 1 else None
 
-        for file_element in testcase.iter ('file'):
-          path = file_element.get ('path')
+      if layout:
+        # Cut the content of the manifest into ranges, and parse them with a
+        # pool of workers. The workers align the ranges on <testcase>
+        # elements. The records come back in the order of the ranges, so the
+        # result set does not depend on the number of workers.
+        (_, _, start, end) = layout
+        offsets = list (range (start, end, SARD.CHUNK_SIZE)) + [end]
+        ranges = list (zip (offsets[:-1], offsets[1:]))
+        logging.info ('Processing manifest in %d ranges with %d processes' % (len (ranges), self.__threads__))
 
-          for flaw_element in file_element.iter ('flaw'):
-            name_element = flaw_element.get ('name')
-            line_element = flaw_element.get ('line')
+        with ProcessPoolExecutor (max_workers=self.__threads__) as executor:
+          for records in executor.map (read_manifest_range, [filename] * len (ranges), [layout] * len (ranges), *zip (*ranges)):
+            self.merge_records (result_set, testcases, functions, records)
+      else:
+        for testcase in iterate_testcases (filename):
+          self.merge_records (result_set, testcases, functions, testcase_records (testcase))
 
-            # Extract the CWE from the name of the flaw.
-            name_and_description = name_element.split (':')
-            name_tokens = name_and_description[0].split ('-')
-            cwe = ''.join (name_tokens)
+    else:
+      logging.error ('Multiple manifest is not supported')
 
-            description = name_and_description[1].strip ()
+    return result_set
 
-            # Add the flaw to the result set.
-            weakness = result_set.get_weakness (cwe)
-            suite_id = os.path.join (self.__basepath__, 'testcases', os.path.dirname (path))
-            filename = os.path.basename (path)
+  #
+  # Add the provided flaw records to the result set. The function of each
+  # (cwe, path) is cached in \a functions, since the files of a testcase
+  # usually have more than one flaw.
+  #
+  def merge_records (self, result_set, testcases, functions, records):
+    for (cwe, path, line, description) in records:
+      function = functions.get ((cwe, path))
 
-            suite = weakness.get_suite (suite_id, 'make', 'all')
-            file = suite.get_file (filename)
-            function = file.get_function ('Unknown')
-            line = function.get_line (int (line_element))
-            line.add_flaw (FlawType.Flaw, description, 'SARD')
+      if function is None:
+        weakness = result_set.get_weakness (cwe)
+        suite_id = os.path.join (testcases, os.path.dirname (path))
+        filename = os.path.basename (path)
 
-    else:
-      logging.error ('Multiple manifest is not supported')
+        suite = weakness.get_suite (suite_id, 'make', 'all')
+        file = suite.get_file (filename)
+        function = file.get_function ('Unknown')
+        functions[(cwe, path)] = function
 
-    return result_set
+      function.get_line (line).add_flaw (FlawType.Flaw, description, 'SARD')
 
   #
   # Default elements passed when ParseAction is called are st,locn,toks
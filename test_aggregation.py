@@ -2,14 +2,17 @@ from lib.DataAbstractions import *
 from lib.DataManagers.XMLManager import *
 from lib.DataPointFactories.NIST_Cpp_DPFactory import *
 
+def is_build (filename):
+  return 'build' in filename
+
 def import_rs2 (filename, single_rs, merged_rs):
   m = XMLManager (filename)
-  m.add_results (single_rs)
-  m.add_results (merged_rs)
+  m.add_results (single_rs, is_build (filename))
+  m.add_results (merged_rs, is_build (filename))
 
 def import_rs1 (filename, rs):
   m = XMLManager (filename)
-  m.add_results (rs)
+  m.add_results (rs, is_build (filename))
 
 merged_rs = ResultSet ()
 
@@ -68,17 +71,44 @@ def print_dps (rs, granularity, minimum):
   print ('total: %s\n' % total)
 
 def validate_dps_min (rs, label):
-  for granularity in [Granularity.FILENAME, Granularity.FUNCTION, Granularity.LINE]:
+  for granularity in [Granularity.Filename, Granularity.Function, Granularity.Line]:
     print ('%s DPs (%s) (min)' % (label, granularity))
     print_dps (rs, granularity, True)
 
 def validate_dps_max (rs, label):
-  for granularity in [Granularity.FILENAME, Granularity.FUNCTION, Granularity.LINE]:
+  for granularity in [Granularity.Filename, Granularity.Function, Granularity.Line]:
     print ('%s DPs (%s) (max)' % (label, granularity))
     print_dps (rs, granularity, False)
 
 #validate_dps_min (tool1_rs, 'Tool1')
 #validate_dps_min (tool2_rs, 'Tool2')
 #validate_dps_min (tool3_rs, 'Tool3')
-validate_dps_min (merged_rs, 'Merged')
-validate_dps_max (merged_rs, 'Merged')
+
+#
+# Get the number of datapoints, and their total tp, fp and fn
+#
+def dps_totals (rs, granularity, minimum):
+  dps = list (NIST_Cpp_DPFactory (rs).generate (granularity, True, minimum))
+  return (len (dps), sum (x.tp for x in dps), sum (x.fp for x in dps), sum (x.fn for x in dps))
+
+def dps_of_file (rs, granularity, filename):
+  return [(dp.function, dp.line, dp.tp, dp.fp, dp.fn) for dp in NIST_Cpp_DPFactory (rs).generate (granularity, True, True) if dp.filename == filename]
+
+def test_merged_dps ():
+  assert dps_totals (merged_rs, Granularity.Filename, True) == (6, 7, 5, 0)
+  assert dps_totals (merged_rs, Granularity.Filename, False) == (6, 7, 6, 0)
+  assert dps_totals (merged_rs, Granularity.Function, True) == (8, 4, 8, 0)
+  assert dps_totals (merged_rs, Granularity.Function, False) == (8, 4, 9, 0)
+  assert dps_totals (merged_rs, Granularity.Line, True) == (14, 2, 11, 2)
+  assert dps_totals (merged_rs, Granularity.Line, False) == (14, 2, 11, 2)
+
+  # The lines of a file roll up to its functions, and the functions to the file
+  filename = 'CWE134_Uncontrolled_Format_String__char_environment_vprintf_73b.cpp'
+
+  assert dps_of_file (merged_rs, Granularity.Line, filename) == [('bad_vasink', 38, 1, 0, 0),
+                                                                 ('bad_vasink', 80, 0, 1, 0),
+                                                                 ('bad_vasink', 88, 0, 1, 0),
+                                                                 ('goodG2B_vasink', 61, 0, 1, 0)]
+  assert dps_of_file (merged_rs, Granularity.Function, filename) == [('bad_vasink', 0, 1, 2, 0),
+                                                                     ('goodG2B_vasink', 0, 0, 1, 0)]
+  assert dps_of_file (merged_rs, Granularity.Filename, filename) == [('', 0, 2, 2, 0)]
@@ -0,0 +1,98 @@
+import argparse
+import threading
+import time
+
+import pytest
+
+from lib.Commands.BuildCommand import BuildCommand
+from lib.DataAbstractions import *
+from lib.DataManagers.XMLManager import XMLManager
+from lib.Tool import Tool
+
+#
+# @class StubTool
+#
+# Tool that takes longer to compile the first suite of each weakness, so the
+# suites finish out of order, and reports one finding per suite. Compiling the
+# suite in \a failure raises an error.
+#
+class StubTool (Tool):
+  def __init__ (self, failure = None):
+    super (StubTool, self).__init__ ('stub', {'CWE134': ['FORMAT'], 'CWE476': ['NULL']})
+
+    self.failure = failure
+    self.lock = threading.Lock ()
+    self.compiled = []
+    self.threads = set ()
+
+  def handle_compile (self, suite):
+    if suite.directory == self.failure:
+      raise RuntimeError ('failed to compile %s' % suite.directory)
+
+    time.sleep (0.02 if suite.directory.endswith ('0') else 0.001)
+
+    with self.lock:
+      self.compiled.append (suite.directory)
+      self.threads.add (threading.current_thread ().name)
+
+  def handle_docgen (self, suite):
+    checker = 'FORMAT' if suite.get_Weakness ().name == 'CWE134' else 'NULL'
+    self.add_finding (suite, 'bad', checker, 'found in %s' % suite.directory, [('main.c', len (suite.directory))])
+
+#
+# Write the ground truth of the build: two weaknesses of several suites
+#
+def write_truth (filename):
+  rs = ResultSet ()
+
+  for weakness in ('CWE134', 'CWE476', 'CWE999'):
+    for i in range (6):
+      suite = rs.get_weakness (weakness).get_suite ('/suites/%s/s%d' % (weakness, i), 'make', 'all')
+      suite.get_file ('main.c').get_function ('bad').get_line (10).add_flaw (FlawType.Flaw, 'flaw', 'kb')
+
+  XMLManager (filename).write (rs)
+
+def build (tmp_path, tool, jobs):
+  command = BuildCommand ()
+  outfile = str (tmp_path / ('build_%d.xml' % jobs))
+  command.parse_args (argparse.Namespace (threads = 1, weaknesses = None, importfile = str (tmp_path / 'kb.xml'), outfile = outfile,
+                                          ignore_compile = False, ignore_docgen = False, clean = True, jobs = jobs, tool = tool,
+                                          all_locations = False))
+  command.execute ()
+
+  return outfile
+
+#
+# Get the suites and bugs of a build file in the order they were written
+#
+def read_build (filename):
+  rs = ResultSet ()
+  XMLManager (filename).add_results (rs, True)
+
+  return [(line.get_Weakness ().name, line.get_Suite ().directory, line.get_File ().filename, line.line, bug.type, bug.message)
+          for line in rs.iterate_Lines () for bug in line.iterate_Bugs ()]
+
+def test_build_jobs_match_serial (tmp_path):
+  write_truth (str (tmp_path / 'kb.xml'))
+  expected = read_build (build (tmp_path, StubTool (), 1))
+
+  assert [x[1] for x in expected] == ['/suites/%s/s%d' % (w, i) for w in ('CWE134', 'CWE476') for i in range (6)]
+
+  tool = StubTool ()
+  assert read_build (build (tmp_path, tool, 4)) == expected
+
+  # The suites were compiled out of order, by several threads
+  assert sorted (tool.compiled) == sorted (x[1] for x in expected)
+  assert tool.compiled != [x[1] for x in expected]
+  assert len (tool.threads) > 1
+
+@pytest.mark.parametrize ('jobs', [1, 4])
+def test_build_jobs_raise_errors (tmp_path, jobs):
+  write_truth (str (tmp_path / 'kb.xml'))
+  tool = StubTool ('/suites/CWE476/s2')
+
+  with pytest.raises (RuntimeError, match = 'failed to compile /suites/CWE476/s2'):
+    build (tmp_path, tool, jobs)
+
+  # No results are written for a failed build
+  assert not (tmp_path / ('build_%d.xml' % jobs)).exists ()
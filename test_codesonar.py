@@ -0,0 +1,139 @@
+import argparse
+import http.server
+import os
+import threading
+import time
+import urllib.error
+
+import pytest
+
+from lib.DataAbstractions import *
+from lib.Tools.Codesonar import Codesonar
+
+#
+# @class AnalysisService
+#
+# Stand-in for a CodeSonar hub. It serves the index of the projects, and the
+# warnings of each project. The analyses take longer for the first projects,
+# so the downloads finish out of order. The analyses listed in \a failures
+# are answered with a 500.
+#
+class AnalysisService (http.server.BaseHTTPRequestHandler):
+  protocol_version = 'HTTP/1.1'
+
+  def log_message (self, *args):
+    pass
+
+  def setup (self):
+    super (AnalysisService, self).setup ()
+
+    with self.server.lock:
+      self.server.connections += 1
+
+  def do_GET (self):
+    server = self.server
+
+    with server.lock:
+      server.requests.append (self.path)
+
+    if self.path == '/index.csv':
+      rows = ['name,state,date,build,url']
+      rows += ['%s,Finished,date,1,/analysis/%d.csv?filter=2' % (name, i) for (i, name) in enumerate (server.projects)]
+    else:
+      i = int (self.path.split ('/')[-1].split ('.')[0])
+
+      if i in server.failures:
+        return self.send (500, 'Internal Server Error')
+
+      time.sleep (0.01 * (len (server.projects) - i))
+      rows = ['score,id,class,rank,file,line number,procedure,priority,state,finding,owner,url']
+
+      for j in range (20):
+        filename = 'f%d.c' % (j % 3) if j % 7 else 'missing.c'
+        rows.append ('70,%d.%d,"Class, %d",Security,%s,%d,ns::f%d,None,None,None,,/w/%d.txt' % (i, j, j % 5, filename, 10 + j, j % 4, j))
+
+    self.send (200, '\r\n'.join (rows) + '\r\n')
+
+  def send (self, status, body):
+    body = body.encode ()
+    self.send_response (status)
+    self.send_header ('Content-Length', str (len (body)))
+    self.end_headers ()
+    self.wfile.write (body)
+
+@pytest.fixture
+def server ():
+  server = http.server.ThreadingHTTPServer (('127.0.0.1', 0), AnalysisService)
+  server.daemon_threads = True
+  server.lock = threading.Lock ()
+  server.requests = []
+  server.connections = 0
+  server.projects = []
+  server.failures = set ()
+
+  thread = threading.Thread (target = server.serve_forever, daemon = True)
+  thread.start ()
+
+  yield server
+
+  server.shutdown ()
+  server.server_close ()
+
+#
+# Create the directories of the projects built under a suite, along with the
+# files of their warnings
+#
+def make_suite (tmp_path, server, count):
+  directory = str (tmp_path / 'suite')
+  tool = Codesonar ()
+
+  for i in range (count):
+    project_dir = tmp_path / 'suite' / ('p%d' % i)
+    project_dir.mkdir (parents = True)
+
+    for k in range (3):
+      (project_dir / ('f%d.c' % k)).write_text ('')
+
+    name = tool.get_project_name (str (project_dir))
+    server.projects.append (name)
+
+  return directory
+
+def docgen (server, directory, connections):
+  tool = Codesonar ()
+  tool.parse_args (argparse.Namespace (server = '127.0.0.1:%d' % server.server_address[1], connections = connections,
+                                       threads = 1, weaknesses = None, all_locations = False))
+
+  for (i, name) in enumerate (server.projects):
+    tool.projects[name] = os.path.join (directory, 'p%d' % i)
+
+  suite = ResultSet ('build', 'codesonar').get_weakness ('CWE134').get_suite (directory, 'make', '')
+  tool.handle_docgen (suite)
+
+  return [(bug.get_File ().filename, bug.get_Function ().function, bug.line.line, bug.type) for bug in suite.iterate_Bugs ()]
+
+def test_docgen_connections_match_serial (tmp_path, server):
+  directory = make_suite (tmp_path, server, 8)
+  expected = docgen (server, directory, 1)
+
+  assert len (expected) == 8 * 17
+  assert server.connections == 1
+
+  server.connections = 0
+  server.requests = []
+  assert docgen (server, directory, 4) == expected
+
+  # The analyses are downloaded once each, over at most 4 connections
+  assert sorted (server.requests) == sorted (['/index.csv'] + ['/analysis/%d.csv' % i for i in range (8)])
+  assert 1 < server.connections <= 4
+
+@pytest.mark.parametrize ('connections', [1, 4])
+def test_docgen_raises_errors (tmp_path, server, connections):
+  directory = make_suite (tmp_path, server, 8)
+  server.failures = {5}
+
+  with pytest.raises (urllib.error.HTTPError) as error:
+    docgen (server, directory, connections)
+
+  assert error.value.code == 500
+  assert error.value.url.endswith ('/analysis/5.csv')
@@ -0,0 +1,221 @@
+import argparse
+import http.server
+import os
+import re
+import threading
+
+import pytest
+import suds
+
+from lib.DataAbstractions import *
+from lib.Tools.Coverity import Coverity
+
+NS = 'http://ws.coverity.com/v7'
+
+def read_wsdl ():
+  with open (os.path.join (os.path.dirname (os.path.abspath (__file__)), 'tests', 'coverity', 'defect.wsdl'), 'r') as f:
+    return f.read ()
+
+WSDL = read_wsdl ()
+
+#
+# Get the (checker, function, events) of a defect of the stand-in server.
+# Each event is a (filename, line, main) tuple.
+#
+def make_defect (cid):
+  function = 'f%d' % (cid % 5) if cid % 11 else ''
+  events = [('file%d.c' % ((cid + e) % 13), 10 + cid % 3 + e, cid % 4 == 0 and e == 0) for e in range (cid % 3 + 1)]
+
+  return ('CHK%d' % (cid % 7), function, events)
+
+#
+# @class DefectService
+#
+# Stand-in for the defect service of a Coverity server. It serves its WSDL,
+# answers getMergedDefectsForProject and getStreamDefects for a project of
+# \a count defects, and records every request. The requests listed in
+# \a failures are answered with a 503 the first time they are sent. Pages
+# hold at most \a max_page_size defects, whatever the size requested, and
+# the pages after the first at most \a max_later_page_size.
+#
+class DefectService (http.server.BaseHTTPRequestHandler):
+  protocol_version = 'HTTP/1.1'
+
+  def log_message (self, *args):
+    pass
+
+  def send (self, status, body):
+    body = body.encode ()
+    self.send_response (status)
+    self.send_header ('Content-Type', 'text/xml')
+    self.send_header ('Content-Length', str (len (body)))
+    self.end_headers ()
+    self.wfile.write (body)
+
+  def do_GET (self):
+    self.send (200, WSDL.replace ('LOCATION', 'http://%s%s' % (self.headers['Host'], self.path.split ('?')[0])))
+
+  def do_POST (self):
+    request = self.rfile.read (int (self.headers['Content-Length'])).decode ()
+    server = self.server
+
+    if 'getMergedDefectsForProject' in request:
+      project = re.search (r'<projectId>\s*<name>([^<]*)<', request).group (1)
+      start = int (re.search (r'startIndex>(\d+)<', request).group (1))
+      size = min (int (re.search (r'pageSize>(\d+)<', request).group (1)), server.max_page_size if start == 0 else server.max_later_page_size)
+      key = ('page', start)
+    else:
+      cids = [int (x) for x in re.findall (r'cids>(\d+)<', request)]
+      key = ('batch', cids[0])
+
+    with server.lock:
+      server.requests.append (key)
+      failed = key in server.failures
+      server.failures.discard (key)
+
+    if failed:
+      return self.send (503, 'Service Unavailable')
+
+    if key[0] == 'page' and project != 'suite':
+      return self.send (500, '<S:Envelope xmlns:S="http://schemas.xmlsoap.org/soap/envelope/"><S:Body><S:Fault><faultcode>S:Server</faultcode><faultstring>No project found for name %s</faultstring></S:Fault></S:Body></S:Envelope>' % project)
+
+    if key[0] == 'page':
+      defects = []
+
+      for cid in range (start, min (server.count, start + size)):
+        (checker, function, events) = make_defect (cid)
+        function = '<functionDisplayName>%s</functionDisplayName>' % function if function else ''
+        defects.append ('<mergedDefects><cid>%d</cid><checkerName>%s</checkerName>%s</mergedDefects>' % (cid, checker, function))
+
+      body = '<ns:getMergedDefectsForProjectResponse xmlns:ns="%s"><return><totalNumberOfRecords>%d</totalNumberOfRecords>%s</return></ns:getMergedDefectsForProjectResponse>' % (NS, server.count, ''.join (defects))
+    else:
+      # The stream defects come back in another order than the CIDs
+      defects = []
+
+      for cid in reversed (cids):
+        events = ''.join ('<events><fileId><filePathname>/suite/%s</filePathname></fileId><lineNumber>%d</lineNumber>%s</events>' % (filename, line, '<main>true</main>' if main else '')
+                          for (filename, line, main) in make_defect (cid)[2])
+        defects.append ('<return><cid>%d</cid><defectInstances>%s</defectInstances></return>' % (cid, events))
+
+      body = '<ns:getStreamDefectsResponse xmlns:ns="%s">%s</ns:getStreamDefectsResponse>' % (NS, ''.join (defects))
+
+    self.send (200, '<?xml version="1.0"?><S:Envelope xmlns:S="http://schemas.xmlsoap.org/soap/envelope/"><S:Body>%s</S:Body></S:Envelope>' % body)
+
+@pytest.fixture
+def server (monkeypatch):
+  monkeypatch.setattr (Coverity, 'RETRY_DELAY', 0)
+
+  server = http.server.ThreadingHTTPServer (('127.0.0.1', 0), DefectService)
+  server.daemon_threads = True
+  server.lock = threading.Lock ()
+  server.requests = []
+  server.failures = set ()
+  server.count = 250
+  server.max_page_size = 1000
+  server.max_later_page_size = 1000
+
+  thread = threading.Thread (target = server.serve_forever, daemon = True)
+  thread.start ()
+
+  yield server
+
+  server.shutdown ()
+  server.server_close ()
+
+def create_tool (server, page_size, batch_size, clients):
+  tool = Coverity ()
+  tool.parse_args (argparse.Namespace (server = '127.0.0.1:%d' % server.server_address[1],
+                                       username = 'user',
+                                       password = 'password',
+                                       page_size = page_size,
+                                       batch_size = batch_size,
+                                       clients = clients,
+                                       threads = 1,
+                                       weaknesses = None,
+                                       all_locations = False))
+  return tool
+
+def create_suite (directory):
+  return ResultSet ('build', 'coverity').get_weakness ('CWE134').get_suite (directory, 'make', '')
+
+#
+# Get the bugs the tool is expected to add for the defects of the server
+#
+def expected_bugs (count):
+  bugs = []
+
+  for cid in range (count):
+    (checker, function, events) = make_defect (cid)
+    locations = [(filename, line) for (filename, line, main) in events]
+    primary = next ((i for (i, event) in enumerate (events) if event[2]), len (events) - 1)
+    others = [x for x in dict.fromkeys (locations) if x != locations[primary]]
+
+    bugs.append ((locations[primary][0], function, locations[primary][1], checker, others))
+
+  return bugs
+
+def get_bugs (suite):
+  return [(bug.get_File ().filename, bug.get_Function ().function, bug.line.line, bug.type, list (bug.iterate_events ()))
+          for bug in suite.iterate_Bugs ()]
+
+def test_docgen (server):
+  tool = create_tool (server, 40, 30, 3)
+
+  # The clients of the defect service are only created once they are used
+  assert list (tool.__defect_clients__.queue) == [None] * 3
+
+  suite = create_suite ('/suite')
+  tool.handle_docgen (suite)
+
+  assert sorted (get_bugs (suite)) == sorted (expected_bugs (250))
+
+  # Every page is requested once, and the CIDs are sent in batches
+  assert sorted (x[1] for x in server.requests if x[0] == 'page') == list (range (0, 250, 40))
+  assert sorted (x[1] for x in server.requests if x[0] == 'batch') == list (range (0, 250, 30))
+  assert len ([x for x in tool.__defect_clients__.queue if x is not None]) <= 3
+
+def test_docgen_retries (server):
+  server.failures = {('page', 40), ('page', 200), ('batch', 60)}
+  tool = create_tool (server, 40, 30, 2)
+
+  suite = create_suite ('/suite')
+  tool.handle_docgen (suite)
+
+  assert sorted (get_bugs (suite)) == sorted (expected_bugs (250))
+  assert server.requests.count (('page', 40)) == 2
+  assert server.requests.count (('batch', 60)) == 2
+  assert server.requests.count (('batch', 90)) == 1
+
+def test_docgen_fault (server):
+  tool = create_tool (server, 40, 30, 2)
+
+  with pytest.raises (suds.WebFault):
+    tool.handle_docgen (create_suite ('/missing'))
+
+  # SOAP faults are not retried
+  assert server.requests == [('page', 0)]
+
+def test_docgen_capped_pages (server, caplog):
+  server.max_page_size = 25
+  tool = create_tool (server, 40, 30, 3)
+
+  suite = create_suite ('/suite')
+  tool.handle_docgen (suite)
+
+  # The pages follow the size the server returned
+  assert sorted (get_bugs (suite)) == sorted (expected_bugs (250))
+  assert sorted (x[1] for x in server.requests if x[0] == 'page') == list (range (0, 250, 25))
+  assert 'defects of project' not in caplog.text
+
+def test_docgen_uneven_pages (server, caplog):
+  server.max_later_page_size = 15
+  tool = create_tool (server, 40, 30, 3)
+
+  suite = create_suite ('/suite')
+  tool.handle_docgen (suite)
+
+  # The pages that came back short are completed
+  assert sorted (get_bugs (suite)) == sorted (expected_bugs (250))
+  completed = [start + x for start in range (40, 240, 40) for x in (0, 15, 30)]
+  assert sorted (x[1] for x in server.requests if x[0] == 'page') == [0] + completed + [240]
+  assert 'defects of project' not in caplog.text
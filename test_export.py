@@ -0,0 +1,96 @@
+import argparse
+import os
+import pytest
+import subprocess
+import sys
+
+from lib.DataAbstractions import *
+from lib.DataManagers.XMLManager import XMLManager
+from lib.DataPointFactories.NIST_Cpp_DPFactory import NIST_Cpp_DPFactory
+from lib.Exporters.DefaultExporter import parse_criteria
+
+from lxml import etree
+
+def test_parse_criteria ():
+  assert parse_criteria ('Line,Function:True,Filename:False:True') == [(Granularity.Line, None, None),
+                                                                       (Granularity.Function, True, None),
+                                                                       (Granularity.Filename, False, True)]
+
+@pytest.mark.parametrize ('value', ['Bogus', 'Unknown', 'Line:maybe', 'Line:True:False:True', ''])
+def test_parse_criteria_errors (value):
+  with pytest.raises (argparse.ArgumentTypeError):
+    parse_criteria (value)
+
+#
+# Export the test fixtures with SCATE.py, the same way users do. The
+# expected datapoints in tests/export.xml were generated by the original
+# per-criteria factory.
+#
+FIXTURES = os.path.join (os.path.dirname (os.path.abspath (__file__)), 'tests')
+IMPORTS = ','.join (os.path.join (FIXTURES, 'import%d.xml' % i) for i in range (1, 4))
+BUILDS = ','.join (os.path.join (FIXTURES, 'build%d.xml' % i) for i in range (1, 4))
+
+def export (outfile, *options):
+  cmd = [sys.executable, os.path.join (os.path.dirname (FIXTURES), 'SCATE.py')] + list (options)
+  cmd += ['export', '--importfiles=%s' % IMPORTS, '--buildfiles=%s' % BUILDS, '--outfile=%s' % outfile, 'scate']
+  subprocess.check_call (cmd, env = dict (os.environ, SCATE_CACHE_DIR = ''), stderr = subprocess.DEVNULL)
+
+  with open (outfile, 'rb') as f:
+    return f.read ()
+
+def expected_export ():
+  with open (os.path.join (FIXTURES, 'export.xml'), 'rb') as f:
+    return f.read ()
+
+def test_export_fixtures (tmp_path):
+  assert export (str (tmp_path / 'out.xml')) == expected_export ()
+
+def test_export_fixtures_parallel (tmp_path):
+  assert export (str (tmp_path / 'out.xml'), '--threads=2') == expected_export ()
+
+def load_fixtures ():
+  rs = ResultSet ()
+
+  for i in range (1, 4):
+    XMLManager (os.path.join (FIXTURES, 'build%d.xml' % i)).add_results (rs, True)
+
+  for i in range (1, 4):
+    XMLManager (os.path.join (FIXTURES, 'import%d.xml' % i)).add_results (rs, False)
+
+  return rs
+
+def datapoint_values (datapoints):
+  return [(x.tp, x.fp, x.fn, x.weakness, x.directory, x.filename, x.function or '', x.line, x.permutation) for x in datapoints]
+
+#
+# Get the datapoints of each criteria in tests/export.xml, which holds the
+# output of the original per-criteria factory
+#
+def expected_datapoints ():
+  result = {}
+
+  for criteria in etree.parse (os.path.join (FIXTURES, 'export.xml')).getroot ().iter ('criteria'):
+    key = (Granularity[criteria.get ('granularity')], criteria.get ('wrong_checker_is_fp') == 'True', criteria.get ('minimum') == 'True')
+    result[key] = [(int (x.get ('tp')), int (x.get ('fp')), int (x.get ('fn')), x.get ('weakness'), x.get ('directory'),
+                    x.get ('filename'), x.get ('function'), int (x.get ('line')), x.get ('permutation'))
+                   for x in criteria.iter ('datapoint')]
+
+  return result
+
+#
+# Both the single pass over every criteria, and the pass for a single
+# criteria, give the datapoints of the original factory
+#
+def test_generate_matches_expected ():
+  rs = load_fixtures ()
+  expected = expected_datapoints ()
+  single_pass = {}
+
+  assert len (expected) == 12
+
+  for (key, datapoint) in NIST_Cpp_DPFactory (rs).generate_all (list (expected)):
+    single_pass.setdefault (key, []).append (datapoint)
+
+  for (key, datapoints) in expected.items ():
+    assert datapoint_values (single_pass.get (key, [])) == datapoints
+    assert datapoint_values (NIST_Cpp_DPFactory (rs).generate (*key)) == datapoints
@@ -0,0 +1,92 @@
+import os
+import time
+
+from lib import FileIndex
+
+#
+# Create the provided files, relative to the directory
+#
+def touch (directory, *names):
+  for name in names:
+    path = os.path.join (directory, name)
+    os.makedirs (os.path.dirname (path), exist_ok = True)
+    open (path, 'w').close ()
+
+#
+# Make the directories under the root look like they were last changed long
+# before the index was built, so they are not rescanned for being racy
+#
+def age (root):
+  for (directory, subdirectories, files) in os.walk (root):
+    os.utime (directory, ns = (10 ** 9, 10 ** 9))
+
+def test_index_sees_rebuilt_suite (tmp_path, monkeypatch):
+  monkeypatch.delenv ('SCATE_INDEX_DIR', raising = False)
+  root = str (tmp_path / 'suite')
+  touch (root, 'a/main.c', 'a/b/util.c')
+  age (root)
+
+  index = FileIndex.get_index (root)
+  assert sorted (index.iterate_files (root)) == ['a/b/util.c', 'a/main.c']
+  assert index.filename is None
+
+  # A build in the same process adds files below the root, and a new
+  # directory at the root.
+  touch (root, 'a/b/util.o', 'prj_files/main.prj')
+  index = FileIndex.get_index (root)
+
+  assert sorted (index.iterate_files (root)) == ['a/b/util.c', 'a/b/util.o', 'a/main.c', 'prj_files/main.prj']
+  assert index.files (os.path.join (root, 'a', 'b')) == ['util.c', 'util.o']
+  assert index.contains (os.path.join (root, 'a', 'b', 'util.o'))
+  assert index.find ('main.prj') == ['prj_files/main.prj']
+
+  # Files removed from a subdirectory are gone as well
+  os.remove (os.path.join (root, 'a', 'b', 'util.o'))
+  assert index.files (os.path.join (root, 'a', 'b')) == ['util.c']
+  assert not index.contains (os.path.join (root, 'a', 'b', 'util.o'))
+
+def test_index_saved_on_request (tmp_path, monkeypatch):
+  root = str (tmp_path / 'suite')
+  touch (root, 'a/main.c')
+
+  monkeypatch.delenv ('SCATE_INDEX_DIR', raising = False)
+  assert FileIndex.get_index_filename (root) is None
+
+  monkeypatch.setenv ('SCATE_INDEX_DIR', str (tmp_path / 'cache'))
+  filename = FileIndex.get_index_filename (root)
+  FileIndex.FileIndex (root, filename).refresh ()
+
+  assert os.path.isfile (filename)
+  assert os.listdir (str (tmp_path / 'cache')) == [os.path.basename (filename)]
+
+  # The saved index is loaded again as it was
+  index = FileIndex.FileIndex (root, filename)
+
+  assert index.load ()
+  assert sorted (index.directories) == ['', 'a']
+  assert index.files (os.path.join (root, 'a')) == ['main.c']
+
+def test_index_lists_changed_directory_once (tmp_path, monkeypatch):
+  monkeypatch.delenv ('SCATE_INDEX_DIR', raising = False)
+  monkeypatch.setattr (FileIndex.FileIndex, 'RACY_WINDOW', 0)
+  root = str (tmp_path / 'suite')
+  touch (root, 'a/main.c', 'b/util.c')
+
+  index = FileIndex.FileIndex (root)
+  index.build ()
+
+  scans = []
+  scan_directory = FileIndex.scan_directory
+  monkeypatch.setattr (FileIndex, 'scan_directory', lambda path: scans.append (path) or scan_directory (path))
+
+  # A directory changed after the index was built is listed again the first
+  # time it is used, and then only once it changes again
+  touch (root, 'a/new.c')
+  now = time.time_ns ()
+  os.utime (os.path.join (root, 'a'), ns = (now, now))
+
+  for i in range (3):
+    assert sorted (index.files (os.path.join (root, 'a'))) == ['main.c', 'new.c']
+    assert index.files (os.path.join (root, 'b')) == ['util.c']
+
+  assert scans == [os.path.join (root, 'a')]
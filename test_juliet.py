@@ -0,0 +1,241 @@
+import argparse
+import glob
+import json
+import os
+import pytest
+import random
+import shutil
+import subprocess
+import sys
+
+from lib.DataAbstractions import FlawType, ResultSet
+from lib.testsuites.JulietCpp import Parser, Scanner
+from lib.testsuites.JulietCpp1_2 import JulietCpp1_2
+from lib.testsuites.JulietJavaParser import JavaScanner
+from pyparsing import *
+
+FIXTURES = os.path.join (os.path.dirname (os.path.abspath (__file__)), 'tests', 'juliet')
+
+#
+# Generate test cases with flaw comments in the places the scanner has to
+# get right: before any function, between tokens, across lines, and next to
+# other comments and tokens.
+#
+def generate_cpp (directory, count):
+  rnd = random.Random (7)
+  comments = ['/* FLAW: Use of %s */', '/* POTENTIAL FLAW: data may be %s */', '/* INCIDENTAL: CWE 401 Memory leak - %s */',
+              '/* FIX: Use a safe %s */', '/* INCIDENTAL CWE-561 Dead code %s */', '/*FLAW:%s*/', '/* POTENTIAL\n   FLAW %s */',
+              '/* FIX */', '/* not a flaw %s */']
+  words = ['strcpy', 'memcpy()', 'the <buffer> & "size"', 'a\tloop', 'x*/y']
+  paths = []
+
+  for i in range (count):
+    lines = ['/* TEMPLATE GENERATED TESTCASE FILE */', '#include <stdio.h>', '']
+
+    if rnd.random () < 0.2:
+      lines.append (rnd.choice (comments).replace ('%s', rnd.choice (words)))
+
+    for name in ['bad', 'goodG2B', 'goodB2G', 'CWE121_helper_%d' % i, 'helper']:
+      lines.append (rnd.choice (['void %s()', 'static void %s(int x)', 'int %s (void)']) % name)
+      lines.append ('{')
+
+      for k in range (rnd.randint (1, 8)):
+        if rnd.random () < 0.4:
+          comment = rnd.choice (comments).replace ('%s', rnd.choice (words))
+          lines.append (rnd.choice (['    %s', '    x = 1; %s', '    %s y = 2;', '%s%s' % ('    ', '%s/* FIX: also */')]) % comment)
+
+        lines.append ('\tdata[%d] = x + %d; // comment' % (k, k))
+
+      lines.append ('}')
+
+    path = os.path.join (directory, 'CWE121_case_%02d%s' % (i, rnd.choice (['.c', '.cpp'])))
+
+    with open (path, 'w') as f:
+      f.write ('\n'.join (lines) + '\n')
+
+    paths.append (path)
+
+  return paths
+
+def cpp_fixtures ():
+  return sorted (glob.glob (os.path.join (FIXTURES, 'cpp', '*')))
+
+#
+# The scanner must find the same records as the pyparsing parser
+#
+@pytest.mark.parametrize ('path', cpp_fixtures (), ids = os.path.basename)
+def test_cpp_scanner_matches_parser (path):
+  filename = os.path.basename (path)
+  records = Scanner ('JulietCpp-1.3').parse (filename, path)
+
+  assert records
+  assert records == Parser ('JulietCpp-1.3').parse (filename, path)
+
+def test_cpp_scanner_matches_parser_generated (tmp_path):
+  for path in generate_cpp (str (tmp_path), 40):
+    filename = os.path.basename (path)
+    assert Scanner ('JulietCpp-1.3').parse (filename, path) == Parser ('JulietCpp-1.3').parse (filename, path), filename
+
+#
+# Import a copy of the C/C++ fixtures with SCATE.py, and return its log
+#
+def import_cpp (root, outfile, *options):
+  cmd = [sys.executable, os.path.join (os.path.dirname (FIXTURES), '..', 'SCATE.py'), '--weaknesses=CWE134']
+  cmd += ['import', '--outfile=%s' % outfile, '--path=%s' % root, 'JulietCpp-1.2', '--incremental'] + list (options)
+  env = dict (os.environ, SCATE_CACHE_DIR = '', SCATE_INDEX_DIR = '')
+
+  return subprocess.run (cmd, env = env, stdout = subprocess.PIPE, stderr = subprocess.STDOUT, check = True).stdout.decode ('UTF-8')
+
+def read_manifest (outfile):
+  with open (outfile + '.manifest', 'r', encoding = 'UTF-8') as f:
+    return json.load (f)
+
+def test_incremental_import (tmp_path):
+  root = tmp_path / 'juliet'
+  shutil.copytree (os.path.join (FIXTURES, 'cpp'), str (root / 'CWE134'))
+  outfile = str (tmp_path / 'kb.xml')
+
+  assert 'Parsing 3 changed file(s) of 3' in import_cpp (str (root), outfile)
+  assert 'Parsing 0 changed file(s) of 3' in import_cpp (str (root), outfile)
+  assert len (read_manifest (outfile)['files']) == 3
+
+  # Files that fail to parse are not recorded, and are parsed again
+  (root / 'CWE134' / 'CWE134_bad_01.c').write_bytes (b'void bad()\n{\n  /* FLAW: \xff */\n}\n')
+
+  for i in range (2):
+    log = import_cpp (str (root), outfile)
+    assert 'Parsing 1 changed file(s) of 4' in log
+    assert 'Failed to parse' in log
+
+  assert sorted (os.path.basename (x) for x in read_manifest (outfile)['files']) == sorted (os.listdir (os.path.join (FIXTURES, 'cpp')))
+
+  # The records of one parser are not reused by the other
+  os.remove (str (root / 'CWE134' / 'CWE134_bad_01.c'))
+  assert 'Parsing 3 changed file(s) of 3' in import_cpp (str (root), outfile, '--parser=pyparsing')
+  assert read_manifest (outfile)['parser'] == 'Parser'
+  assert 'Parsing 0 changed file(s) of 3' in import_cpp (str (root), outfile, '--parser=pyparsing')
+  assert 'Parsing 3 changed file(s) of 3' in import_cpp (str (root), outfile)
+
+#
+# Import the CWE134 test cases under the root in this process, and return the
+# flaws of the result set in the order they were added
+#
+def import_flaws (root, threads = 1, processes = None):
+  suite = JulietCpp1_2 ()
+  suite.parse_args (argparse.Namespace (threads = threads, processes = processes, path = root, weaknesses = 'CWE134',
+                                        parser = 'scanner', incremental = False, outfile = None))
+  kb = suite.import_testcases (ResultSet ())
+
+  return [(line.get_File ().filename, line.get_Function ().function, line.line, flaw.severity, flaw.description)
+          for line in kb.iterate_Lines () for flaw in line.iterate_Flaws ()]
+
+def copy_cpp_fixtures (tmp_path):
+  root = tmp_path / 'juliet'
+  shutil.copytree (os.path.join (FIXTURES, 'cpp'), str (root / 'CWE134'))
+  generate_cpp (str (root / 'CWE134'), 40)
+
+  return root
+
+#
+# The workers must find the same flaws as the serial import
+#
+@pytest.mark.parametrize ('threads,processes', [(4, None), (1, 2)])
+def test_import_workers_match_serial (tmp_path, threads, processes):
+  root = copy_cpp_fixtures (tmp_path)
+  expected = import_flaws (str (root))
+
+  assert len (expected) > 100
+  assert import_flaws (str (root), threads, processes) == expected
+
+#
+# A file that fails to parse in a worker is reported by the caller, and does
+# not keep the other files from being imported
+#
+@pytest.mark.parametrize ('threads,processes', [(1, None), (4, None), (1, 2)])
+def test_import_workers_report_errors (tmp_path, caplog, threads, processes):
+  root = copy_cpp_fixtures (tmp_path)
+  expected = import_flaws (str (root))
+
+  (root / 'CWE134' / 'CWE134_bad_01.c').write_bytes (b'void bad()\n{\n  /* FLAW: \xff */\n}\n')
+  caplog.clear ()
+
+  assert import_flaws (str (root), threads, processes) == expected
+  assert 'Failed to parse %s' % (root / 'CWE134' / 'CWE134_bad_01.c') in caplog.text
+  assert 'UnicodeDecodeError' in caplog.text
+
+#
+# @class JavaReference
+#
+# Reference parser for the flaws of the Juliet Java test cases, written with
+# pyparsing like the original grammar: a method is an optional list of
+# modifiers, a return type, a name, its parameters and a nested body. Flaws
+# belong to the innermost method whose body holds them.
+#
+class JavaReference:
+  def __init__ (self):
+    modifier = oneOf ('public protected private static final synchronized abstract native', asKeyword = True)
+    type_name = WordStart ('$_' + alphanums) + ~oneOf ('new else return throw case', asKeyword = True) + Word ('$_.<>[],?' + alphanums)
+    name = ~oneOf ('if for while switch catch synchronized', asKeyword = True) + Word ('$_' + alphanums) ('name')
+    parameters = '(' + Optional (CharsNotIn ('(){};')) + ')'
+    throws = Keyword ('throws') + delimitedList (Word ('$_.' + alphanums))
+    body = nestedExpr ('{', '}', ignoreExpr = cStyleComment | dblSlashComment | dblQuotedString | sglQuotedString)
+
+    header = (OneOrMore (modifier) + type_name + name | type_name + name) + parameters + Optional (throws)
+    self.method = header + Empty ().setParseAction (lambda s, l, t: [l]) ('body') + originalTextFor (body)
+    self.elements = cStyleComment ('comment') | dblSlashComment | dblQuotedString | sglQuotedString | self.method
+
+    flaw_type = Literal ('FLAW') | Literal ('POTENTIAL') + Literal ('FLAW') | Literal ('INCIDENTAL') | Literal ('FIX')
+    self.flaw = flaw_type ('type') + Optional (Literal (':')) + Group (OneOrMore (Word (printables))) ('description')
+    self.next = ZeroOrMore (cStyleComment | dblSlashComment) + Empty ().setParseAction (lambda s, l, t: [l]) ('start')
+
+  def parse (self, path):
+    with open (path, 'r') as f:
+      text = f.read ()
+
+    records = []
+    self.parse_body (text, 0, len (text), '', records)
+    return records
+
+  def parse_body (self, text, start, end, function, records):
+    for (tokens, s, e) in self.elements.scanString (text[start:end]):
+      if 'comment' in tokens:
+        self.add_flaw (text, start + s, start + e, function, records)
+
+      elif 'name' in tokens:
+        body = start + tokens['body']
+        self.parse_body (text, body + 1, start + e - 1, tokens['name'], records)
+
+  def add_flaw (self, text, start, end, function, records):
+    try:
+      tokens = self.flaw.parseString (text[start + 2:end - 2])
+
+    except ParseException:
+      return
+
+    severity = {'FLAW': FlawType.Flaw, 'POTENTIAL': FlawType.Potential, 'INCIDENTAL': FlawType.Incidental, 'FIX': FlawType.Fix}[tokens[0]]
+    location = end + self.next.parseString (text[end:])['start']
+
+    if location == len (text):
+      location = start
+
+    records.append ((function, lineno (location, text), severity, ' '.join (tokens['description'])))
+
+def java_fixtures ():
+  return sorted (glob.glob (os.path.join (FIXTURES, 'java', '*')))
+
+#
+# The Java scanner must find the same records as the pyparsing grammar
+#
+@pytest.mark.parametrize ('path', java_fixtures (), ids = os.path.basename)
+def test_java_scanner_matches_reference (path):
+  records = JavaScanner ().parse (path)
+
+  assert records
+  assert records == JavaReference ().parse (path)
+
+def test_java_scanner_functions ():
+  records = JavaScanner ().parse (os.path.join (FIXTURES, 'java', 'CWE833_Deadlock__ReentrantLock_Thread_01.java'))
+  functions = [function for (function, line, severity, description) in records]
+
+  assert functions == ['CWE833_Deadlock__ReentrantLock_Thread_01', 'helperBowBad', 'helperBowBackBad', 'run', 'bad', 'bad',
+                       'generic', 'compare', 'helperSync', '']
@@ -0,0 +1,150 @@
+import argparse
+import http.server
+import json
+import os
+import threading
+import urllib.parse
+
+import pytest
+
+from lib.DataAbstractions import *
+from lib.Tools import Klocwork as KlocworkModule
+from lib.Tools.Klocwork import Klocwork
+
+#
+# Get the issues of the stand-in server with the provided severity
+#
+def make_issues (severity, count):
+  return [{'id': i, 'file': '/src/file%d.c' % (i % 7), 'method': 'func%d' % (i % 5), 'code': 'CODE.%d.%d' % (severity, i % 3),
+           'severity': 'Error', 'severityCode': severity} for i in range (count)]
+
+#
+# @class ReviewService
+#
+# Stand-in for the search API of a Klocwork server. The issues are streamed
+# with an issue per line, in chunks. The severities listed in \a failures
+# are answered with a 500, and the ones in \a corrupt end with a line that
+# is not JSON.
+#
+class ReviewService (http.server.BaseHTTPRequestHandler):
+  protocol_version = 'HTTP/1.1'
+
+  def log_message (self, *args):
+    pass
+
+  def do_POST (self):
+    server = self.server
+    request = urllib.parse.parse_qs (self.rfile.read (int (self.headers['Content-Length'])).decode ())
+    query = request['query'][0]
+
+    with server.lock:
+      server.queries.append (query)
+
+    severities = [1, 2, 3] if query == 'severity:1-3' else [int (query.split (':')[1])]
+
+    if any (x in server.failures for x in severities):
+      body = b'{"status": 500, "message": "search failed"}'
+      self.send_response (500)
+      self.send_header ('Content-Length', str (len (body)))
+      self.end_headers ()
+      return self.wfile.write (body)
+
+    self.send_response (200)
+    self.send_header ('Transfer-Encoding', 'chunked')
+    self.end_headers ()
+
+    # The client closes the connection of the searches it gives up on
+    try:
+      for severity in severities:
+        lines = [json.dumps (issue) + '\n' for issue in make_issues (severity, server.count)]
+
+        if severity in server.corrupt:
+          lines.append ('{"id": \n')
+
+        for i in range (0, len (lines), 50):
+          chunk = ''.join (lines[i:i + 50]).encode ()
+          self.wfile.write (b'%x\r\n%s\r\n' % (len (chunk), chunk))
+
+      self.wfile.write (b'0\r\n\r\n')
+
+    except (BrokenPipeError, ConnectionResetError):
+      self.close_connection = True
+
+@pytest.fixture
+def server (monkeypatch):
+  monkeypatch.setattr (KlocworkModule, 'getToken', lambda host, port, user: 'token')
+  monkeypatch.setattr (Klocwork, 'BUFFER_SIZE', 20)
+
+  server = http.server.ThreadingHTTPServer (('127.0.0.1', 0), ReviewService)
+  server.daemon_threads = True
+  server.lock = threading.Lock ()
+  server.queries = []
+  server.failures = set ()
+  server.corrupt = set ()
+  server.count = 400
+
+  thread = threading.Thread (target = server.serve_forever, daemon = True)
+  thread.start ()
+
+  yield server
+
+  server.shutdown ()
+  server.server_close ()
+
+def create_tool (server, connections):
+  tool = Klocwork ()
+  tool.parse_args (argparse.Namespace (server = '127.0.0.1:%d' % server.server_address[1], connections = connections,
+                                       threads = 1, weaknesses = None, all_locations = False))
+  return tool
+
+def get_bugs (suite):
+  return [(bug.get_File ().filename, bug.get_Function ().function, bug.type) for bug in suite.iterate_Bugs ()]
+
+def docgen (server, connections):
+  suite = ResultSet ('build', 'klocwork').get_weakness ('CWE134').get_suite ('/suites/CWE134_a', 'make', '')
+  create_tool (server, connections).handle_docgen (suite)
+
+  return get_bugs (suite)
+
+#
+# The searches by severity must add the same bugs as the single search of
+# every severity
+#
+def test_docgen_matches_single_search (server):
+  tool = create_tool (server, 1)
+  suite = ResultSet ('build', 'klocwork').get_weakness ('CWE134').get_suite ('/suites/CWE134_a', 'make', '')
+
+  for (filename, function, checker) in tool.search (tool.get_project_name (suite), 'severity:1-3'):
+    tool.add_bug (suite, os.path.split (filename)[-1], function, 0, Bug (checker, tool.name ()))
+
+  expected = get_bugs (suite)
+  assert len (expected) == 3 * 400
+
+  for connections in (1, 3):
+    server.queries = []
+    assert docgen (server, connections) == expected
+    assert sorted (server.queries) == ['severity:1', 'severity:2', 'severity:3']
+
+@pytest.mark.parametrize ('connections', [1, 3])
+def test_docgen_raises_search_errors (server, caplog, connections):
+  server.failures = {2}
+
+  with pytest.raises (SystemExit):
+    docgen (server, connections)
+
+  assert 'search failed' in caplog.text
+
+@pytest.mark.parametrize ('connections', [1, 3])
+def test_iterate_searches_raises_errors (server, connections):
+  server.corrupt = {1}
+  tool = create_tool (server, connections)
+
+  # The error of the first search reaches the caller after its issues, while
+  # the other searches are still blocked on their full buffers.
+  issues = []
+
+  with pytest.raises (json.JSONDecodeError):
+    for issue in tool.iterate_searches ('project', ['severity:1', 'severity:2', 'severity:3']):
+      issues.append (issue)
+
+  assert len (issues) == 400
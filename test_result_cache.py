@@ -0,0 +1,70 @@
+import os
+
+from lib.ResultCache import ResultCache, get_cache
+from test_xml_manager import make_result_set, write, read
+
+def test_cache_hit_and_miss (tmp_path):
+  cache = ResultCache (str (tmp_path / 'cache'))
+  filename = tmp_path / 'results.xml'
+  filename.write_text ('<result/>')
+
+  assert cache.get (str (filename)) is None
+
+  cache.put (str (filename), ['value'])
+  cache.put (str (filename), ['other'], 'records:CWE134')
+
+  assert cache.get (str (filename)) == ['value']
+  assert cache.get (str (filename), 'records:CWE134') == ['other']
+  assert cache.get (str (filename), 'records:CWE476') is None
+
+  # Touching the file keeps the entry, since its content did not change
+  stat = os.stat (str (filename))
+  os.utime (str (filename), ns = (stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+  assert cache.get (str (filename)) == ['value']
+
+  # Replacing the content with one of the same size does not
+  filename.write_text ('<rslt />')
+  os.utime (str (filename), ns = (stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+  assert cache.get (str (filename)) is None
+
+def test_cache_eviction (tmp_path):
+  cache = ResultCache (str (tmp_path / 'cache'))
+  filenames = []
+
+  for i in range (4):
+    filename = tmp_path / ('results_%d.xml' % i)
+    filename.write_text ('<result/>')
+    filenames.append (str (filename))
+
+  for (i, filename) in enumerate (filenames):
+    cache.put (filename, 'x' * 1000)
+    entry = cache.get_entry_filename (filename, None)
+    os.utime (entry, ns = (i * 10 ** 9, i * 10 ** 9))
+
+  # Using an entry makes it the most recently used one
+  assert cache.get (filenames[0]) == 'x' * 1000
+
+  cache.max_size = 2500
+  cache.evict ()
+
+  assert cache.get (filenames[0]) is not None
+  assert cache.get (filenames[1]) is None
+  assert cache.get (filenames[2]) is None
+  assert cache.get (filenames[3]) is not None
+
+def test_cached_read (tmp_path, monkeypatch):
+  monkeypatch.setenv ('SCATE_CACHE_DIR', str (tmp_path / 'cache'))
+  expected = write (make_result_set (), tmp_path / 'results.xml')
+
+  for is_build in (False, True):
+    assert write (read (tmp_path / 'results.xml', is_build), tmp_path / 'uncached.xml') == expected
+    assert write (read (tmp_path / 'results.xml', is_build), tmp_path / 'cached.xml') == expected
+
+  assert get_cache ().get (str (tmp_path / 'results.xml'), 'records') is not None
+
+  # The cache is only used on request
+  monkeypatch.setenv ('SCATE_CACHE_DIR', '')
+  assert get_cache () is None
+
+  monkeypatch.delenv ('SCATE_CACHE_DIR')
+  assert get_cache () is None
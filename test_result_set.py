@@ -0,0 +1,235 @@
+import gc
+
+from lib.DataAbstractions import *
+from lib.DataManagers.XMLManager import XMLManager
+from lib.DataPointFactories.NIST_Cpp_DPFactory import NIST_Cpp_DPFactory
+from test_export import datapoint_values
+
+#
+# Build a result set with a knowledge base and a build over two suites
+#
+def make_result_set ():
+  rs = ResultSet ()
+
+  for (directory, count) in (('suite_a', 3), ('suite_b', 2)):
+    suite = rs.get_weakness ('CWE134').get_suite (directory, 'gcc', 'make')
+
+    for i in range (count):
+      line = suite.get_file ('file_%d.c' % i).get_function ('bad').get_line (10 + i)
+      line.add_flaw (FlawType.Flaw, 'flaw', 'kb')
+      line.add_flaw (FlawType.Fix, 'fix', 'kb')
+
+      bug = Bug ('TAINTED_STRING', 'coverity', 'bug')
+      bug.line = line
+      line.add_Bug (bug)
+
+  return rs
+
+#
+# Count the flaws and bugs of a node by walking its lines
+#
+def walk_counts (node):
+  counts = {}
+
+  for line in node.iterate_Lines ():
+    for (key, count) in line.get_counts ().items ():
+      counts[key] = counts.get (key, 0) + count
+
+  return counts
+
+def check_counts (rs):
+  for weakness in rs.iterate_Weaknesses ():
+    for suite in weakness.iterate_Suites ():
+      assert suite.get_counts () == walk_counts (suite)
+
+    assert weakness.get_counts () == walk_counts (weakness)
+
+  assert rs.get_counts () == walk_counts (rs)
+
+def test_counts ():
+  rs = make_result_set ()
+  suite = rs['CWE134']['suite_a']
+
+  assert suite.count_Flaws () == 6
+  assert suite.count_Flaws (FlawType.Fix) == 3
+  assert suite.count_Bugs () == 3
+  assert suite.count_Bugs ('coverity') == 3
+  assert rs.count_Flaws () == 10
+  assert rs['CWE134'].count_Bugs ('other') == 0
+
+  # Duplicate flaws are not counted again
+  suite['file_0.c']['bad'][10].add_flaw (FlawType.Flaw, 'flaw', 'kb')
+  assert suite.count_Flaws () == 6
+  check_counts (rs)
+
+def test_counts_of_attached_nodes ():
+  rs = make_result_set ()
+  suite = rs['CWE134']['suite_a']
+  function = suite['file_0.c']['bad']
+
+  # A line created with a parent is only counted once it is attached
+  line = Line (function, 42)
+  line.add_flaw (FlawType.Flaw, 'late', 'kb')
+  assert suite.count_Flaws () == 6
+
+  function[42] = line
+  assert suite.count_Flaws () == 7
+
+  line.add_flaw (FlawType.Incidental, 'later', 'kb')
+  assert suite.count_Flaws () == 8
+  check_counts (rs)
+
+  # The same goes for a function and a file
+  file = File (suite, 'new.c')
+  function = Function (file, 'good')
+  function.get_line (5).add_flaw (FlawType.Fix, 'fix', 'kb')
+  file['good'] = function
+  assert suite.count_Flaws () == 8
+
+  suite['new.c'] = file
+  assert suite.count_Flaws () == 9
+  check_counts (rs)
+
+  # Replacing and removing nodes updates the counts
+  suite['file_1.c'] = File (suite, 'file_1.c')
+  del suite['file_2.c']['bad'][12]
+  assert suite.count_Flaws () == 5
+  assert suite.count_Bugs () == 1
+  check_counts (rs)
+
+  # Detached lines no longer count
+  function[5].add_flaw (FlawType.Flaw, 'flaw', 'kb')
+  del function[5]
+  function.get_line (5)
+  line.add_flaw (FlawType.Flaw, 'detached', 'kb')
+  del suite['file_0.c']['bad'][42]
+  line.add_flaw (FlawType.Flaw, 'after', 'kb')
+  assert suite.count_Flaws () == 2
+  check_counts (rs)
+
+#
+# Get the flaws and bugs of a result set as a sorted list of records
+#
+def records (rs):
+  result = []
+
+  for line in rs.iterate_Lines ():
+    location = (line.get_Weakness ().name, line.get_Suite ().directory, line.get_File ().filename, line.get_Function ().function, line.line)
+
+    for flaw in line.iterate_Flaws ():
+      result.append (location + ('flaw', flaw.severity.name, flaw.description, flaw.source))
+
+    for bug in line.iterate_Bugs ():
+      result.append (location + ('bug', bug.type, bug.message, bug.source, bug.events or ''))
+
+  return sorted (result)
+
+#
+# Build the shard of a build that ran on one host
+#
+def make_shard (source, suites):
+  rs = ResultSet ('build', source, '--host=%s' % source)
+
+  for (weakness, directory) in suites:
+    line = rs.get_weakness (weakness).get_suite (directory, 'gcc', 'make').get_file ('main.c').get_function ('bad').get_line (7)
+    line.add_flaw (FlawType.Flaw, 'flaw', source)
+
+    bug = Bug ('TAINTED_STRING', source, 'found on %s' % source)
+    bug.line = line
+    line.add_Bug (bug)
+
+  return rs
+
+def test_merge (tmp_path):
+  first = make_shard ('host1', [('CWE134', 'suite_a'), ('CWE476', 'suite_b')])
+  second = make_shard ('host2', [('CWE134', 'suite_a'), ('CWE134', 'suite_c')])
+  filenames = []
+
+  for (i, rs) in enumerate ((first, second)):
+    filenames.append (str (tmp_path / ('shard_%d.xml' % i)))
+    XMLManager (filenames[-1]).write (rs)
+
+  expected = ResultSet ().merge (first, second)
+  check_counts (expected)
+  assert expected['CWE134']['suite_a'].count_Bugs () == 2
+  assert expected['CWE134']['suite_a'].count_Flaws () == 2
+
+  XMLManager (str (tmp_path / 'merged.xml')).merge (filenames)
+  merged = ResultSet ()
+  XMLManager (str (tmp_path / 'merged.xml')).add_results (merged, True)
+
+  assert records (merged) == records (expected)
+  assert merged.builds == {'host1': '--host=host1', 'host2': '--host=host2'}
+
+def test_merge_not_a_result (tmp_path, caplog):
+  filename = str (tmp_path / 'shard.xml')
+  XMLManager (filename).write (make_shard ('host1', [('CWE134', 'suite_a')]))
+  (tmp_path / 'other.xml').write_text ('<datapoints/>')
+
+  XMLManager (str (tmp_path / 'merged.xml')).merge ([filename, str (tmp_path / 'other.xml')])
+
+  assert 'other.xml] does not start with a <result> element' in caplog.text
+  assert not (tmp_path / 'merged.xml').exists ()
+
+def test_index ():
+  rs = make_result_set ()
+  index = rs.get_index ()
+
+  assert rs.get_index () is index
+  assert rs in ResultSetIndex.result_sets
+  assert len (index.get_Bugs_of_type ('TAINTED_STRING')) == 5
+  assert len (index.get_Bugs_of_source ('coverity')) == 5
+  assert len (index.get_Flaws_of_severity (FlawType.Fix)) == 5
+  assert [x.get_Suite ().directory for x in index.get_Lines_at ('file_1.c', 11)] == ['suite_a', 'suite_b']
+
+  # The indexes follow new flaws, bugs and lines
+  line = rs.get_weakness ('CWE476').get_suite ('suite_a', 'gcc', 'make').get_file ('file_1.c').get_function ('good').get_line (11)
+  line.add_flaw (FlawType.Fix, 'fix', 'kb')
+  bug = Bug ('NULL_RETURNS', 'coverity', 'bug')
+  bug.line = line
+  line.add_Bug (bug)
+
+  assert len (index.get_Flaws_of_severity (FlawType.Fix)) == 6
+  assert index.get_Bugs_of_type ('NULL_RETURNS') == [bug]
+  assert len (index.get_Lines_at ('file_1.c', 11)) == 3
+
+  # Removing nodes rebuilds them
+  del rs['CWE134']['suite_b']['file_1.c']
+  assert len (index.get_Lines_at ('file_1.c', 11)) == 2
+  assert len (index.get_Bugs_of_source ('coverity')) == 5
+
+  rs.drop_index ()
+  rs.drop_index ()
+  assert rs.index is None
+  assert rs not in ResultSetIndex.result_sets
+
+def test_index_of_dropped_result_set ():
+  result_sets = len (ResultSetIndex.result_sets)
+
+  # A result set that is dropped with its index no longer counts as indexed
+  rs = make_result_set ()
+  rs.get_index ()
+  assert len (ResultSetIndex.result_sets) == result_sets + 1
+
+  del rs
+  gc.collect ()
+  assert len (ResultSetIndex.result_sets) == result_sets
+
+def test_factory_uses_no_index ():
+  rs = ResultSet ()
+  XMLManager ('tests/import1.xml').add_results (rs, False)
+  XMLManager ('tests/build1.xml').add_results (rs, True)
+
+  factory = NIST_Cpp_DPFactory (rs)
+  datapoints = datapoint_values (x for (_, x) in factory.generate_all ([(Granularity.Line, True, True)]))
+
+  assert datapoints
+  assert rs.index is None
+  assert rs not in ResultSetIndex.result_sets
+
+  # An index that was already there is kept, and does not change the results
+  index = rs.get_index ()
+  assert datapoint_values (x for (_, x) in NIST_Cpp_DPFactory (rs).generate_all ([(Granularity.Line, True, True)])) == datapoints
+  assert rs.index is index
+
+  rs.drop_index ()
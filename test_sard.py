@@ -0,0 +1,56 @@
+import argparse
+import os
+
+from lib.DataAbstractions import *
+from lib.DataManagers.XMLManager import XMLManager
+from lib.testsuites.SARD import SARD
+
+#
+# Write a manifest in Latin-1, with a DTD that defines an entity, and with
+# <testcase> tags inside of CDATA sections and comments
+#
+def write_manifest (directory, count):
+  lines = ['<?xml version="1.0" encoding="ISO-8859-1"?>',
+           '<!DOCTYPE container [',
+           '  <!ENTITY suite "Juliet Test Suite">',
+           ']>',
+           '<container>']
+
+  for i in range (count):
+    lines.append ('  <testcase id="%d" type="Source Code" status="Accepted" language="C">' % i)
+    lines.append ('    <description><![CDATA[Test <testcase id="x"> of the &suite; case]]></description>')
+
+    if i % 7 == 0:
+      lines.append ('    <!-- <testcase id="y"> -->')
+
+    lines.append ('    <file path="%03d/file_%d.c" language="C">' % (i % 13, i))
+    lines.append ('      <flaw line="%d" name="CWE-%d: Naïve flaw from the &suite; n°%d"/>' % (10 + i % 50, 476 + i % 3, i))
+    lines.append ('    </file>')
+    lines.append ('  </testcase>')
+
+  lines.append ('</container>')
+
+  with open (os.path.join (directory, 'manifest.xml'), 'wb') as f:
+    f.write ('\n'.join (lines).encode ('ISO-8859-1'))
+
+def import_sard (directory, threads):
+  suite = SARD ()
+  suite.parse_args (argparse.Namespace (threads = threads, path = str (directory), weaknesses = None))
+
+  rs = ResultSet ('resultset', 'SARD')
+  suite.import_testcases (rs)
+  return rs
+
+def test_parallel_import (tmp_path, monkeypatch):
+  write_manifest (str (tmp_path), 400)
+  XMLManager (str (tmp_path / 'sequential.xml')).write (import_sard (tmp_path, 1))
+
+  # Small ranges, so they are cut inside of the CDATA sections and comments
+  for size in [997, 4096, 1 << 20]:
+    monkeypatch.setattr (SARD, 'CHUNK_SIZE', size)
+    XMLManager (str (tmp_path / 'parallel.xml')).write (import_sard (tmp_path, 3))
+    assert (tmp_path / 'parallel.xml').read_bytes () == (tmp_path / 'sequential.xml').read_bytes ()
+
+  rs = import_sard (tmp_path, 1)
+  assert sum (1 for x in rs.iterate_Flaws ()) == 400
+  assert 'Naïve flaw from the Juliet Test Suite n°5' in [x.description for x in rs.iterate_Flaws ()]
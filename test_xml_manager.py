@@ -0,0 +1,240 @@
+import json
+import logging
+import os
+import shutil
+
+from lib.DataAbstractions import *
+from lib.DataManagers.XMLManager import *
+
+from lxml import etree
+
+#
+# Build a result set whose attributes need escaping
+#
+def make_result_set ():
+  rs = ResultSet ('resultset', 'tool&co', 'a=<b>|c="d"')
+  suite = rs.get_weakness ('CWE134').get_suite ('/opt/suite "one"', 'make', 'all')
+  line = suite.get_file ('a&b.c').get_function ('bad<T>').get_line (12)
+  line.add_Flaw (Flaw (line, FlawType.Potential, 'Use of "printf" & <stdio.h>', rs.source))
+  line.add_Flaw (Flaw (line, FlawType.Fix, 'café – fixed', rs.source))
+
+  bug = Bug ('TAINTED_STRING', rs.source, 'x < y && y > "z"')
+  bug.line = line
+  line.add_Bug (bug)
+
+  line = suite.get_file ('a&b.c').get_function ('good').get_line (3)
+  bug = Bug ('OTHER', 'other tool', 'multi-location', Bug.encode_events ([('a&b.c', 4), ('b.c', 9)]))
+  bug.line = line
+  line.add_Bug (bug)
+  return rs
+
+def write (rs, filename):
+  XMLManager (str (filename)).write (rs)
+  return filename.read_bytes ()
+
+def read (filename, is_build):
+  rs = ResultSet ()
+  XMLManager (str (filename)).add_results (rs, is_build)
+  return rs
+
+def test_write_round_trip (tmp_path):
+  first = write (make_result_set (), tmp_path / 'first.xml')
+  second = write (read (tmp_path / 'first.xml', False), tmp_path / 'second.xml')
+
+  assert first == second
+
+def test_write_escaping (tmp_path):
+  write (make_result_set (), tmp_path / 'out.xml')
+  root = etree.parse (str (tmp_path / 'out.xml')).getroot ()
+
+  assert root.get ('source') == 'tool&co'
+  assert root.get ('args') == 'a=<b>|c="d"'
+  assert root.find ('weakness/suite').get ('dir') == '/opt/suite "one"'
+
+  flaws = root.findall ('.//flaw')
+  assert [x.get ('severity') for x in flaws] == ['Potential', 'Fix']
+  assert flaws[0].get ('file') == 'a&b.c'
+  assert flaws[0].get ('function') == 'bad<T>'
+
+  bugs = root.findall ('.//bug')
+  assert bugs[1].get ('source') == 'other tool'
+  assert bugs[1].get ('events') == 'a&b.c:4|b.c:9'
+
+  rs = read (tmp_path / 'out.xml', True)
+  line = rs['CWE134']['/opt/suite "one"']['a&b.c']['bad<T>'][12]
+  assert [x.description for x in line.get_Flaws ()] == ['Use of "printf" & <stdio.h>', 'café – fixed']
+  assert [x.message for x in line.get_Bugs ()] == ['x < y && y > "z"']
+  assert rs.builds == {'tool&co': 'a=<b>|c="d"'}
+
+def test_events_round_trip (tmp_path):
+  locations = [('dir|name/a.c', 4), ('C:\\suite\\b.c', 9), ('50%.c', 1), ('x%7C.c', 2), ('plain.c', 3)]
+  rs = ResultSet ('resultset', 'tool')
+  line = rs.get_weakness ('CWE134').get_suite ('/opt/suite', 'make', 'all').get_file ('a.c').get_function ('bad').get_line (1)
+  bug = Bug ('OTHER', rs.source, 'message', Bug.encode_events (locations))
+  bug.line = line
+  line.add_Bug (bug)
+
+  assert list (bug.iterate_events ()) == locations
+
+  write (rs, tmp_path / 'out.xml')
+  bug = read (tmp_path / 'out.xml', True)['CWE134']['/opt/suite']['a.c']['bad'][1].get_Bugs ()[0]
+  assert list (bug.iterate_events ()) == locations
+
+  # Events written before filenames were escaped read the same
+  assert list (Bug ('OTHER', 'tool', None, 'a&b.c:4|C:\\b.c:9').iterate_events ()) == [('a&b.c', 4), ('C:\\b.c', 9)]
+
+def test_write_datapointset_round_trip (tmp_path):
+  dpset = DataPointSet ()
+  dpset.imports['import'] = 'a=&b'
+  dpset.builds['build'] = 'c=<d>'
+
+  criteria = DataPointCriteria (Granularity.Function, True, False)
+  criteria.datapointset = dpset
+  dpset[(criteria.granularity, criteria.wrong_checker_is_fp, criteria.minimum)] = criteria
+
+  for values in [(1, 0, 0, 'CWE134', '/opt/s', 'a&b.c', 'bad<T>', 12, 'p1'),
+                 (0, 2, 1, 'CWE134', '/opt/s', 'b.c', 'good', 0, 'p2')]:
+    datapoint = DataPoint (*values)
+    datapoint.criteria = criteria
+    criteria.datapoints.append (datapoint)
+
+  XMLManager (str (tmp_path / 'first.xml')).write_datapointset (dpset)
+  loaded = DataPointSet ()
+  XMLManager (str (tmp_path / 'first.xml')).read_datapointset (loaded)
+  XMLManager (str (tmp_path / 'second.xml')).write_datapointset (loaded)
+
+  assert (tmp_path / 'first.xml').read_bytes () == (tmp_path / 'second.xml').read_bytes ()
+  assert loaded.imports == dpset.imports
+  assert loaded.builds == dpset.builds
+
+#
+# Build a result set of several weaknesses, with several suites each
+#
+def make_weaknesses ():
+  rs = ResultSet ('resultset', 'kb', '--all')
+
+  for (i, name) in enumerate (('CWE121', 'CWE134', 'CWE476', 'CWE590')):
+    for directory in ('/opt/%s/a' % name, '/opt/%s/b "c"' % name):
+      suite = rs.get_weakness (name).get_suite (directory, 'make', 'all')
+
+      for k in range (i + 2):
+        line = suite.get_file ('f%d.c' % k).get_function ('bad').get_line (10 + k)
+        line.add_Flaw (Flaw (line, FlawType.Flaw, 'flaw <%d> in %s' % (k, name), rs.source))
+
+        bug = Bug ('CHECKER_%d' % k, 'tool', 'found & reported', Bug.encode_events ([('f%d.c' % k, 20 + k)]))
+        bug.line = line
+        line.add_Bug (bug)
+
+  return rs
+
+#
+# Read the provided weaknesses of a document, and write them back out
+#
+def read_filtered (filename, weaknesses, output):
+  rs = ResultSet ()
+  XMLManager (str (filename)).add_results (rs, True, weaknesses)
+  return write (rs, output)
+
+#
+# Check that each byte range of the index holds exactly its weakness or suite
+#
+def check_ranges (data, index):
+  for (name, start, end, suites) in index['weaknesses']:
+    weakness = etree.fromstring (data[start:end])
+    assert (weakness.tag, weakness.get ('id')) == ('weakness', name)
+    assert [x[0] for x in suites] == [x.get ('dir') for x in weakness]
+
+    for (directory, suite_start, suite_end) in suites:
+      suite = etree.fromstring (data[suite_start:suite_end])
+      assert (suite.tag, suite.get ('dir')) == ('suite', directory)
+
+def test_write_index (tmp_path):
+  write (make_weaknesses (), tmp_path / 'kb.xml')
+  data = (tmp_path / 'kb.xml').read_bytes ()
+
+  with open (get_index_filename (str (tmp_path / 'kb.xml')), 'r') as f:
+    index = json.load (f)
+
+  assert index['version'] == XMLManager.INDEX_VERSION
+  assert index['size'] == len (data)
+  assert index['header'] == index['weaknesses'][0][1]
+  assert [x[0] for x in index['weaknesses']] == ['CWE121', 'CWE134', 'CWE476', 'CWE590']
+
+  check_ranges (data, index)
+
+  # The scanner finds the ranges of a document without an index
+  os.remove (get_index_filename (str (tmp_path / 'kb.xml')))
+  scanned = get_document_index (str (tmp_path / 'kb.xml'))
+
+  assert [x[0] for x in scanned['weaknesses']] == [x[0] for x in index['weaknesses']]
+  check_ranges (data, scanned)
+
+  # A document without weaknesses has no index
+  write (make_weaknesses (), tmp_path / 'kb.xml')
+  write (ResultSet ('resultset', 'kb'), tmp_path / 'kb.xml')
+  assert not os.path.exists (get_index_filename (str (tmp_path / 'kb.xml')))
+
+def test_indexed_read_matches_full_parse (tmp_path, caplog):
+  caplog.set_level (logging.DEBUG)
+  write (make_weaknesses (), tmp_path / 'kb.xml')
+  shutil.copy (str (tmp_path / 'kb.xml'), str (tmp_path / 'full.xml'))
+
+  for weaknesses in (['CWE134'], ['CWE121', 'CWE590'], ['CWE476', 'CWE999'], []):
+    caplog.clear ()
+    indexed = read_filtered (tmp_path / 'kb.xml', weaknesses, tmp_path / 'indexed.xml')
+    assert 'using its index' in caplog.text
+
+    caplog.clear ()
+    assert read_filtered (tmp_path / 'full.xml', weaknesses, tmp_path / 'parsed.xml') == indexed
+    assert 'using its index' not in caplog.text
+
+  assert b'CWE590' in read_filtered (tmp_path / 'kb.xml', ['CWE590'], tmp_path / 'indexed.xml')
+  assert b'CWE134' not in read_filtered (tmp_path / 'kb.xml', ['CWE590'], tmp_path / 'indexed.xml')
+
+def test_stale_index_falls_back_to_full_parse (tmp_path, caplog):
+  caplog.set_level (logging.DEBUG)
+  write (make_weaknesses (), tmp_path / 'kb.xml')
+
+  # The document is changed after its index was written, moving the
+  # weaknesses in the file
+  data = (tmp_path / 'kb.xml').read_bytes ().replace (b'CHECKER_0', b'CHECKER_ZERO')
+  (tmp_path / 'kb.xml').write_bytes (data)
+  (tmp_path / 'full.xml').write_bytes (data)
+
+  for weaknesses in (['CWE121'], ['CWE476']):
+    caplog.clear ()
+    result = read_filtered (tmp_path / 'kb.xml', weaknesses, tmp_path / 'stale.xml')
+
+    assert 'Ignoring stale index' in caplog.text
+    assert 'using its index' not in caplog.text
+    assert result == read_filtered (tmp_path / 'full.xml', weaknesses, tmp_path / 'parsed.xml')
+
+  assert b'CHECKER_ZERO' in read_filtered (tmp_path / 'kb.xml', ['CWE476'], tmp_path / 'stale.xml')
+
+  # So does a document whose index is missing
+  os.remove (get_index_filename (str (tmp_path / 'kb.xml')))
+  caplog.clear ()
+
+  assert read_filtered (tmp_path / 'kb.xml', ['CWE476'], tmp_path / 'missing.xml') == read_filtered (tmp_path / 'full.xml', ['CWE476'], tmp_path / 'parsed.xml')
+  assert 'using its index' not in caplog.text
+
+def test_merge_without_index (tmp_path):
+  first = make_weaknesses ()
+  second = ResultSet ('build', 'other', '--other')
+  line = second.get_weakness ('CWE134').get_suite ('/opt/CWE134/a', 'make', 'all').get_file ('f9.c').get_function ('good').get_line (3)
+  line.add_Flaw (Flaw (line, FlawType.Fix, 'fix', second.source))
+
+  for (name, rs) in (('first', first), ('second', second)):
+    write (rs, tmp_path / ('%s.xml' % name))
+    shutil.copy (str (tmp_path / ('%s.xml' % name)), str (tmp_path / ('%s_plain.xml' % name)))
+
+  # The inputs without an index are scanned for their weaknesses
+  XMLManager (str (tmp_path / 'indexed.xml')).merge ([str (tmp_path / 'first.xml'), str (tmp_path / 'second.xml')])
+  XMLManager (str (tmp_path / 'plain.xml')).merge ([str (tmp_path / 'first_plain.xml'), str (tmp_path / 'second_plain.xml')])
+
+  assert not os.path.exists (get_index_filename (str (tmp_path / 'first_plain.xml')))
+  assert (tmp_path / 'plain.xml').read_bytes () == (tmp_path / 'indexed.xml').read_bytes ()
+
+  # The merged document has its own index
+  assert load_index (str (tmp_path / 'plain.xml')) is not None
+  assert read_filtered (tmp_path / 'plain.xml', ['CWE134'], tmp_path / 'out.xml').count (b'<flaw ') == 7
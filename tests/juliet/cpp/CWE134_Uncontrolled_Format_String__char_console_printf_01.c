@@ -0,0 +1,75 @@
+/* TEMPLATE GENERATED TESTCASE FILE
+Filename: CWE134_Uncontrolled_Format_String__char_console_printf_01.c
+Label Definition File: CWE134_Uncontrolled_Format_String.label.xml
+Template File: sources-sinks-01.tmpl.c
+*/
+/*
+ * @description
+ * CWE: 134 Uncontrolled Format String
+ * BadSource: console Read input from the console
+ * Sinks: printf
+ *    GoodSink: printf with "%s" as the first argument and data as the second
+ *    BadSink : printf with only data as an argument
+ * Flow Variant: 01 Baseline
+ *
+ * */
+
+#include "std_testcase.h"
+
+#ifndef OMITBAD
+
+void CWE134_Uncontrolled_Format_String__char_console_printf_01_bad()
+{
+    char * data;
+    char dataBuffer[100] = "";
+    data = dataBuffer;
+    {
+        /* Read input from the console */
+        size_t dataLen = strlen(data);
+        /* if there is room in data, read into it from the console */
+        if (100-dataLen > 1)
+        {
+            /* POTENTIAL FLAW: Read data from the console */
+            if (fgets(data+dataLen, (int)(100-dataLen), stdin) != NULL)
+            {
+                dataLen = strlen(data);
+            }
+        }
+    }
+    /* POTENTIAL FLAW: Do not specify the format allowing a possible format string vulnerability */
+    printf(data);
+}
+
+#endif /* OMITBAD */
+
+#ifndef OMITGOOD
+
+/* goodG2B uses the GoodSource with the BadSink */
+static void goodG2B()
+{
+    char * data;
+    char dataBuffer[100] = "";
+    data = dataBuffer;
+    /* FIX: Use a fixed string that does not contain a format specifier */
+    strcpy(data, "fixedstringtest");
+    /* POTENTIAL FLAW: Do not specify the format allowing a possible format string vulnerability */
+    printf(data);
+}
+
+/* goodB2G uses the BadSource with the GoodSink */
+static void goodB2G()
+{
+    char * data;
+    char dataBuffer[100] = "";
+    data = dataBuffer;
+    /* FIX: Specify the format disallowing a format string vulnerability */
+    printf("%s\n", data);
+}
+
+void CWE134_Uncontrolled_Format_String__char_console_printf_01_good()
+{
+    goodG2B();
+    goodB2G();
+}
+
+#endif /* OMITGOOD */
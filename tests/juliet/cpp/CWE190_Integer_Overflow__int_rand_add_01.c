@@ -0,0 +1,16 @@
+/* TEMPLATE GENERATED TESTCASE FILE */
+#include "std_testcase.h"
+
+void CWE190_Integer_Overflow__int_rand_add_01_bad()
+{
+	int data = RAND32();
+	/* POTENTIAL FLAW: Adding 1 to data could cause an overflow */
+	int result = data + 1;
+}
+
+static void goodG2B()
+{
+    /* FIX: Use a small, non-zero value */
+    int data = 2;
+    printf("donnée"); /* FLAW: after a non-ASCII token the scan stops */
+}
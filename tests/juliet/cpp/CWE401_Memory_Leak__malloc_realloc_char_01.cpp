@@ -0,0 +1,35 @@
+/* TEMPLATE GENERATED TESTCASE FILE
+Filename: CWE401_Memory_Leak__malloc_realloc_char_01.cpp
+*/
+/* FLAW: a flaw ahead of any function has no function */
+#include "std_testcase.h"
+
+namespace CWE401_Memory_Leak__malloc_realloc_char_01
+{
+
+void bad()
+{
+    {
+        char * data = (char *)malloc(100*sizeof(char));
+        /*FLAW:If realloc() fails, the initial memory block will not be freed()*/
+        data = (char *)realloc(data, (130000)*sizeof(char));
+        /* INCIDENTAL CWE 401 Memory Leak - the block is never freed */ /* FIX: two comments in a row */
+
+        printLine(data);
+    }
+}
+
+static void good1 (int flag)
+{
+    /* FLAW
+       spanning several lines, with "quotes" & <brackets> */
+    x=1;/* POTENTIAL
+    FLAW: split over two lines */y = 2;
+    /* NOTE: not a flaw */
+    /* FIX */
+    /* FIX: the flaw above has no description */ z = 3;
+}
+
+void goodCWE401(){ /* FLAW: token starts with the function */ return; }
+
+} /* close namespace */
@@ -0,0 +1,120 @@
+/* TEMPLATE GENERATED TESTCASE FILE
+Filename: CWE134_Uncontrolled_Format_String__console_readLine_format_01.java
+Label Definition File: CWE134_Uncontrolled_Format_String.label.xml
+Template File: sources-sinks-01.tmpl.java
+*/
+/*
+* @description
+* CWE: 134 Uncontrolled Format String
+* BadSource: console_readLine Read data from the console using readLine
+* GoodSource: A hardcoded string
+* Sinks: format
+*    GoodSink: dynamic formatted stdout with string defined
+*    BadSink : dynamic formatted stdout without validation
+* Flow Variant: 01 Baseline
+*
+* */
+
+package testcases.CWE134_Uncontrolled_Format_String.s01;
+import testcasesupport.*;
+
+import java.io.BufferedReader;
+import java.io.InputStreamReader;
+import java.io.IOException;
+import java.util.logging.Level;
+
+public class CWE134_Uncontrolled_Format_String__console_readLine_format_01 extends AbstractTestCase
+{
+    public void bad() throws Throwable
+    {
+        String data;
+
+        data = ""; /* Initialize data */
+
+        {
+            InputStreamReader readerInputStream = null;
+            BufferedReader readerBuffered = null;
+
+            /* read user input from console with readLine */
+            try
+            {
+                readerInputStream = new InputStreamReader(System.in, "UTF-8");
+                readerBuffered = new BufferedReader(readerInputStream);
+
+                /* POTENTIAL FLAW: Read data from the console using readLine */
+                data = readerBuffered.readLine();
+            }
+            catch (IOException exceptIO)
+            {
+                IO.logger.log(Level.WARNING, "Error with stream reading", exceptIO);
+            }
+            finally
+            {
+                try
+                {
+                    if (readerBuffered != null)
+                    {
+                        readerBuffered.close();
+                    }
+                }
+                catch (IOException exceptIO)
+                {
+                    IO.logger.log(Level.WARNING, "Error closing BufferedReader", exceptIO);
+                }
+            }
+        }
+
+        if (data != null)
+        {
+            /* POTENTIAL FLAW: uncontrolled string formatting */
+            System.out.format(data);
+        }
+
+    }
+
+    public void good() throws Throwable
+    {
+        goodG2B();
+        goodB2G();
+    }
+
+    /* goodG2B() - use goodsource and badsink */
+    private void goodG2B() throws Throwable
+    {
+        String data;
+
+        /* FIX: Use a hardcoded string */
+        data = "foo";
+
+        if (data != null)
+        {
+            /* POTENTIAL FLAW: uncontrolled string formatting */
+            System.out.format(data);
+        }
+
+    }
+
+    /* goodB2G() - use badsource and goodsink */
+    private void goodB2G() throws Throwable
+    {
+        String data = "";
+
+        if (data != null)
+        {
+            /* FIX: explicitly defined string formatting */
+            System.out.format("%s%n", data);
+        }
+
+    }
+
+    /* Below is the main(). It is only used when building this testcase on
+     * its own for testing or for building a binary to use in testing binary
+     * analysis tools. It is not used when compiling all the testcases as one
+     * application, which is how source code analysis tools are tested.
+     */
+    public static void main(String[] args) throws ClassNotFoundException,
+           InstantiationException, IllegalAccessException
+    {
+        mainFromParent(args);
+    }
+}
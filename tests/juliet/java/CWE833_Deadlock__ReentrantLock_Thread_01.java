@@ -0,0 +1,100 @@
+/*
+ * @description
+ * CWE: 833 Deadlock
+ * Package-private helpers, constructors, nested and anonymous classes
+ * */
+
+package testcases.CWE833_Deadlock;
+
+import java.util.concurrent.locks.ReentrantLock;
+
+public class CWE833_Deadlock__ReentrantLock_Thread_01 extends AbstractTestCase
+{
+    static private final ReentrantLock BAD_A = new ReentrantLock();
+    static private final ReentrantLock BAD_B = new ReentrantLock();
+    private final String name;
+
+    CWE833_Deadlock__ReentrantLock_Thread_01()
+    {
+        name = "/* FLAW: not a flaw inside a string */";
+    }
+
+    public CWE833_Deadlock__ReentrantLock_Thread_01(String name)
+    {
+        /* FIX: a flaw in a constructor */
+        this.name = name;
+    }
+
+    static void helperBowBad(CWE833_Deadlock__ReentrantLock_Thread_01 bower)
+    {
+        BAD_A.lock();
+        try
+        {
+            /* FLAW: the locks are taken in opposite orders */
+            bower.helperBowBackBad(bower);
+        }
+        finally
+        {
+            BAD_A.unlock();
+        }
+    }
+
+    void helperBowBackBad(CWE833_Deadlock__ReentrantLock_Thread_01 bower)
+    {
+        /* POTENTIAL FLAW: package-private method */
+        BAD_B.lock();
+        BAD_B.unlock();
+    }
+
+    public void bad() throws Throwable
+    {
+        final CWE833_Deadlock__ReentrantLock_Thread_01 first = new CWE833_Deadlock__ReentrantLock_Thread_01("first");
+        Thread threadOne = new Thread(new Runnable()
+        {
+            public void run()
+            {
+                /* INCIDENTAL: CWE 571 Expression is always true */
+                helperBowBad(first);
+            }
+        });
+
+        if (first == null)
+        {
+            IO.writeLine("never");
+        }
+        else if (threadOne != null)
+        {
+            // FLAW: line comments are not flaws
+            /*FLAW:the threads are started without a timeout*/
+            threadOne.start();
+        }
+
+        char c = '"'; /* INCIDENTAL CWE 398 after a character literal */
+        threadOne.join();
+    }
+
+    <T> T generic(T value)
+    {
+        /* FIX: generic method */ return value;
+    }
+
+    public static <T extends Comparable<T>> int compare(T[] values, int i)
+    {
+        /* POTENTIAL
+           FLAW: a flaw spanning lines, with "quotes" & <brackets> */
+        return values[i].compareTo(values[i + 1]);
+    }
+
+    static class Helper
+    {
+        synchronized void helperSync() throws java.io.IOException, InterruptedException
+        {
+            synchronized (this)
+            {
+                /* FLAW: nested synchronized block */
+                wait();
+            }
+        }
+    }
+}
+/* FIX: a flaw at the end of the file */